@@ -1,3 +1,101 @@
 from django.contrib import admin
+from payment_authorizenet.models import (
+    ChargeJob,
+    CustomerProfileIndex,
+    CustomerProfileMirror,
+    IdempotentCharge,
+    PaymentProfileMirror,
+    ReconciledBatch,
+    SettledTransaction,
+    WebhookNotification)
 
-# Register your models here.
+
+class PaymentProfileMirrorInline(admin.TabularInline):
+    model = PaymentProfileMirror
+    extra = 0
+    readonly_fields = [f.name for f in PaymentProfileMirror._meta.fields]
+    can_delete = False
+
+
+@admin.register(CustomerProfileMirror)
+class CustomerProfileMirrorAdmin(admin.ModelAdmin):
+    list_display = (
+        'customer_profile_id', 'merchant_customer_id', 'email', 'synced')
+    search_fields = ('customer_profile_id', 'merchant_customer_id', 'email')
+    readonly_fields = [f.name for f in CustomerProfileMirror._meta.fields]
+    inlines = [PaymentProfileMirrorInline]
+
+
+@admin.register(PaymentProfileMirror)
+class PaymentProfileMirrorAdmin(admin.ModelAdmin):
+    list_display = (
+        'customer_payment_profile_id', 'customer_profile', 'payment_type',
+        'card_type', 'last_4', 'expiration_date', 'bank_name', 'is_default')
+    list_filter = ('payment_type', 'card_type', 'is_default')
+    search_fields = ('customer_payment_profile_id', 'last_4', 'bank_name')
+    readonly_fields = [f.name for f in PaymentProfileMirror._meta.fields]
+
+
+@admin.register(CustomerProfileIndex)
+class CustomerProfileIndexAdmin(admin.ModelAdmin):
+    list_display = (
+        'merchant_customer_id', 'description', 'email',
+        'customer_profile_id', 'updated')
+    search_fields = ('merchant_customer_id', 'email', 'customer_profile_id')
+    readonly_fields = [f.name for f in CustomerProfileIndex._meta.fields]
+
+
+@admin.register(IdempotentCharge)
+class IdempotentChargeAdmin(admin.ModelAdmin):
+    """A pending charge whose process died blocks repeats of it until the
+    row is deleted, once the charge has been checked on Authorize.net"""
+
+    list_display = (
+        'key', 'payment_profile_id', 'amount', 'status', 'created',
+        'completed')
+    list_filter = ('status',)
+    search_fields = ('key',)
+    readonly_fields = [f.name for f in IdempotentCharge._meta.fields]
+
+
+@admin.register(ReconciledBatch)
+class ReconciledBatchAdmin(admin.ModelAdmin):
+    """Deleting a batch makes the next reconciliation read it again"""
+
+    list_display = (
+        'batch_id', 'settlement_time', 'transactions', 'reconciled')
+    search_fields = ('batch_id',)
+    date_hierarchy = 'settlement_time'
+    readonly_fields = [f.name for f in ReconciledBatch._meta.fields]
+
+
+@admin.register(SettledTransaction)
+class SettledTransactionAdmin(admin.ModelAdmin):
+    list_display = (
+        'transaction_id', 'batch', 'invoice_number', 'status',
+        'settle_amount')
+    list_filter = ('status',)
+    search_fields = ('transaction_id', 'invoice_number')
+    readonly_fields = [f.name for f in SettledTransaction._meta.fields]
+
+
+@admin.register(WebhookNotification)
+class WebhookNotificationAdmin(admin.ModelAdmin):
+    list_display = ('notification_id', 'event_type', 'received', 'handled')
+    list_filter = ('event_type',)
+    search_fields = ('notification_id',)
+    readonly_fields = [f.name for f in WebhookNotification._meta.fields]
+
+
+@admin.register(ChargeJob)
+class ChargeJobAdmin(admin.ModelAdmin):
+    """A job left running by a worker that died may have been charged.
+    Check it on Authorize.net before setting it back to queued"""
+
+    list_display = (
+        'id', 'model_name', 'object_id', 'amount', 'invoice_number',
+        'status', 'created', 'finished')
+    list_filter = ('status',)
+    search_fields = ('ref_id', 'invoice_number')
+    readonly_fields = [
+        f.name for f in ChargeJob._meta.fields if f.name != 'status']
@@ -5,3 +5,14 @@ from django.apps import AppConfig
 
 class PaymentAuthorizenetConfig(AppConfig):
     name = 'payment_authorizenet'
+    default_auto_field = 'django.db.models.AutoField'
+
+    def ready(self):
+        # register the system checks for the gateway settings
+        from payment_authorizenet import checks  # noqa
+        from payment_authorizenet import sdk
+
+        # load the SDK now so forked workers share it, rather than
+        # waiting for the first gateway call
+        if sdk.startup_mode() == sdk.PREFORK:
+            sdk.warm_up()
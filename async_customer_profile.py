@@ -0,0 +1,322 @@
+from asgiref.sync import sync_to_async
+from payment_authorizenet import idempotency, metrics, resilience
+from payment_authorizenet.customer_profile import CustomerProfile
+from payment_authorizenet.enums import ValidationMode
+from payment_authorizenet.merchant_auth import AuthorizeNetError
+from payment_authorizenet.profile_cache import get_profile_cache
+from payment_authorizenet.transaction import Transaction
+from payment_authorizenet.transport import get_async_transport
+
+
+class AsyncCustomerProfile(CustomerProfile):
+    """CustomerProfile for asyncio code, such as ASGI views.
+
+    Every gateway operation of CustomerProfile is available under the same
+    name and with the same arguments, but must be awaited. The request to
+    Authorize.net does not block a thread; model saves and reloads are run
+    through sync_to_async.
+
+    The number of calls in flight per event loop is capped by
+    AUTHORIZE_NET_ASYNC_CONCURRENCY"""
+
+    def __init__(self, instance, *args, **kwargs):
+        super().__init__(instance, *args, **kwargs)
+
+        self.async_transport = get_async_transport()
+
+    async def execute(self, controller):
+        """Send the request of an SDK controller to post_url without
+        blocking the event loop and return the response"""
+
+        operation = metrics.operation_name(controller)
+
+        return await resilience.async_call(
+            operation,
+            self.post_url,
+            lambda: self.execute_once(controller, operation))
+
+    async def execute_once(self, controller, operation):
+        """See AuthNet.execute_once"""
+
+        start = metrics.call_started(self, operation)
+
+        try:
+            response = await self.async_transport.execute(
+                controller, self.post_url)
+        except Exception:
+            metrics.call_finished(self, operation, start, exception=True)
+            raise
+
+        metrics.call_finished(self, operation, start, response)
+
+        return response
+
+    async def charge_customer_profile(
+            self, paymentProfileId, amount, ref_id, invoice_number):
+        """See CustomerProfile.charge_customer_profile"""
+
+        key = idempotency.charge_key(
+            self.instance.authorizenet_customer_profile_id,
+            ref_id,
+            invoice_number)
+
+        async def charge():
+            controller = self._charge_customer_profile_controller(
+                paymentProfileId, amount, ref_id, invoice_number)
+            return Transaction(await self.execute(controller))
+
+        if key is None:
+            return await charge()
+
+        return await idempotency.acharge_once(
+            key, paymentProfileId, amount, charge)
+
+    async def create_customer_profile(self, email):
+        """See CustomerProfile.create_customer_profile"""
+
+        if await sync_to_async(self._use_indexed_customer_profile)(email):
+            return None
+
+        # str(instance) may touch the database
+        controller = await sync_to_async(
+            self._create_customer_profile_controller)(email)
+        response = await self.execute(controller)
+
+        return await sync_to_async(
+            self._create_customer_profile_result)(response, email)
+
+    async def create_customer_payment_profile(
+            self,
+            payment,
+            customer_type,
+            first_name,
+            last_name,
+            contact_dictionary,
+            company_name,
+            set_as_default,
+            validation_mode=ValidationMode.liveMode):
+        """See CustomerProfile.create_customer_payment_profile"""
+
+        controller = self._create_customer_payment_profile_controller(
+            payment,
+            customer_type,
+            first_name,
+            last_name,
+            contact_dictionary,
+            company_name,
+            validation_mode)
+        response = await self.execute(controller)
+
+        return await sync_to_async(
+            self._create_customer_payment_profile_result)(
+                response, set_as_default, payment)
+
+    async def create_customer_payment_profile_credit_card(
+            self,
+            credit_card,
+            expiration_date,
+            card_code,
+            customer_type,
+            first_name,
+            last_name,
+            contact_dictionary=None,
+            company_name=None,
+            use_model_address=True,
+            set_as_default=True,
+            validation_mode=ValidationMode.liveMode):
+        """See CustomerProfile.create_customer_payment_profile_credit_card"""
+
+        contact_dictionary = self.create_contact_dictionary(
+            use_model_address, contact_dictionary)
+
+        payment = CustomerProfile.make_creditCard(
+            credit_card, expiration_date, card_code)
+
+        return await self.create_customer_payment_profile(
+            payment,
+            customer_type,
+            first_name,
+            last_name,
+            contact_dictionary,
+            company_name,
+            set_as_default,
+            validation_mode)
+
+    async def create_customer_payment_profile_echeck(
+            self,
+            account_type,
+            routing_number,
+            account_number,
+            name_on_account,
+            bank_name,
+            customer_type,
+            first_name,
+            last_name,
+            contact_dictionary=None,
+            company_name=None,
+            use_model_address=True,
+            set_as_default=True,
+            validation_mode=ValidationMode.liveMode):
+        """See CustomerProfile.create_customer_payment_profile_echeck"""
+
+        contact_dictionary = self.create_contact_dictionary(
+            use_model_address, contact_dictionary)
+
+        payment = CustomerProfile.make_bankAccount(
+            account_type, routing_number, account_number,
+            name_on_account, bank_name)
+
+        return await self.create_customer_payment_profile(
+            payment,
+            customer_type,
+            first_name,
+            last_name,
+            contact_dictionary,
+            company_name,
+            set_as_default,
+            validation_mode)
+
+    async def delete_customer_profile(self):
+        """See CustomerProfile.delete_customer_profile"""
+
+        # the instance may be refreshed from the database
+        controller = await sync_to_async(
+            self._delete_customer_profile_controller)()
+        response = await self.execute(controller)
+
+        return await sync_to_async(
+            self._delete_customer_profile_result)(response)
+
+    async def delete_customer_payment_profile(self, customerPaymentProfileId):
+        """See CustomerProfile.delete_customer_payment_profile"""
+
+        controller = self._delete_customer_payment_profile_controller(
+            customerPaymentProfileId)
+        response = await self.execute(controller)
+
+        return await sync_to_async(
+            self._delete_customer_payment_profile_result)(
+                response, customerPaymentProfileId)
+
+    async def get_customer_profile(self):
+        """See CustomerProfile.get_customer_profile"""
+
+        profile_cache = get_profile_cache()
+
+        if profile_cache is None:
+            return await self._fetch_customer_profile()
+
+        if not self.instance.authorizenet_customer_profile_id:
+            raise AuthorizeNetError('No profile id has been set')
+
+        self.customer_profile = None
+        self._set_payment_profiles(await profile_cache.aget_or_load(
+            self.instance.authorizenet_customer_profile_id,
+            self._fetch_payment_profiles))
+
+    async def _fetch_customer_profile(self):
+        """See CustomerProfile._fetch_customer_profile"""
+
+        controller = self._get_customer_profile_controller()
+        response = await self.execute(controller)
+
+        # the mirror tables may be updated from the response
+        return await sync_to_async(
+            self._get_customer_profile_result)(response)
+
+    async def _fetch_payment_profiles(self):
+        await self._fetch_customer_profile()
+        return getattr(self, 'payment_profiles', None)
+
+    async def update_customer_payment_profile(
+            self,
+            payment,
+            customerPaymentProfileId,
+            first_name,
+            last_name,
+            contact_dictionary,
+            company_name,
+            set_as_default,
+            validation_mode):
+        """See CustomerProfile.update_customer_payment_profile"""
+
+        controller = self._update_customer_payment_profile_controller(
+            payment,
+            customerPaymentProfileId,
+            first_name,
+            last_name,
+            contact_dictionary,
+            company_name,
+            validation_mode)
+        response = await self.execute(controller)
+
+        return await sync_to_async(
+            self._update_customer_payment_profile_result)(
+                response, customerPaymentProfileId, set_as_default, payment)
+
+    async def update_customer_payment_profile_credit_card(
+            self,
+            customerPaymentProfileId,
+            credit_card,
+            expiration_date,
+            card_code,
+            customer_type,
+            first_name,
+            last_name,
+            contact_dictionary=None,
+            company_name=None,
+            use_model_address=True,
+            set_as_default=True,
+            validation_mode=ValidationMode.liveMode):
+        """See CustomerProfile.update_customer_payment_profile_credit_card"""
+
+        contact_dictionary = self.create_contact_dictionary(
+            use_model_address, contact_dictionary)
+
+        payment = CustomerProfile.make_creditCard(
+            credit_card, expiration_date, card_code)
+
+        return await self.update_customer_payment_profile(
+            payment,
+            customerPaymentProfileId,
+            first_name,
+            last_name,
+            contact_dictionary,
+            company_name,
+            set_as_default,
+            validation_mode)
+
+    async def update_customer_payment_profile_echeck(
+            self,
+            customerPaymentProfileId,
+            account_type,
+            routing_number,
+            account_number,
+            name_on_account,
+            bank_name,
+            customer_type,
+            first_name,
+            last_name,
+            contact_dictionary=None,
+            company_name=None,
+            use_model_address=True,
+            set_as_default=True,
+            validation_mode=ValidationMode.testMode):
+        """See CustomerProfile.update_customer_payment_profile_echeck"""
+
+        contact_dictionary = self.create_contact_dictionary(
+            use_model_address, contact_dictionary)
+
+        payment = CustomerProfile.make_bankAccount(
+            account_type, routing_number, account_number,
+            name_on_account, bank_name)
+
+        return await self.update_customer_payment_profile(
+            payment,
+            customerPaymentProfileId,
+            first_name,
+            last_name,
+            contact_dictionary,
+            company_name,
+            set_as_default,
+            validation_mode)
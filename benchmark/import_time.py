@@ -0,0 +1,88 @@
+# Compare the startup cost of AUTHORIZE_NET_STARTUP_MODE 'lazy' and
+# 'prefork'. Each mode is measured in fresh interpreters:
+#   - boot: django.setup() plus importing customer_profile
+#   - first call: building and serializing the first gateway request
+#   - max RSS: peak memory of the process
+#
+# Usage: python -m payment_authorizenet.benchmark.import_time [--runs 5]
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+from payment_authorizenet import sdk
+
+CHILD = '''
+import resource, sys, time
+sys.path.insert(0, {path!r})
+start = time.perf_counter()
+
+from django.conf import settings
+settings.configure(
+    INSTALLED_APPS=['payment_authorizenet'],
+    AUTHORIZE_NET_STARTUP_MODE={mode!r},
+    AUTHORIZE_NET_API_LOGIN_ID='login',
+    AUTHORIZE_NET_TRANSACTION_KEY='key',
+    SERVER_MODE='Development')
+
+import django
+django.setup()
+import payment_authorizenet.customer_profile
+
+boot = time.perf_counter() - start
+start = time.perf_counter()
+
+from payment_authorizenet.merchant_auth import AuthNet
+from payment_authorizenet.sdk import apicontractsv1, apicontrollers
+
+auth = AuthNet()
+request = apicontractsv1.getCustomerProfileRequest()
+request.merchantAuthentication = auth.merchantAuth
+request.customerProfileId = '1'
+controller = apicontrollers.getCustomerProfileController(request)
+controller.setClientId()
+controller.buildrequest()
+
+first_call = time.perf_counter() - start
+maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(boot, first_call, maxrss)
+'''
+
+
+def measure(mode, path):
+    """Return (boot seconds, first call seconds, max RSS in KB)"""
+
+    output = subprocess.check_output(
+        [sys.executable, '-c', CHILD.format(path=path, mode=mode)])
+    boot, first_call, maxrss = output.split()
+
+    return float(boot), float(first_call), int(maxrss)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare the startup cost of each startup mode')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    # the directory that contains the payment_authorizenet package
+    path = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+
+    print('{:<10}{:>12}{:>16}{:>14}'.format(
+        'mode', 'boot (ms)', 'first call (ms)', 'max RSS (MB)'))
+
+    for mode in sdk.STARTUP_MODES:
+        runs = [measure(mode, path) for _ in range(args.runs)]
+
+        print('{:<10}{:>12.1f}{:>16.1f}{:>14.1f}'.format(
+            mode,
+            statistics.median(x[0] for x in runs) * 1000,
+            statistics.median(x[1] for x in runs) * 1000,
+            statistics.median(x[2] for x in runs) / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,466 @@
+# Time the per-call overhead of this app:
+#   - gateway.*: each CustomerProfile operation end to end, from building
+#     the request to the saved model, against an in-process FakeGateway
+#     with no latency
+#   - records.*: Transaction, TransactionResponse and PaymentProfile built
+#     from responses recorded from that gateway, and a getCustomerProfile
+#     response with 200 payment profiles parsed by the SDK and by
+#     profile_parser.py
+#   - forms.*: CreditCardForm and ECheckForm built, and built and validated
+#   - requests.*: the hottest requests built and serialized, through pyxb
+#     and through the templates of fast_requests.py
+#
+# Results are compared with a baseline saved by an earlier run on the same
+# machine, and a change slower than --threshold percent is reported as a
+# regression. Timings from another machine can't be compared, so the
+# baseline (benchmark/baseline.json by default) is not committed.
+#
+# Usage: python -m payment_authorizenet.benchmark.suite [--save]
+#            [--baseline PATH] [--threshold 10] [--scale 1] [--check]
+#            [name filter ...]
+#
+# --save writes the results as the new baseline. --check exits with
+# status 1 when there are regressions, for use in CI
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'baseline.json')
+
+SETTINGS = {
+    'INSTALLED_APPS': ['payment_authorizenet'],
+    'DATABASES': {'default': {
+        'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+    'AUTHORIZE_NET_API_LOGIN_ID': 'login',
+    'AUTHORIZE_NET_TRANSACTION_KEY': 'key',
+    'SERVER_MODE': 'Development',
+    'USE_TZ': True,
+}
+
+CONTACT = {
+    'address': '123 Sesame St',
+    'city': 'New York',
+    'state': 'NY',
+    'zip_code': '10005',
+    'phone': '123456789',
+}
+
+CONTACT_FORM_DATA = {
+    'customer_type': 'business',
+    'first_name': 'Shaun',
+    'last_name': 'Overton',
+    'company_name': 'Acme Brick Co',
+    'address': '123 Sesame St',
+    'city': 'Hurst',
+    'state': 'TX',
+    'zip_code': '76054',
+    'country': 'US',
+    'phone_number': '8171234567',
+    'default_method': True,
+}
+
+
+class Benchmark:
+    """A function to time. setup, if given, is called before every call
+    and is not timed; its return value is passed to the function"""
+
+    def __init__(self, name, function, setup=None, number=1000):
+        super().__init__()
+
+        self.name = name
+        self.function = function
+        self.setup = setup
+        self.number = number
+
+    def run(self, repeat, scale=1):
+        """Return the median and best seconds per call of repeat runs"""
+
+        number = max(1, int(self.number * scale))
+        timings = []
+
+        for _ in range(repeat):
+            elapsed = 0
+
+            for _ in range(number):
+                args = (self.setup(),) if self.setup is not None else ()
+                start = time.perf_counter()
+                self.function(*args)
+                elapsed += time.perf_counter() - start
+
+            timings.append(elapsed / number)
+
+        return statistics.median(timings), min(timings)
+
+
+def make_customer_model():
+    """A model to attach customer profiles to, with a table in the
+    in-memory database"""
+
+    from django.db import connection, models
+
+    class BenchmarkCustomer(models.Model):
+        name = models.CharField(max_length=50)
+        authorizenet_customer_profile_id = models.BigIntegerField(null=True)
+        authorizenet_default_payment_profile_id = models.BigIntegerField(
+            null=True)
+
+        class Meta:
+            app_label = 'payment_authorizenet'
+            managed = False
+
+        def __str__(self):
+            return self.name
+
+    with connection.schema_editor() as editor:
+        editor.create_model(BenchmarkCustomer)
+
+    return BenchmarkCustomer
+
+
+def gateway_benchmarks(model):
+    from payment_authorizenet.customer_profile import CustomerProfile
+    from payment_authorizenet.enums import (
+        AccountType,
+        CustomerType,
+        ValidationMode)
+
+    def new_profile():
+        cp = CustomerProfile(model.objects.create(name='Acme Brick Co'))
+        cp.create_customer_profile('test@test.com')
+        return cp
+
+    def add_card(cp):
+        return cp.create_customer_payment_profile_credit_card(
+            '4111111111111111', '2030-12', '123', CustomerType.business,
+            'Shaun', 'Overton', CONTACT, 'Acme Brick Co', False, False,
+            ValidationMode.liveMode)
+
+    def add_bank_account(cp):
+        return cp.create_customer_payment_profile_echeck(
+            AccountType.businessChecking, '114000093', '123456789',
+            'Acme Brick Co', 'Frost Bank', CustomerType.business, 'Shaun',
+            'Overton', CONTACT, 'Acme Brick Co', False, False,
+            ValidationMode.liveMode)
+
+    # a profile the read and update benchmarks use, with a card and a
+    # bank account. The create calls return the default payment profile,
+    # so read the new ids back from the gateway
+    cp = new_profile()
+    add_card(cp)
+    add_bank_account(cp)
+    cp.get_customer_profile()
+    card, bank_account = [
+        str(pp.customer_payment_profile_id) for pp in cp.payment_profiles]
+
+    # profiles the create benchmarks add payment profiles to
+    cards_cp = new_profile()
+    bank_accounts_cp = new_profile()
+
+    def delete_setup():
+        other = new_profile()
+        add_card(other)
+        other.get_customer_profile()
+        return other, str(
+            other.payment_profiles[0].customer_payment_profile_id)
+
+    return [
+        Benchmark(
+            'gateway.create_customer_profile',
+            lambda instance: CustomerProfile(instance).create_customer_profile(
+                'test@test.com'),
+            setup=lambda: model.objects.create(name='Acme Brick Co'),
+            number=50),
+        Benchmark(
+            'gateway.create_customer_payment_profile_credit_card',
+            lambda: add_card(cards_cp),
+            number=50),
+        Benchmark(
+            'gateway.create_customer_payment_profile_echeck',
+            lambda: add_bank_account(bank_accounts_cp),
+            number=50),
+        Benchmark(
+            'gateway.get_customer_profile',
+            cp.get_customer_profile,
+            number=50),
+        Benchmark(
+            'gateway.update_customer_payment_profile_credit_card',
+            lambda: cp.update_customer_payment_profile_credit_card(
+                card, '4111111111111111', '2030-12', '321',
+                CustomerType.business, 'Shaun', 'Overton', CONTACT,
+                'Acme Brick Co', False, False, ValidationMode.liveMode),
+            number=50),
+        Benchmark(
+            'gateway.update_customer_payment_profile_echeck',
+            lambda: cp.update_customer_payment_profile_echeck(
+                bank_account, AccountType.businessChecking, '114000093',
+                '123456789', 'Acme Brick Co', 'JP Morgan Chase',
+                CustomerType.business, 'Shaun', 'Overton', CONTACT,
+                'Acme Brick Co', False, False, ValidationMode.testMode),
+            number=50),
+        Benchmark(
+            'gateway.charge_customer_profile',
+            lambda: cp.charge_customer_profile(
+                card, '2.99', 'ref-1', 'Invoice #1'),
+            number=50),
+        Benchmark(
+            'gateway.delete_customer_payment_profile',
+            lambda args: args[0].delete_customer_payment_profile(args[1]),
+            setup=delete_setup,
+            number=50),
+        Benchmark(
+            'gateway.delete_customer_profile',
+            lambda other: other.delete_customer_profile(),
+            setup=new_profile,
+            number=50),
+    ], record_responses(cp, card)
+
+
+def record_responses(cp, card):
+    """Return a getCustomerProfile and a createTransaction response from
+    the gateway, and the text of the getCustomerProfile response"""
+
+    controller = cp._get_customer_profile_controller()
+    profile = cp.execute(controller)
+    charge = cp.execute(cp._charge_customer_profile_controller(
+        card, '2.99', 'ref-1', 'Invoice #1'))
+
+    return profile, charge, controller._httpResponse
+
+
+def large_profile_response(text, copies):
+    """Repeat the payment profiles of a getCustomerProfile response"""
+
+    start = text.index('<paymentProfiles>')
+    end = text.rindex('</paymentProfiles>') + len('</paymentProfiles>')
+
+    return text[:start] + text[start:end] * copies + text[end:]
+
+
+def record_benchmarks(profile, charge, profile_text):
+    from payment_authorizenet.payment_profile import PaymentProfile
+    from payment_authorizenet.profile_parser import parse_customer_profile
+    from payment_authorizenet.sdk import apicontrollers
+    from payment_authorizenet.transaction import (
+        Transaction,
+        TransactionResponse)
+    from payment_authorizenet.transport import parse_response
+
+    card, bank_account = profile.profile.paymentProfiles
+    large_profile = large_profile_response(profile_text, 100)
+
+    def sdk_parse():
+        controller = apicontrollers.getCustomerProfileController.__new__(
+            apicontrollers.getCustomerProfileController)
+        response = parse_response(controller, large_profile)
+        return [PaymentProfile(pp) for pp in response.profile.paymentProfiles]
+
+    return [
+        Benchmark('records.parse_customer_profile.sdk', sdk_parse, number=5),
+        Benchmark('records.parse_customer_profile.streaming',
+                  lambda: parse_customer_profile(large_profile), number=5),
+        Benchmark('records.Transaction', lambda: Transaction(charge)),
+        Benchmark('records.TransactionResponse',
+                  lambda: TransactionResponse(charge)),
+        Benchmark('records.PaymentProfile.credit_card',
+                  lambda: PaymentProfile(card)),
+        Benchmark('records.PaymentProfile.bank_account',
+                  lambda: PaymentProfile(bank_account)),
+    ]
+
+
+def request_benchmarks(model):
+    from payment_authorizenet import fast_requests
+    from payment_authorizenet.customer_profile import CustomerProfile
+
+    cp = CustomerProfile(
+        model(pk=1, name='Acme Brick Co',
+              authorizenet_customer_profile_id=1500000001))
+
+    def serialize(controller):
+        controller.setClientId()
+        return controller.buildrequest()
+
+    def charge():
+        return cp._charge_customer_profile_controller(
+            '1600000001', '2.99', 'ref-1', 'Invoice #1')
+
+    def fast_charge():
+        return fast_requests.charge_customer_profile_controller(
+            cp.merchantAuth, 1500000001, '1600000001', '2.99', 'ref-1',
+            'Invoice #1')
+
+    def fast_get():
+        return fast_requests.get_customer_profile_controller(
+            cp.merchantAuth, 1500000001)
+
+    return [
+        Benchmark('requests.charge_customer_profile.pyxb',
+                  lambda: serialize(charge())),
+        Benchmark('requests.charge_customer_profile.fast',
+                  lambda: serialize(fast_charge())),
+        Benchmark('requests.get_customer_profile.pyxb',
+                  lambda: serialize(cp._get_customer_profile_controller())),
+        Benchmark('requests.get_customer_profile.fast',
+                  lambda: serialize(fast_get())),
+    ]
+
+
+def form_benchmarks():
+    from payment_authorizenet.forms import CreditCardForm, ECheckForm
+
+    credit_card_data = dict(
+        CONTACT_FORM_DATA,
+        credit_card_number='4111111111111111',
+        expiration_month='12',
+        expiration_year=str(datetime.datetime.now().year + 1),
+        card_code='123')
+
+    echeck_data = dict(
+        CONTACT_FORM_DATA,
+        account_type='businessChecking',
+        routing_number='114000093',
+        account_number='123456789',
+        name_on_account='Acme Brick Co',
+        bank_name='Frost Bank')
+
+    return [
+        Benchmark('forms.CreditCardForm.build',
+                  lambda: CreditCardForm(data=credit_card_data)),
+        Benchmark('forms.CreditCardForm.is_valid',
+                  lambda: CreditCardForm(data=credit_card_data).is_valid()),
+        Benchmark('forms.ECheckForm.build',
+                  lambda: ECheckForm(data=echeck_data)),
+        Benchmark('forms.ECheckForm.is_valid',
+                  lambda: ECheckForm(data=echeck_data).is_valid()),
+    ]
+
+
+def run(benchmarks, repeat, scale):
+    """Return {name: {'median': seconds, 'best': seconds}}"""
+
+    results = {}
+
+    for benchmark in benchmarks:
+        median, best = benchmark.run(repeat, scale)
+        results[benchmark.name] = {'median': median, 'best': best}
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Return (rows, regressions). A row is (name, median, best, baseline
+    median or None, change in percent or None)"""
+
+    rows = []
+    regressions = []
+
+    for name, result in results.items():
+        base = baseline.get(name, {}).get('median')
+        change = None
+
+        if base:
+            change = (result['median'] - base) / base * 100
+
+            if change > threshold:
+                regressions.append(name)
+
+        rows.append((name, result['median'], result['best'], base, change))
+
+    return rows, regressions
+
+
+def report(rows, regressions, out=sys.stdout):
+    out.write('{:<55}{:>12}{:>12}{:>12}{:>10}\n'.format(
+        'benchmark', 'median (us)', 'best (us)', 'base (us)', 'change'))
+
+    for name, median, best, base, change in rows:
+        out.write('{:<55}{:>12.1f}{:>12.1f}{:>12}{:>10}{}\n'.format(
+            name,
+            median * 1e6,
+            best * 1e6,
+            '-' if base is None else '{:.1f}'.format(base * 1e6),
+            '-' if change is None else '{:+.1f}%'.format(change),
+            '  REGRESSION' if name in regressions else ''))
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def save_baseline(path, results):
+    with open(path, 'w') as f:
+        json.dump({
+            'created': datetime.datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'results': results,
+        }, f, indent=2, sort_keys=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark CustomerProfile operations, result records '
+                    'and payment forms')
+    parser.add_argument('filters', nargs='*',
+                        help='Only run benchmarks whose name contains one '
+                             'of these')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save', action='store_true',
+                        help='Save the results as the baseline')
+    parser.add_argument('--threshold', type=float, default=10,
+                        help='Percent slower than the baseline that is '
+                             'reported as a regression')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--scale', type=float, default=1,
+                        help='Multiply the number of calls per run')
+    parser.add_argument('--check', action='store_true',
+                        help='Exit with status 1 if there are regressions')
+    args = parser.parse_args()
+
+    from django.conf import settings
+    settings.configure(**SETTINGS)
+
+    import django
+    django.setup()
+
+    from payment_authorizenet.fake_gateway import FakeGateway
+
+    with FakeGateway() as gateway, gateway.settings():
+        model = make_customer_model()
+        benchmarks, responses = gateway_benchmarks(model)
+        benchmarks += record_benchmarks(*responses)
+        benchmarks += request_benchmarks(model)
+        benchmarks += form_benchmarks()
+
+        if args.filters:
+            benchmarks = [
+                b for b in benchmarks
+                if any(f in b.name for f in args.filters)]
+
+        results = run(benchmarks, args.repeat, args.scale)
+
+    rows, regressions = compare(
+        results, load_baseline(args.baseline), args.threshold)
+    report(rows, regressions)
+
+    if args.save:
+        save_baseline(args.baseline, results)
+        print('Saved the baseline to {}'.format(args.baseline))
+
+    if args.check and regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,425 @@
+from collections import namedtuple
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    wait)
+import itertools
+import time
+
+from django.db import connections
+from django.db.models.query import QuerySet
+from payment_authorizenet import mirror, profile_index
+from payment_authorizenet.customer_profile import CustomerProfile
+from payment_authorizenet.merchant_auth import AuthorizeNetError
+from payment_authorizenet.transaction import Transaction
+
+DEFAULT_WORKERS = 8
+DEFAULT_BATCH_SIZE = 500  # rows read and written back per query
+
+
+ChargeResult = namedtuple('ChargeResult', [
+    'instance',
+    'payment_profile_id',
+    'amount',
+    'invoice_number',
+    'transaction',
+    'error',
+])
+
+
+def _run_in_thread(function, *args):
+    try:
+        return function(*args)
+    finally:
+        # connections are per thread. Don't leave this one open
+        connections.close_all()
+
+
+class BulkChargeSummary:
+    """Totals for a BulkCharge run"""
+
+    def __init__(self):
+        super().__init__()
+
+        self.count = 0
+        self.approved = 0
+        self.declined = 0
+        self.errors = 0
+        self.started = None
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        """Seconds since the run started"""
+        if self.started is None:
+            return 0
+
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def per_second(self):
+        """Charges completed per second"""
+        elapsed = self.elapsed
+        return self.count / elapsed if elapsed else 0
+
+    def add(self, result):
+        self.count += 1
+
+        if result.error is not None:
+            self.errors += 1
+        elif result.transaction.result == Transaction.APPROVED:
+            self.approved += 1
+        else:
+            self.declined += 1
+
+    def __str__(self):
+        msg = '{} charges in {:.1f}s ({:.1f}/s): {} approved, {} declined, ' \
+              '{} errors'
+        return msg.format(
+            self.count, self.elapsed, self.per_second,
+            self.approved, self.declined, self.errors)
+
+
+class BulkCharge:
+    """Charge many customer profiles on a bounded pool of worker threads.
+
+    rows is an iterable of
+    (instance, paymentProfileId, amount, invoice_number) tuples. To charge
+    model instances, such as the rows of a QuerySet, pass values, a
+    function that takes an instance and returns its
+    (paymentProfileId, amount, invoice_number). The invoice number doubles
+    as the ref_id of each charge.
+
+    Iterating a BulkCharge yields a ChargeResult for every row as soon as
+    its charge finishes, so results do not come back in the order of rows.
+    A row that raises, or that isn't of that shape, is reported through
+    ChargeResult.error instead of stopping the run. summary is complete
+    once iteration ends.
+
+    Rows are read lazily, and at most two rows per worker are waiting or
+    in flight at any time. The workers share the process-wide connection
+    pool, so AUTHORIZE_NET_POOL_SIZE should be at least workers.
+
+    Example:
+        run = BulkCharge(rows, workers=16)
+        for result in run:
+            ...
+        print(run.summary)
+
+        run = BulkCharge(
+            Practice.objects.filter(due=True),
+            values=lambda practice: (
+                practice.payment_profile_id, practice.balance,
+                practice.invoice_number))
+    """
+
+    def __init__(self, rows, workers=DEFAULT_WORKERS, values=None):
+        super().__init__()
+
+        if isinstance(rows, QuerySet):
+            if values is None:
+                msg = 'A QuerySet yields model instances, so values must ' \
+                      'be given to read the charge of each instance'
+                raise ValueError(msg)
+
+            rows = rows.iterator()
+
+        self.rows = rows
+        self.workers = workers
+        self.values = values
+        self.summary = BulkChargeSummary()
+
+    def charge(self, row):
+        """Charge one row and return a ChargeResult"""
+
+        instance, paymentProfileId, amount, invoice_number = \
+            row, None, None, None
+
+        try:
+            if self.values is None:
+                instance, paymentProfileId, amount, invoice_number = row
+            else:
+                paymentProfileId, amount, invoice_number = self.values(row)
+
+            transaction = CustomerProfile(instance).charge_customer_profile(
+                paymentProfileId, amount, invoice_number, invoice_number)
+        except Exception as err:
+            return ChargeResult(
+                instance, paymentProfileId, amount, invoice_number, None, err)
+
+        # a null response leaves the transaction without a result
+        error = None
+        if not hasattr(transaction, 'result'):
+            error = AuthorizeNetError(transaction.error_text)
+
+        return ChargeResult(
+            instance, paymentProfileId, amount, invoice_number,
+            transaction, error)
+
+    def __iter__(self):
+        self.summary = BulkChargeSummary()
+        self.summary.started = time.monotonic()
+
+        rows = iter(self.rows)
+        max_pending = self.workers * 2
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = {
+                executor.submit(_run_in_thread, self.charge, row)
+                for row in itertools.islice(rows, max_pending)}
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+                for row in itertools.islice(rows, len(done)):
+                    pending.add(
+                        executor.submit(_run_in_thread, self.charge, row))
+
+                for future in done:
+                    result = future.result()
+                    self.summary.add(result)
+                    yield result
+
+        self.summary.finished = time.monotonic()
+
+
+CreateResult = namedtuple('CreateResult', [
+    'instance',
+    'email',
+    'customer_profile_id',
+    'existing',
+    'error',
+])
+
+
+class BulkCreateSummary:
+    """Totals for a BulkCreateProfiles run"""
+
+    def __init__(self):
+        super().__init__()
+
+        self.count = 0
+        self.created = 0
+        self.existing = 0
+        self.errors = 0
+        self.saved = 0
+        self.started = None
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        """Seconds since the run started"""
+        if self.started is None:
+            return 0
+
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def per_second(self):
+        """Profiles created per second"""
+        elapsed = self.elapsed
+        return self.count / elapsed if elapsed else 0
+
+    def add(self, result):
+        self.count += 1
+
+        if result.error is not None:
+            self.errors += 1
+        elif result.existing:
+            self.existing += 1
+        else:
+            self.created += 1
+
+    def __str__(self):
+        msg = '{} rows in {:.1f}s ({:.1f}/s): {} created, {} existing, ' \
+              '{} errors, {} saved'
+        return msg.format(
+            self.count, self.elapsed, self.per_second,
+            self.created, self.existing, self.errors, self.saved)
+
+
+class BulkCreateProfiles:
+    """Create customer profiles for the rows of a QuerySet on a bounded
+    pool of worker threads.
+
+    email is the name of the field holding each row's email address, or a
+    function that takes a row and returns it. Only rows without an
+    authorizenet_customer_profile_id are read, in order of pk.
+
+    The new profile ids are written back with bulk_update(), batch_size
+    rows at a time, so no save() is called and no signals are sent. Rows
+    are read batch_size at a time by pk, and the workers only talk to the
+    gateway.
+
+    Iterating yields a CreateResult for every row as it finishes. A row
+    that fails is reported through CreateResult.error and keeps no id, so
+    running again retries it. If a run is interrupted, ids not yet written
+    back are written as iteration stops. A profile created by a run that
+    died before writing it back is found again as a duplicate, and its id
+    is used.
+
+    Example:
+        run = BulkCreateProfiles(Practice.objects.all(), 'email')
+        for result in run:
+            if result.error is not None:
+                ...
+        print(run.summary)
+    """
+
+    def __init__(self, queryset, email, workers=DEFAULT_WORKERS,
+                 batch_size=DEFAULT_BATCH_SIZE):
+        super().__init__()
+
+        if not hasattr(queryset.model, 'authorizenet_customer_profile_id'):
+            msg = 'Models used to create a customer profile must contain ' \
+                  'an authorizenet_customer_profile_id attribute'
+            raise ValueError(msg)
+
+        if batch_size < 1:
+            raise ValueError('batch_size must be at least 1')
+
+        self.queryset = queryset
+        self.email = email if callable(email) \
+            else lambda instance: getattr(instance, email)
+        self.workers = workers
+        self.batch_size = batch_size
+        self.summary = BulkCreateSummary()
+
+    def rows(self):
+        """The rows still without a profile, read batch_size at a time,
+        as (instance, email, indexed customer profile id or None) tuples.
+        Paging on pk is not thrown off by the rows written back"""
+
+        queryset = self.queryset.filter(
+            authorizenet_customer_profile_id__isnull=True).order_by('pk')
+        last_pk = None
+
+        while True:
+            page = queryset if last_pk is None \
+                else queryset.filter(pk__gt=last_pk)
+            rows = list(page[:self.batch_size])
+            emails = [self.email(row) for row in rows]
+            keys = [
+                profile_index.instance_identity(row, email)
+                for row, email in zip(rows, emails)]
+            indexed = {}
+
+            if profile_index.index_enabled():
+                indexed = profile_index.lookup_many(keys)
+
+            for row, email, key in zip(rows, emails, keys):
+                yield row, email, indexed.get(key)
+
+            if len(rows) < self.batch_size:
+                return
+
+            last_pk = rows[-1].pk
+
+    @staticmethod
+    def create(instance, email):
+        """Create the profile of one row and return a CreateResult.
+        The row is not saved"""
+
+        try:
+            cp = CustomerProfile(instance)
+            response = cp.execute(
+                cp._create_customer_profile_controller(email))
+            profile_id, existing = cp._created_customer_profile_id(response)
+        except Exception as err:
+            # pyxb raises its own errors for values the schema rejects,
+            # such as an email over 255 characters
+            return CreateResult(instance, email, None, False, err)
+
+        return CreateResult(instance, email, profile_id, existing, None)
+
+    def save(self, results):
+        """Write back the profile ids of results that have one"""
+
+        saved = [
+            result for result in results
+            if result.customer_profile_id is not None]
+        instances = [result.instance for result in saved]
+
+        for result in saved:
+            result.instance.authorizenet_customer_profile_id = \
+                result.customer_profile_id
+
+        if instances:
+            self.queryset.model._default_manager.bulk_update(
+                instances, ['authorizenet_customer_profile_id'],
+                batch_size=self.batch_size)
+            self.summary.saved += len(instances)
+
+        if profile_index.index_enabled():
+            profile_index.record_many(
+                profile_index.instance_identity(result.instance, result.email)
+                + (result.customer_profile_id,)
+                for result in saved)
+
+        if mirror.mirror_enabled():
+            for result in results:
+                if result.customer_profile_id is not None and \
+                        not result.existing:
+                    mirror.record_customer_profile(
+                        result.customer_profile_id, str(result.instance.pk),
+                        result.email, str(result.instance))
+
+    def __iter__(self):
+        self.summary = BulkCreateSummary()
+        self.summary.started = time.monotonic()
+
+        rows = self.rows()
+        max_pending = self.workers * 2
+        pending = set()
+        unsaved = []
+
+        def submit(executor, row):
+            instance, email, profile_id = row
+
+            if profile_id is None:
+                return executor.submit(
+                    _run_in_thread, self.create, instance, email)
+
+            # an indexed profile needs no call to the gateway
+            future = Future()
+            future.set_result(CreateResult(
+                instance, email, profile_id, True, None))
+            return future
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                pending = {
+                    submit(executor, row)
+                    for row in itertools.islice(rows, max_pending)}
+
+                while pending:
+                    done, pending = wait(
+                        pending, return_when=FIRST_COMPLETED)
+
+                    for row in itertools.islice(rows, len(done)):
+                        pending.add(submit(executor, row))
+
+                    results = [future.result() for future in done]
+
+                    for result in results:
+                        self.summary.add(result)
+
+                    unsaved.extend(results)
+
+                    if len(unsaved) >= self.batch_size:
+                        self.save(unsaved)
+                        unsaved = []
+
+                    yield from results
+        finally:
+            # when iteration stops early, the executor has let the rows in
+            # flight finish. Keep their ids too
+            for future in pending:
+                if future.done() and not future.cancelled() and \
+                        future.exception() is None:
+                    self.summary.add(future.result())
+                    unsaved.append(future.result())
+
+            self.save(unsaved)
+            self.summary.finished = time.monotonic()
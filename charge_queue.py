@@ -0,0 +1,208 @@
+"""A durable queue of charges, so views don't wait on the gateway.
+
+    job = charge_queue.enqueue(
+        practice, paymentProfileId, '19.99', ref_id, invoice_number)
+    ...
+    job.refresh_from_db()
+    if job.done:
+        job.transaction  # the Transaction, as charge_customer_profile()
+                         # would have returned it
+
+Jobs are ChargeJob rows. manage.py run_charge_worker claims queued jobs
+with SELECT ... FOR UPDATE SKIP LOCKED, so any number of workers can share
+the queue, and charges up to --concurrency of them at once. When a job
+finishes the charge_job_finished signal is sent.
+
+A job whose worker died while charging stays running: it may or may not
+have been charged. Check it on Authorize.net before requeueing it, or set
+AUTHORIZE_NET_IDEMPOTENT_CHARGES so that running a charge again is safe."""
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from decimal import Decimal, InvalidOperation
+from django.db import connections, transaction
+from django.utils import timezone
+from payment_authorizenet.customer_profile import CustomerProfile
+from payment_authorizenet.merchant_auth import AuthorizeNetError
+from payment_authorizenet.models import ChargeJob
+from payment_authorizenet.signals import charge_job_finished
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_POLL_INTERVAL = 1  # seconds
+
+
+def enqueue(instance, paymentProfileId, amount, ref_id, invoice_number):
+    """Queue a charge_customer_profile() call on instance and return the
+    ChargeJob"""
+
+    if not hasattr(instance, 'authorizenet_customer_profile_id'):
+        msg = 'Models used to create a customer profile must contain ' \
+              'an authorizenet_customer_profile_id attribute'
+        raise ValueError(msg)
+
+    try:
+        valid = Decimal(str(amount)) > 0
+    except InvalidOperation:
+        valid = False
+
+    if not valid:
+        raise ValueError('{!r} is not an amount to charge'.format(amount))
+
+    return ChargeJob.objects.create(
+        instance=instance,
+        payment_profile_id=str(paymentProfileId),
+        amount=str(amount),
+        ref_id=str(ref_id),
+        invoice_number=str(invoice_number))
+
+
+def claim(limit):
+    """Mark up to limit queued jobs as running and return them, oldest
+    first. Jobs locked by another worker are skipped"""
+
+    with transaction.atomic():
+        ids = list(ChargeJob.objects.select_for_update(skip_locked=True)
+                   .filter(status=ChargeJob.QUEUED)
+                   .order_by('pk')
+                   .values_list('pk', flat=True)[:limit])
+
+        now = timezone.now()
+        claimed = [
+            pk for pk in ids
+            # on databases without row locks, only one worker wins
+            if ChargeJob.objects.filter(pk=pk, status=ChargeJob.QUEUED)
+            .update(status=ChargeJob.RUNNING, started=now)]
+
+    return list(ChargeJob.objects.filter(pk__in=claimed).order_by('pk'))
+
+
+def run(job):
+    """Charge a claimed job and store its outcome"""
+
+    try:
+        result = CustomerProfile(job.instance).charge_customer_profile(
+            job.payment_profile_id, job.amount, job.ref_id,
+            job.invoice_number)
+    except Exception as err:
+        # other errors, such as an amount the SDK won't accept, are raised
+        # while the request is built, before anything is sent
+        if not isinstance(err, (AuthorizeNetError, ValueError)):
+            logger.exception('Charge job %s failed', job.pk, extra={
+                'operation': 'charge_job', 'job_id': job.pk,
+                'ref_id': job.ref_id})
+
+        job.status = ChargeJob.FAILED
+        job.error = str(err) or type(err).__name__
+    else:
+        job.result = json.dumps(result.as_dict())
+
+        if hasattr(result, 'result'):
+            job.status = ChargeJob.COMPLETE
+        else:
+            # a null response leaves the transaction without a result
+            job.status = ChargeJob.FAILED
+            job.error = result.error_text
+
+    job.finished = timezone.now()
+    job.save(update_fields=['status', 'result', 'error', 'finished'])
+
+    logger.info('Charge job %s %s', job.pk, job.status, extra={
+        'operation': 'charge_job', 'job_id': job.pk,
+        'ref_id': job.ref_id})
+
+    charge_job_finished.send(sender=ChargeJob, job=job)
+
+    return job
+
+
+def _run_in_thread(job):
+    try:
+        return run(job)
+    finally:
+        # connections are per thread. Don't leave this one open
+        connections.close_all()
+
+
+class Worker:
+    """Claims and runs jobs, concurrency at a time. With a concurrency of
+    1, jobs run on the calling thread"""
+
+    def __init__(
+            self, concurrency=DEFAULT_CONCURRENCY,
+            poll_interval=DEFAULT_POLL_INTERVAL):
+        super().__init__()
+
+        if concurrency < 1:
+            raise ValueError('concurrency must be at least 1')
+
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.processed = 0
+        self.stopped = False
+
+    def stop(self):
+        """Stop claiming jobs. Jobs already claimed are finished"""
+        self.stopped = True
+
+    def run(self, once=False):
+        """Run jobs until stop() is called or, when once is True, until the
+        queue is empty"""
+
+        if self.concurrency == 1:
+            self._run_inline(once)
+        else:
+            self._run_threads(once)
+
+    def _run_inline(self, once):
+        while not self.stopped:
+            jobs = claim(1)
+
+            if jobs:
+                self._finished(jobs[0], run, jobs[0])
+            elif once:
+                return
+            else:
+                time.sleep(self.poll_interval)
+
+    def _finished(self, job, result, *args):
+        """Count a job once result(*args) returns. An error storing its
+        outcome is logged, so the worker goes on to the next job"""
+
+        try:
+            result(*args)
+        except Exception:
+            logger.exception(
+                'Charge job %s could not be finished', job.pk,
+                extra={'operation': 'charge_job', 'job_id': job.pk})
+
+        self.processed += 1
+
+    def _run_threads(self, once):
+        pending = set()
+
+        with ThreadPoolExecutor(
+                max_workers=self.concurrency,
+                thread_name_prefix='authorizenet-charge') as executor:
+            while True:
+                if not self.stopped and len(pending) < self.concurrency:
+                    for job in claim(self.concurrency - len(pending)):
+                        future = executor.submit(_run_in_thread, job)
+                        future.job = job
+                        pending.add(future)
+
+                if not pending:
+                    if once or self.stopped:
+                        return
+                    time.sleep(self.poll_interval)
+                    continue
+
+                done, pending = wait(
+                    pending, timeout=self.poll_interval,
+                    return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    self._finished(future.job, future.result)
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+from payment_authorizenet.enums import ServerMode
+from payment_authorizenet.idempotency import KEY_FIELDS, key_field
+from payment_authorizenet.merchant_auth import GatewayConfig
+from payment_authorizenet.sdk import STARTUP_MODES, startup_mode
+
+
+@register(Tags.compatibility)
+def check_gateway_settings(app_configs, **kwargs):
+    """Report missing or invalid gateway settings when Django starts,
+    instead of on the first call to Authorize.net"""
+
+    errors = [
+        Error(msg, id='payment_authorizenet.E001')
+        for msg in GatewayConfig.errors()]
+
+    server_mode = getattr(settings, 'SERVER_MODE', None)
+    server_modes = [x.value for x in ServerMode]
+
+    if server_mode is not None and server_mode not in server_modes:
+        errors.append(Warning(
+            'SERVER_MODE {!r} is not a ServerMode value, so the sandbox '
+            'will be used'.format(server_mode),
+            hint='Use one of: {}'.format(ServerMode.str_list()),
+            id='payment_authorizenet.W001'))
+
+    post_url = getattr(settings, 'AUTHORIZE_NET_POST_URL', None)
+
+    if post_url and server_mode == ServerMode.production.value:
+        errors.append(Warning(
+            'AUTHORIZE_NET_POST_URL sends production requests to {}'.format(
+                post_url),
+            hint='Remove AUTHORIZE_NET_POST_URL to use Authorize.net',
+            id='payment_authorizenet.W002'))
+
+    return errors
+
+
+@register(Tags.compatibility)
+def check_startup_mode(app_configs, **kwargs):
+    if startup_mode() not in STARTUP_MODES:
+        return [Error(
+            'AUTHORIZE_NET_STARTUP_MODE must be one of {}'.format(
+                ', '.join(STARTUP_MODES)),
+            id='payment_authorizenet.E002')]
+
+    return []
+
+
+@register(Tags.compatibility)
+def check_idempotent_charges(app_configs, **kwargs):
+    field = key_field()
+
+    if field is not None and field not in KEY_FIELDS:
+        return [Error(
+            'AUTHORIZE_NET_IDEMPOTENT_CHARGES must be None or one of '
+            '{}'.format(', '.join(KEY_FIELDS)),
+            id='payment_authorizenet.E003')]
+
+    return []
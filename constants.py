@@ -7,8 +7,12 @@ MAX_CITY_CHARS = 40
 MAX_COMPANY_NAME_CHARS = 50
 MAX_COUNTRY_CHARS = 60
 MAX_CREDIT_CARD_DIGITS = 16
+MAX_DESCRIPTION_CHARS = 255
+MAX_EMAIL_CHARS = 255
 MAX_FIRST_NAME_CHARS = 50
+MAX_INVOICE_NUMBER_CHARS = 20
 MAX_LAST_NAME_CHARS = 50
+MAX_MERCHANT_CUSTOMER_ID_CHARS = 20
 MAX_NAME_ON_ACCOUNT_CHARS = 24
 MAX_PHONE_NUMBER_CHARS = 25
 MAX_STATE_CHARS = 40
@@ -1,13 +1,24 @@
-from authorizenet import apicontractsv1
-from authorizenet.apicontrollers import *
 from django.db import models
 from django.http import Http404
 from payment_authorizenet.enums import CustomerType, ValidationMode
 from payment_authorizenet.merchant_auth import AuthNet, AuthorizeNetError
+from payment_authorizenet import (
+    fast_requests,
+    idempotency,
+    mirror,
+    profile_index,
+    profile_parser)
 from payment_authorizenet.payment_profile import PaymentProfile
+from payment_authorizenet.profile_cache import (
+    get_profile_cache,
+    invalidate_customer_profile)
+from payment_authorizenet.sdk import apicontractsv1, apicontrollers
 from payment_authorizenet.transaction import Transaction
+import logging
 import re
 
+logger = logging.getLogger(__name__)
+
 OK = "Ok"
 
 
@@ -33,8 +44,66 @@ class CustomerProfile(AuthNet):
 
         self.instance = instance
 
+    def log_extra(self, operation, **fields):
+        """Structured fields for the log records of an operation.
+        Only ids go in here, never names, addresses or payment details"""
+
+        fields['operation'] = operation
+        fields['customer_profile_id'] = \
+            self.instance.authorizenet_customer_profile_id
+        fields['instance_pk'] = self.instance.pk
+
+        return fields
+
     def charge_customer_profile(
             self, paymentProfileId, amount, ref_id, invoice_number):
+        """Charge a payment profile and return a Transaction.
+        When AUTHORIZE_NET_IDEMPOTENT_CHARGES is set, repeating a charge
+        returns the first Transaction instead. See idempotency.py"""
+
+        key = idempotency.charge_key(
+            self.instance.authorizenet_customer_profile_id,
+            ref_id,
+            invoice_number)
+
+        def charge():
+            return self._charge_customer_profile(
+                paymentProfileId, amount, ref_id, invoice_number)
+
+        if key is None:
+            return charge()
+
+        return idempotency.charge_once(key, paymentProfileId, amount, charge)
+
+    def _charge_customer_profile(
+            self, paymentProfileId, amount, ref_id, invoice_number):
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                'Charging payment profile %s (ref id %s)',
+                paymentProfileId, ref_id,
+                extra=self.log_extra(
+                    'charge_customer_profile',
+                    payment_profile_id=paymentProfileId, ref_id=ref_id))
+
+        controller = self._charge_customer_profile_controller(
+            paymentProfileId, amount, ref_id, invoice_number)
+        response = self.execute(controller)
+
+        return Transaction(response)
+
+    def _charge_customer_profile_controller(
+            self, paymentProfileId, amount, ref_id, invoice_number):
+        """Build the controller used by charge_customer_profile"""
+
+        if fast_requests.enabled():
+            controller = fast_requests.charge_customer_profile_controller(
+                self.merchantAuth,
+                self.instance.authorizenet_customer_profile_id,
+                paymentProfileId, amount, ref_id, invoice_number)
+
+            if controller is not None:
+                return controller
 
         # create a customer payment profile
         profileToCharge = apicontractsv1.customerProfilePaymentType()
@@ -57,14 +126,9 @@ class CustomerProfile(AuthNet):
         createtransactionrequest.refId = str(ref_id)
 
         createtransactionrequest.transactionRequest = transactionrequest
-        controller = createTransactionController(
-            createtransactionrequest)
-        controller.setenvironment(self.post_url)
-        controller.execute()
 
-        response = controller.getresponse()
-
-        return Transaction(response)
+        return apicontrollers.createTransactionController(
+            createtransactionrequest)
 
     def create_customer_profile(self, email):
         """
@@ -73,6 +137,17 @@ class CustomerProfile(AuthNet):
         the CIM as a CustomerProfile. They are synonymous.
         """
 
+        if self._use_indexed_customer_profile(email):
+            return None
+
+        controller = self._create_customer_profile_controller(email)
+        response = self.execute(controller)
+
+        return self._create_customer_profile_result(response, email)
+
+    def _create_customer_profile_controller(self, email):
+        """Build the controller used by create_customer_profile"""
+
         createCustomerProfile = apicontractsv1.createCustomerProfileRequest()
         createCustomerProfile.merchantAuthentication = self.merchantAuth
 
@@ -81,35 +156,82 @@ class CustomerProfile(AuthNet):
             str(self.instance),
             email)
 
-        controller = createCustomerProfileController(createCustomerProfile)
-        controller.setenvironment(self.post_url)
-        controller.execute()
+        return apicontrollers.createCustomerProfileController(
+            createCustomerProfile)
+
+    def _use_indexed_customer_profile(self, email):
+        """Save the profile id of the instance from the profile index and
+        return True, or return False if it isn't indexed"""
+
+        if not profile_index.index_enabled():
+            return False
+
+        profile_id = profile_index.lookup(
+            profile_index.instance_identity(self.instance, email))
+
+        if profile_id is None:
+            return False
+
+        self.instance.authorizenet_customer_profile_id = profile_id
+        self.instance.save()
+        logger.info(
+            'Using indexed customer profile %s', profile_id,
+            extra=self.log_extra('create_customer_profile'))
 
-        response = controller.getresponse()
+        return True
+
+    def _create_customer_profile_result(self, response, email):
+        """Save the profile id from a createCustomerProfile response"""
+
+        profile_id, existing = self._created_customer_profile_id(response)
+
+        self.instance.authorizenet_customer_profile_id = profile_id
+        self.instance.save()
+
+        if profile_index.index_enabled():
+            profile_index.record(
+                profile_index.instance_identity(self.instance, email),
+                profile_id)
+
+        if existing:
+            logger.info(
+                'Using existing customer profile %s',
+                self.instance.authorizenet_customer_profile_id,
+                extra=self.log_extra('create_customer_profile'))
+            return None
+
+        logger.info(
+            'Created customer profile %s',
+            self.instance.authorizenet_customer_profile_id,
+            extra=self.log_extra('create_customer_profile'))
+
+        if mirror.mirror_enabled():
+            mirror.record_customer_profile(
+                response.customerProfileId,
+                str(self.instance.pk),
+                email,
+                str(self.instance))
+
+        return True
+
+    @staticmethod
+    def _created_customer_profile_id(response):
+        """Return (profile id, existing) from a createCustomerProfile
+        response. existing is True when Authorize.net already had a profile
+        for the instance and answered with its id"""
 
         if response.messages.resultCode == OK:
-            print("Successfully created a customer profile with id: {}".format(
-                response.customerProfileId))
-            self.instance.authorizenet_customer_profile_id = int(
-                response.customerProfileId)
-            self.instance.save()
-            print('saved', self.instance)
-            return True
-        else:
-            error = response.messages.message[0]['text'].text
-            duplicate_text = 'A duplicate record with ID  already exists.'
-            error_no_digits = ''.join([i for i in error if not i.isdigit()])
-            profile_id_list = re.findall(r"\D(\d{10})\D", error)
-
-            if duplicate_text == error_no_digits and len(profile_id_list) == 1:
-                profile_id = profile_id_list[0]
-                self.instance.authorizenet_customer_profile_id = int(
-                    profile_id)
-                self.instance.save()
-                print('saved', self.instance)
-            else:
-                raise AuthorizeNetError(
-                    response.messages.message[0]['text'].text)
+            return int(response.customerProfileId), False
+
+        error = response.messages.message[0]['text'].text
+        duplicate_text = 'A duplicate record with ID  already exists.'
+        error_no_digits = ''.join([i for i in error if not i.isdigit()])
+        profile_id_list = re.findall(r"\D(\d{10})\D", error)
+
+        if duplicate_text == error_no_digits and len(profile_id_list) == 1:
+            return int(profile_id_list[0]), True
+
+        raise AuthorizeNetError(error)
 
     def make_billTo(
             first_name,
@@ -187,6 +309,30 @@ class CustomerProfile(AuthNet):
         payment profile. It is NOT intended to be directly called outside
         of this app"""
 
+        controller = self._create_customer_payment_profile_controller(
+            payment,
+            customer_type,
+            first_name,
+            last_name,
+            contact_dictionary,
+            company_name,
+            validation_mode)
+        response = self.execute(controller)
+
+        return self._create_customer_payment_profile_result(
+            response, set_as_default, payment)
+
+    def _create_customer_payment_profile_controller(
+            self,
+            payment,
+            customer_type,
+            first_name,
+            last_name,
+            contact_dictionary,
+            company_name,
+            validation_mode):
+        """Build the controller used by create_customer_payment_profile"""
+
         if not isinstance(customer_type, CustomerType):
             msg = 'customer_type must be a CustomerType enum. ' \
                   'Your type is {}\n{}'
@@ -206,9 +352,6 @@ class CustomerProfile(AuthNet):
             first_name, last_name, company_name, address,
             city, state, zip_code, country, phone)
 
-        print(first_name, last_name, company_name, address,
-              city, state, zip_code, country, phone)
-
         createCustomerPaymentProfile = apicontractsv1.createCustomerPaymentProfileRequest()  # noqa
         createCustomerPaymentProfile.merchantAuthentication = self.merchantAuth
         createCustomerPaymentProfile.paymentProfile = profile
@@ -216,24 +359,32 @@ class CustomerProfile(AuthNet):
             self.instance.authorizenet_customer_profile_id)
         createCustomerPaymentProfile.validationMode = validation_mode.name
 
-        controller = createCustomerPaymentProfileController(
+        return apicontrollers.createCustomerPaymentProfileController(
             createCustomerPaymentProfile)
-        controller.setenvironment(self.post_url)
-        controller.execute()
 
-        response = controller.getresponse()
+    def _create_customer_payment_profile_result(
+            self, response, set_as_default, payment):
+        """Save the payment profile id from a
+        createCustomerPaymentProfile response"""
 
         if response.messages.resultCode == OK:
-            msg = 'Successfully created a customer payment profile with id: {}'
-            print(msg.format(response.customerPaymentProfileId))
+            self.invalidate_cache()
 
             if set_as_default:
                 self.instance.authorizenet_default_payment_profile_id = int(
                     response.customerPaymentProfileId)
-                print('\tsaved as default')
                 self.instance.save()
-            else:
-                print('\tThis payment method is NOT the default')
+
+            logger.info(
+                'Created payment profile %s (default: %s)',
+                response.customerPaymentProfileId, set_as_default,
+                extra=self.log_extra(
+                    'create_customer_payment_profile',
+                    payment_profile_id=str(response.customerPaymentProfileId)))
+
+            if mirror.mirror_enabled():
+                self.mirror_payment_profile(
+                    response.customerPaymentProfileId, payment)
 
             return self.instance.authorizenet_default_payment_profile_id
         else:
@@ -377,6 +528,14 @@ class CustomerProfile(AuthNet):
     def delete_customer_profile(self):
         """Delete a Customer Profile"""
 
+        controller = self._delete_customer_profile_controller()
+        response = self.execute(controller)
+
+        return self._delete_customer_profile_result(response)
+
+    def _delete_customer_profile_controller(self):
+        """Build the controller used by delete_customer_profile"""
+
         if not self.instance.authorizenet_customer_profile_id:
 
             # try refereshing from database in case the model has been updated
@@ -393,67 +552,188 @@ class CustomerProfile(AuthNet):
         deleteCustomerProfile.customerProfileId = str(
             self.instance.authorizenet_customer_profile_id)
 
-        controller = deleteCustomerProfileController(deleteCustomerProfile)
-        controller.setenvironment(self.post_url)
-        controller.execute()
+        return apicontrollers.deleteCustomerProfileController(
+            deleteCustomerProfile)
 
-        response = controller.getresponse()
+    def _delete_customer_profile_result(self, response):
+        """Clear the profile id after a deleteCustomerProfile response"""
 
         if response.messages.resultCode == OK:
-            print(
-                'deleted customer profile',
-                self.instance.authorizenet_customer_profile_id)
+            self.invalidate_cache()
+            logger.info(
+                'Deleted customer profile %s',
+                self.instance.authorizenet_customer_profile_id,
+                extra=self.log_extra('delete_customer_profile'))
+
+            if mirror.mirror_enabled():
+                mirror.forget_customer_profile(
+                    self.instance.authorizenet_customer_profile_id)
+
+            if profile_index.index_enabled():
+                profile_index.forget(
+                    self.instance.authorizenet_customer_profile_id)
+
             self.instance.authorizenet_customer_profile_id = None
             return True
         else:
-            print(response.messages.message[0]['text'].text)
-            raise AuthorizeNetError(response.messages.message[0]['text'].text)
+            error = response.messages.message[0]['text'].text
+            logger.warning(
+                'Unable to delete customer profile %s: %s',
+                self.instance.authorizenet_customer_profile_id, error,
+                extra=self.log_extra('delete_customer_profile'))
+            raise AuthorizeNetError(error)
 
     def delete_customer_payment_profile(self, customerPaymentProfileId):
         """Delete a payment profile with a known ID"""
 
+        controller = self._delete_customer_payment_profile_controller(
+            customerPaymentProfileId)
+        response = self.execute(controller)
+
+        return self._delete_customer_payment_profile_result(
+            response, customerPaymentProfileId)
+
+    def _delete_customer_payment_profile_controller(
+            self, customerPaymentProfileId):
+        """Build the controller used by delete_customer_payment_profile"""
+
         action = apicontractsv1.deleteCustomerPaymentProfileRequest()
         action.merchantAuthentication = self.merchantAuth
         action.customerProfileId = str(
             self.instance.authorizenet_customer_profile_id)
         action.customerPaymentProfileId = customerPaymentProfileId
 
-        controller = deleteCustomerPaymentProfileController(
+        return apicontrollers.deleteCustomerPaymentProfileController(
             action)
-        controller.setenvironment(self.post_url)
-        controller.execute()
 
-        response = controller.getresponse()
+    def _delete_customer_payment_profile_result(
+            self, response, customerPaymentProfileId):
+        """Check a deleteCustomerPaymentProfile response"""
 
         if response.messages.resultCode == OK:
+            self.invalidate_cache()
+
+            if mirror.mirror_enabled():
+                mirror.forget_payment_profile(customerPaymentProfileId)
+
+            logger.info(
+                'Deleted payment profile %s', customerPaymentProfileId,
+                extra=self.log_extra(
+                    'delete_customer_payment_profile',
+                    payment_profile_id=customerPaymentProfileId))
+
             return True
         else:
-            print(response.messages.message[0]['text'].text)
-            raise AuthorizeNetError(response.messages.message[0]['text'].text)
+            error = response.messages.message[0]['text'].text
+            logger.warning(
+                'Unable to delete payment profile %s: %s',
+                customerPaymentProfileId, error,
+                extra=self.log_extra(
+                    'delete_customer_payment_profile',
+                    payment_profile_id=customerPaymentProfileId))
+            raise AuthorizeNetError(error)
 
     def get_customer_profile(self):
-        """Used to retrive payment profiles"""
+        """Used to retrive payment profiles
+
+        When AUTHORIZE_NET_PROFILE_CACHE is set, payment_profiles are read
+        through the cache. customer_profile, the raw response, is None
+        whenever the payment profiles came from the cache"""
+
+        profile_cache = get_profile_cache()
+
+        if profile_cache is None:
+            return self._fetch_customer_profile()
 
         if not self.instance.authorizenet_customer_profile_id:
             raise AuthorizeNetError('No profile id has been set')
 
-        getCustomerProfile = apicontractsv1.getCustomerProfileRequest()
-        getCustomerProfile.merchantAuthentication = self.merchantAuth
-        getCustomerProfile.customerProfileId = str(
+        self.customer_profile = None
+        self._set_payment_profiles(profile_cache.get_or_load(
+            self.instance.authorizenet_customer_profile_id,
+            self._fetch_payment_profiles))
+
+    def _set_payment_profiles(self, payment_profiles):
+        """Set payment_profiles, and payment_profiles_dict by id"""
+
+        self.payment_profiles = payment_profiles
+
+        if payment_profiles is not None:
+            self.payment_profiles_dict = {
+                pp.customer_payment_profile_id: pp
+                for pp in payment_profiles}
+        else:
+            self.payment_profiles_dict = None
+
+    def invalidate_cache(self):
+        """Drop this customer's payment profiles from the profile cache"""
+        invalidate_customer_profile(
             self.instance.authorizenet_customer_profile_id)
-        controller = getCustomerProfileController(getCustomerProfile)
-        controller.setenvironment(self.post_url)
-        controller.execute()
 
-        self.customer_profile = controller.getresponse()
-        response = self.customer_profile
+    def mirror_payment_profile(self, customerPaymentProfileId, payment):
+        """Record a payment profile that was just saved on Authorize.net
+        in the local mirror tables"""
+
+        default_id = getattr(
+            self.instance, 'authorizenet_default_payment_profile_id', None)
+
+        mirror.record_payment_profile(
+            self.instance.authorizenet_customer_profile_id,
+            customerPaymentProfileId,
+            payment,
+            default_id is not None and
+            int(default_id) == int(customerPaymentProfileId))
+
+    def _fetch_customer_profile(self):
+        """Load the customer profile from the gateway, skipping the cache"""
+
+        controller = self._get_customer_profile_controller()
+        response = self.execute(controller)
+
+        return self._get_customer_profile_result(response)
+
+    def _fetch_payment_profiles(self):
+        self._fetch_customer_profile()
+        return getattr(self, 'payment_profiles', None)
+
+    def _get_customer_profile_controller(self):
+        """Build the controller used by get_customer_profile"""
+
+        if not self.instance.authorizenet_customer_profile_id:
+            raise AuthorizeNetError('No profile id has been set')
+
+        controller = None
+
+        if fast_requests.enabled():
+            controller = fast_requests.get_customer_profile_controller(
+                self.merchantAuth,
+                self.instance.authorizenet_customer_profile_id)
+
+        if controller is None:
+            getCustomerProfile = apicontractsv1.getCustomerProfileRequest()
+            getCustomerProfile.merchantAuthentication = self.merchantAuth
+            getCustomerProfile.customerProfileId = str(
+                self.instance.authorizenet_customer_profile_id)
+            controller = apicontrollers.getCustomerProfileController(
+                getCustomerProfile)
+
+        if profile_parser.streaming_enabled():
+            controller.stream_parser = profile_parser.CustomerProfileParser
+
+        return controller
+
+    def _get_customer_profile_result(self, response):
+        """Load payment profiles from a getCustomerProfile response"""
+
+        if isinstance(response, profile_parser.CustomerProfileResponse):
+            return self._parsed_customer_profile_result(response)
+
+        self.customer_profile = response
 
         # raise 404 if you can't reach Authorize.net
         if not hasattr(self.customer_profile, 'messages'):
             raise Http404('Unable to retrieve payment data')
 
-        print(response.messages.message.text)
-
         if (self.customer_profile.messages.resultCode == OK):
             if hasattr(self.customer_profile, 'profile'):
                 if hasattr(self.customer_profile.profile, 'paymentProfiles'):
@@ -466,28 +746,69 @@ class CustomerProfile(AuthNet):
                     self.payment_profiles = None
                     self.payment_profiles_dict = None
             else:
-                print('\t\t\tno profile attribute')
-
-            # This section needs to be abstracted into objects
-            # similar to PaymentProfile
-            if hasattr(response, 'profile'):
-                if hasattr(response.profile, 'shipToList'):
-                    for ship in response.profile.shipToList:
-                        print("Shipping Details:")
-                        print("First Name %s" % ship.firstName)
-                        print("Last Name %s" % ship.lastName)
-                        print("Address %s" % ship.address)
-                        print(
-                            "Customer Address ID %s" % ship.customerAddressId)
-            if hasattr(response, 'subscriptionIds'):
-                if hasattr(response.subscriptionIds, 'subscriptionId'):
-                    print ("list of subscriptionid:")
-                    for subscriptionid in (
-                            response.subscriptionIds.subscriptionId):
-                        print(subscriptionid)
+                logger.warning(
+                    'getCustomerProfile response without a profile',
+                    extra=self.log_extra('get_customer_profile'))
+
+            if mirror.mirror_enabled() and hasattr(response, 'profile'):
+                mirror.record_profile_response(
+                    response.profile,
+                    getattr(self.instance,
+                            'authorizenet_default_payment_profile_id', None))
+
+            if logger.isEnabledFor(logging.DEBUG):
+                profile = getattr(response, 'profile', None)
+                subscriptionIds = getattr(response, 'subscriptionIds', None)
+                logger.debug(
+                    'Loaded %s payment profiles, %s shipping addresses and '
+                    '%s subscriptions',
+                    len(self.payment_profiles or ()),
+                    len(getattr(profile, 'shipToList', ())),
+                    len(getattr(subscriptionIds, 'subscriptionId', ())),
+                    extra=self.log_extra('get_customer_profile'))
         else:
             raise AuthorizeNetError(response.messages.message[0]['text'].text)
 
+    def _parsed_customer_profile_result(self, response):
+        """Load payment profiles from a response read by profile_parser"""
+
+        self.customer_profile = response
+
+        if response.messages.resultCode != OK:
+            raise AuthorizeNetError(response.messages.message[0].text)
+
+        if response.customer_profile_id is None:
+            logger.warning(
+                'getCustomerProfile response without a profile',
+                extra=self.log_extra('get_customer_profile'))
+            return
+
+        if response.payment_profiles:
+            self.payment_profiles = response.payment_profiles
+            self.payment_profiles_dict = {
+                pp.customer_payment_profile_id: pp
+                for pp in self.payment_profiles}
+        else:
+            self.payment_profiles = None
+            self.payment_profiles_dict = None
+
+        self.shipping_addresses = response.shipping_addresses
+
+        if mirror.mirror_enabled():
+            mirror.record_parsed_profile(
+                response,
+                getattr(self.instance,
+                        'authorizenet_default_payment_profile_id', None))
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                'Loaded %s payment profiles, %s shipping addresses and '
+                '%s subscriptions',
+                len(response.payment_profiles),
+                len(response.shipping_addresses),
+                len(response.subscription_ids),
+                extra=self.log_extra('get_customer_profile'))
+
     def update_customer_payment_profile(
             self,
             payment,
@@ -499,7 +820,36 @@ class CustomerProfile(AuthNet):
             set_as_default,
             validation_mode):
 
-        print('Updating customer payment profile', customerPaymentProfileId)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                'Updating payment profile %s', customerPaymentProfileId,
+                extra=self.log_extra(
+                    'update_customer_payment_profile',
+                    payment_profile_id=customerPaymentProfileId))
+
+        controller = self._update_customer_payment_profile_controller(
+            payment,
+            customerPaymentProfileId,
+            first_name,
+            last_name,
+            contact_dictionary,
+            company_name,
+            validation_mode)
+        response = self.execute(controller)
+
+        return self._update_customer_payment_profile_result(
+            response, customerPaymentProfileId, set_as_default, payment)
+
+    def _update_customer_payment_profile_controller(
+            self,
+            payment,
+            customerPaymentProfileId,
+            first_name,
+            last_name,
+            contact_dictionary,
+            company_name,
+            validation_mode):
+        """Build the controller used by update_customer_payment_profile"""
 
         address = contact_dictionary.get('address')
         city = contact_dictionary.get('city')
@@ -522,21 +872,33 @@ class CustomerProfile(AuthNet):
             self.instance.authorizenet_customer_profile_id)
         action.validationMode = validation_mode.name
 
-        controller = updateCustomerPaymentProfileController(action)
-        controller.setenvironment(self.post_url)
-        controller.execute()
+        return apicontrollers.updateCustomerPaymentProfileController(
+            action)
 
-        response = controller.getresponse()
+    def _update_customer_payment_profile_result(
+            self, response, customerPaymentProfileId, set_as_default,
+            payment):
+        """Save the default payment profile after an
+        updateCustomerPaymentProfile response"""
 
         if response.messages.resultCode == OK:
-            msg = 'Successfully created a customer payment profile with id: {}'
-            print(msg.format(customerPaymentProfileId))
+            self.invalidate_cache()
 
             if set_as_default:
                 self.instance.authorizenet_default_payment_profile_id = int(
                     customerPaymentProfileId)
                 self.instance.save()
 
+            logger.info(
+                'Updated payment profile %s (default: %s)',
+                customerPaymentProfileId, set_as_default,
+                extra=self.log_extra(
+                    'update_customer_payment_profile',
+                    payment_profile_id=customerPaymentProfileId))
+
+            if mirror.mirror_enabled():
+                self.mirror_payment_profile(customerPaymentProfileId, payment)
+
             return customerPaymentProfileId
         else:
             raise AuthorizeNetError(response.messages.message[0]['text'].text)
@@ -608,3 +970,59 @@ class CustomerProfile(AuthNet):
             company_name,
             set_as_default,
             validation_mode)
+
+
+def get_customer_profile_ids(auth=None):
+    """Return the ids of every customer profile on the Authorize.net
+    account as a list of ints. auth is an AuthNet instance"""
+
+    auth = auth or AuthNet()
+
+    getCustomerProfileIds = apicontractsv1.getCustomerProfileIdsRequest()
+    getCustomerProfileIds.merchantAuthentication = auth.merchantAuth
+
+    controller = apicontrollers.getCustomerProfileIdsController(
+        getCustomerProfileIds)
+    response = auth.execute(controller)
+
+    if response is None or response.messages.resultCode != OK:
+        msg = 'Unable to retrieve customer profile ids'
+        if response is not None:
+            msg = response.messages.message[0]['text'].text
+        raise AuthorizeNetError(msg)
+
+    # an account without profiles has no ids element, or an empty one
+    ids = getattr(response, 'ids', None)
+
+    return [int(x) for x in getattr(ids, 'numericString', None) or []]
+
+
+def fetch_customer_profile(customer_profile_id, auth=None):
+    """Return the profile element of a getCustomerProfile response for a
+    customer profile id, without needing a model instance"""
+
+    auth = auth or AuthNet()
+    controller = None
+
+    if fast_requests.enabled():
+        controller = fast_requests.get_customer_profile_controller(
+            auth.merchantAuth, customer_profile_id)
+
+    if controller is None:
+        getCustomerProfile = apicontractsv1.getCustomerProfileRequest()
+        getCustomerProfile.merchantAuthentication = auth.merchantAuth
+        getCustomerProfile.customerProfileId = str(customer_profile_id)
+
+        controller = apicontrollers.getCustomerProfileController(
+            getCustomerProfile)
+
+    response = auth.execute(controller)
+
+    if response is None or response.messages.resultCode != OK:
+        msg = 'Unable to retrieve customer profile {}'.format(
+            customer_profile_id)
+        if response is not None:
+            msg = response.messages.message[0]['text'].text
+        raise AuthorizeNetError(msg)
+
+    return response.profile
@@ -44,6 +44,16 @@ class ECheckType(EnumTuple):
     CCD = 'CCD'
 
 
+class CardBrand(EnumTuple):
+    """Card brands, named as Authorize.net names them in cardType"""
+    Visa = 'Visa'
+    MasterCard = 'Mastercard'
+    AmericanExpress = 'American Express'
+    Discover = 'Discover'
+    JCB = 'JCB'
+    DinersClub = 'Diners Club'
+
+
 class PaymentProfileType(EnumTuple):
     """Type of Payment Profile"""
     bankAccount = 'Bank Account'
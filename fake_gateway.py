@@ -0,0 +1,783 @@
+"""An in-process stand-in for the Authorize.net XML API.
+
+FakeGateway answers the CIM, createTransaction and reporting calls this app
+makes, keeping customer profiles, payment profiles, transactions and
+settled batches in memory. Call settle() to settle the transactions made
+so far into a batch.
+Start one and point AuthNet at it with AUTHORIZE_NET_POST_URL:
+
+    with FakeGateway(latency=0.05, decline_rate=0.1) as gateway:
+        with gateway.settings():
+            CustomerProfile(instance).create_customer_profile(email)
+
+Every FakeGateway listens on its own port, so test cases can each run
+their own in parallel. For load tests, run one from the command line with
+manage.py run_fake_gateway"""
+
+from collections import Counter
+from django.test import override_settings
+from django.utils.dateparse import parse_datetime
+from payment_authorizenet.response_codes import get_response_codes
+import datetime
+import http.server
+import itertools
+import random
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+NAMESPACE = 'AnetApi/xml/v1/schema/AnetApiSchema.xsd'
+XML_DECLARATION = b'<?xml version="1.0" encoding="utf-8"?>'
+
+OK = 'Ok'
+ERROR = 'Error'
+
+APPROVED = '1'
+DECLINED = '2'
+
+# (code, text) of the messages returned by the fake gateway
+SUCCESSFUL = ('I00001', 'Successful.')
+GENERAL_ERROR = (
+    'E00001', 'An error occurred during processing. Please try again.')
+DUPLICATE = ('E00039', 'A duplicate record with ID {} already exists.')
+NOT_FOUND = ('E00040', 'The record cannot be found.')
+TRANSACTION_FAILED = ('E00027', 'The transaction was unsuccessful.')
+NOT_SUPPORTED = ('E00045', '{} is not supported by the fake gateway.')
+
+# transactionStatus of reported transactions
+CAPTURED = 'capturedPendingSettlement'
+SETTLED = 'settledSuccessfully'
+DECLINED_STATUS = 'declined'
+
+AUTH_CODE_CHARS = 'ABCDEFGHJKLMNPQRSTUVWXYZ0123456789'
+
+CARD_TYPES = {
+    '3': 'AmericanExpress',
+    '4': 'Visa',
+    '5': 'MasterCard',
+    '6': 'Discover',
+}
+
+
+def _local(tag):
+    """Strip the namespace from an ElementTree tag"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _find(element, path):
+    """Return the text at a '/' separated path below element, or None"""
+
+    for name in path.split('/'):
+        if element is None:
+            return None
+        element = next(
+            (child for child in element if _local(child.tag) == name), None)
+
+    return None if element is None else (element.text or '')
+
+
+def _child(element, name):
+    return next(
+        (child for child in element if _local(child.tag) == name), None)
+
+
+def _add(parent, tag, text=None):
+    """Append a child element, empty when text is None"""
+
+    element = ET.SubElement(parent, tag)
+
+    if text is not None:
+        element.text = str(text)
+
+    return element
+
+
+def _serialize(response):
+    # the declaration Authorize.net sends. Other characters are escaped
+    return XML_DECLARATION + ET.tostring(response)
+
+
+def _mask(value):
+    return 'XXXX' + (value or '')[-4:]
+
+
+def _utc(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _local_time(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%S')
+
+
+class FakeGateway:
+    """An Authorize.net XML API served from memory.
+
+    latency - seconds to wait before each response, or a (low, high)
+        tuple to wait a random time in that range
+    error_rate - share of requests answered with E00001
+    decline_rate - share of createTransaction requests that are declined
+    decline_codes - response reason codes a decline picks from
+    seed - seed the random choices, to repeat a run exactly"""
+
+    def __init__(
+            self, latency=0, error_rate=0, decline_rate=0,
+            decline_codes=('2',), seed=None, host='127.0.0.1', port=0):
+        super().__init__()
+
+        if not 0 <= error_rate <= 1 or not 0 <= decline_rate <= 1:
+            raise ValueError('error_rate and decline_rate must be from 0 to 1')
+
+        if not decline_codes:
+            raise ValueError('decline_codes must not be empty')
+
+        self.latency = latency
+        self.error_rate = error_rate
+        self.decline_rate = decline_rate
+        self.decline_codes = tuple(str(code) for code in decline_codes)
+        self.host = host
+        self.port = port
+
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+        self.reset()
+
+    def reset(self):
+        """Forget every profile and transaction"""
+
+        with self.lock:
+            self.customer_profiles = {}
+            self.payment_profiles = {}
+            self.transactions = {}
+            self.batches = {}
+            self.requests = Counter()
+
+            self.customer_profile_ids = itertools.count(1500000001)
+            self.payment_profile_ids = itertools.count(1600000001)
+            self.transaction_ids = itertools.count(60000001)
+            self.batch_ids = itertools.count(10000001)
+
+    def settle(self, settlement_time=None):
+        """Settle every unsettled transaction into a new batch and return
+        its id, or None if there was nothing to settle"""
+
+        if settlement_time is None:
+            settlement_time = datetime.datetime.now(datetime.timezone.utc)
+
+        with self.lock:
+            unsettled = [
+                transaction_id
+                for transaction_id, transaction in self.transactions.items()
+                if transaction['batchId'] is None]
+
+            if not unsettled:
+                return None
+
+            batch_id = str(next(self.batch_ids))
+            payment_methods = set()
+
+            for transaction_id in unsettled:
+                transaction = self.transactions[transaction_id]
+                transaction['batchId'] = batch_id
+                payment_methods.add(
+                    'eCheck' if transaction['accountType'] == 'eCheck'
+                    else 'creditCard')
+
+                if transaction['transactionStatus'] == CAPTURED:
+                    transaction['transactionStatus'] = SETTLED
+
+            self.batches[batch_id] = {
+                'settlementTimeUTC': settlement_time,
+                'paymentMethod': 'creditCard'
+                if 'creditCard' in payment_methods else 'eCheck',
+                'transactions': unsettled,
+            }
+
+        return batch_id
+
+    # ********** Running the server *********
+
+    @property
+    def url(self):
+        if self.server is None:
+            return None
+
+        host, port = self.server.server_address[:2]
+        return 'http://{}:{}/xml/v1/request.api'.format(host, port)
+
+    def start(self):
+        """Serve requests on a background thread and return the URL"""
+
+        if self.server is None:
+            self.server = http.server.ThreadingHTTPServer(
+                (self.host, self.port), _handler(self))
+            self.server.daemon_threads = True
+            self.thread = threading.Thread(
+                target=self.server.serve_forever, daemon=True)
+            self.thread.start()
+
+        return self.url
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.thread.join()
+            self.server = None
+            self.thread = None
+
+    def settings(self):
+        """Return override_settings pointing AuthNet at this gateway"""
+        return override_settings(AUTHORIZE_NET_POST_URL=self.start())
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    # ********** Answering requests *********
+
+    def handle(self, body):
+        """Return the XML response to an XML API request"""
+
+        request = ET.fromstring(body)
+        operation = _local(request.tag)
+
+        if operation.endswith('Request'):
+            operation = operation[:-len('Request')]
+
+        with self.lock:
+            self.requests[operation] += 1
+
+        self.wait()
+
+        response = ET.Element(operation + 'Response', xmlns=NAMESPACE)
+        ref_id = _find(request, 'refId')
+
+        if ref_id is not None:
+            _add(response, 'refId', ref_id)
+
+        if self.random.random() < self.error_rate:
+            return self.error(response, *GENERAL_ERROR)
+
+        handler = getattr(self, 'do_' + operation, None)
+
+        if handler is None:
+            code, text = NOT_SUPPORTED
+            return self.error(response, code, text.format(operation))
+
+        with self.lock:
+            handler(request, response)
+
+        return _serialize(response)
+
+    def wait(self):
+        latency = self.latency
+
+        if isinstance(latency, (tuple, list)):
+            latency = self.random.uniform(*latency)
+
+        if latency:
+            time.sleep(latency)
+
+    def messages(self, response, code, text, result_code=OK):
+        messages = _add(response, 'messages')
+        _add(messages, 'resultCode', result_code)
+        message = _add(messages, 'message')
+        _add(message, 'code', code)
+        _add(message, 'text', text)
+
+    def error(self, response, code, text):
+        self.messages(response, code, text, ERROR)
+        return _serialize(response)
+
+    def profile_or_error(self, request, response):
+        """Return the customer profile a request refers to, adding
+        E00040 to the response when there isn't one"""
+
+        customer_profile_id = _find(request, 'customerProfileId')
+        customer = self.customer_profiles.get(customer_profile_id)
+
+        if customer is None:
+            self.messages(response, *NOT_FOUND, result_code=ERROR)
+
+        return customer
+
+    # ********** CIM *********
+
+    def do_createCustomerProfile(self, request, response):
+        profile = _child(request, 'profile')
+        merchant_customer_id = _find(profile, 'merchantCustomerId')
+        description = _find(profile, 'description')
+        email = _find(profile, 'email')
+
+        # a profile with the same three values is a duplicate
+        for customer_profile_id, customer in self.customer_profiles.items():
+            if (customer['merchantCustomerId'], customer['description'],
+                    customer['email']) == \
+                    (merchant_customer_id, description, email):
+                code, text = DUPLICATE
+                self.messages(
+                    response, code, text.format(customer_profile_id), ERROR)
+                return
+
+        customer_profile_id = str(next(self.customer_profile_ids))
+        self.customer_profiles[customer_profile_id] = {
+            'merchantCustomerId': merchant_customer_id,
+            'description': description,
+            'email': email,
+            'paymentProfiles': [],
+        }
+
+        self.messages(response, *SUCCESSFUL)
+        _add(response, 'customerProfileId', customer_profile_id)
+        _add(response, 'customerPaymentProfileIdList')
+        _add(response, 'customerShippingAddressIdList')
+        _add(response, 'validationDirectResponseList')
+
+    def do_getCustomerProfile(self, request, response):
+        customer = self.profile_or_error(request, response)
+
+        if customer is None:
+            return
+
+        self.messages(response, *SUCCESSFUL)
+
+        profile = _add(response, 'profile')
+
+        for name in ('merchantCustomerId', 'description', 'email'):
+            if customer[name] is not None:
+                _add(profile, name, customer[name])
+
+        _add(profile, 'customerProfileId', _find(request, 'customerProfileId'))
+
+        for payment_profile_id in customer['paymentProfiles']:
+            self.add_payment_profile(
+                _add(profile, 'paymentProfiles'),
+                payment_profile_id,
+                self.payment_profiles[payment_profile_id])
+
+    def add_payment_profile(self, element, payment_profile_id, stored):
+        _add(element, 'customerType', stored['customerType'])
+
+        billTo = _add(element, 'billTo')
+        for name, value in stored['billTo']:
+            _add(billTo, name, value)
+
+        _add(element, 'customerPaymentProfileId', payment_profile_id)
+
+        payment = _add(element, 'payment')
+
+        if 'creditCard' in stored:
+            card = stored['creditCard']
+            creditCard = _add(payment, 'creditCard')
+            _add(creditCard, 'cardNumber', _mask(card['cardNumber']))
+            _add(creditCard, 'expirationDate', 'XXXX')
+            _add(creditCard, 'cardType', card['cardType'])
+        else:
+            bank = stored['bankAccount']
+            bankAccount = _add(payment, 'bankAccount')
+            _add(bankAccount, 'accountType', bank['accountType'])
+            _add(bankAccount, 'routingNumber', _mask(bank['routingNumber']))
+            _add(bankAccount, 'accountNumber', _mask(bank['accountNumber']))
+            _add(bankAccount, 'nameOnAccount', bank['nameOnAccount'])
+            _add(bankAccount, 'echeckType', 'WEB')
+            _add(bankAccount, 'bankName', bank['bankName'])
+
+    def do_getCustomerProfileIds(self, request, response):
+        self.messages(response, *SUCCESSFUL)
+
+        ids = _add(response, 'ids')
+        for customer_profile_id in self.customer_profiles:
+            _add(ids, 'numericString', customer_profile_id)
+
+    def stored_payment_profile(self, paymentProfile):
+        """Read the payment profile of a create or update request"""
+
+        stored = {'customerType': _find(paymentProfile, 'customerType')}
+
+        billTo = _child(paymentProfile, 'billTo')
+        stored['billTo'] = [] if billTo is None else [
+            (_local(child.tag), child.text) for child in billTo]
+
+        payment = _child(paymentProfile, 'payment')
+        creditCard = _child(payment, 'creditCard')
+
+        if creditCard is not None:
+            card_number = _find(creditCard, 'cardNumber')
+            stored['creditCard'] = {
+                'cardNumber': card_number,
+                'expirationDate': _find(creditCard, 'expirationDate'),
+                'cardType': CARD_TYPES.get(card_number[:1], 'Visa'),
+            }
+        else:
+            bankAccount = _child(payment, 'bankAccount')
+            stored['bankAccount'] = {
+                name: _find(bankAccount, name)
+                for name in ('accountType', 'routingNumber', 'accountNumber',
+                             'nameOnAccount', 'bankName')}
+
+        return stored
+
+    def do_createCustomerPaymentProfile(self, request, response):
+        customer = self.profile_or_error(request, response)
+
+        if customer is None:
+            return
+
+        payment_profile_id = str(next(self.payment_profile_ids))
+        self.payment_profiles[payment_profile_id] = \
+            self.stored_payment_profile(_child(request, 'paymentProfile'))
+        customer['paymentProfiles'].append(payment_profile_id)
+
+        self.messages(response, *SUCCESSFUL)
+        _add(response, 'customerProfileId', _find(request, 'customerProfileId'))
+        _add(response, 'customerPaymentProfileId', payment_profile_id)
+
+    def do_updateCustomerPaymentProfile(self, request, response):
+        customer = self.profile_or_error(request, response)
+
+        if customer is None:
+            return
+
+        paymentProfile = _child(request, 'paymentProfile')
+        payment_profile_id = _find(paymentProfile, 'customerPaymentProfileId')
+
+        if payment_profile_id not in customer['paymentProfiles']:
+            self.messages(response, *NOT_FOUND, result_code=ERROR)
+            return
+
+        stored = self.stored_payment_profile(paymentProfile)
+        if stored['customerType'] is None:
+            stored['customerType'] = \
+                self.payment_profiles[payment_profile_id]['customerType']
+
+        self.payment_profiles[payment_profile_id] = stored
+        self.messages(response, *SUCCESSFUL)
+
+    def do_deleteCustomerPaymentProfile(self, request, response):
+        customer = self.profile_or_error(request, response)
+
+        if customer is None:
+            return
+
+        payment_profile_id = _find(request, 'customerPaymentProfileId')
+
+        if payment_profile_id not in customer['paymentProfiles']:
+            self.messages(response, *NOT_FOUND, result_code=ERROR)
+            return
+
+        customer['paymentProfiles'].remove(payment_profile_id)
+        del self.payment_profiles[payment_profile_id]
+        self.messages(response, *SUCCESSFUL)
+
+    def do_deleteCustomerProfile(self, request, response):
+        customer = self.profile_or_error(request, response)
+
+        if customer is None:
+            return
+
+        for payment_profile_id in customer['paymentProfiles']:
+            del self.payment_profiles[payment_profile_id]
+
+        del self.customer_profiles[_find(request, 'customerProfileId')]
+        self.messages(response, *SUCCESSFUL)
+
+    # ********** Transactions *********
+
+    def do_createTransaction(self, request, response):
+        transactionRequest = _child(request, 'transactionRequest')
+        customer_profile_id = _find(
+            transactionRequest, 'profile/customerProfileId')
+        payment_profile_id = _find(
+            transactionRequest, 'profile/paymentProfile/paymentProfileId')
+
+        customer = self.customer_profiles.get(customer_profile_id)
+
+        if customer is None or \
+                payment_profile_id not in customer['paymentProfiles']:
+            self.messages(response, *NOT_FOUND, result_code=ERROR)
+            return
+
+        stored = self.payment_profiles[payment_profile_id]
+
+        if 'creditCard' in stored:
+            account_number = _mask(stored['creditCard']['cardNumber'])
+            account_type = stored['creditCard']['cardType']
+        else:
+            account_number = _mask(stored['bankAccount']['accountNumber'])
+            account_type = 'eCheck'
+
+        transaction_id = str(next(self.transaction_ids))
+
+        if self.random.random() < self.decline_rate:
+            response_code = DECLINED
+            reason_code = self.random.choice(self.decline_codes)
+            auth_code = ''
+        else:
+            response_code = APPROVED
+            reason_code = '1'
+            auth_code = ''.join(
+                self.random.choice(AUTH_CODE_CHARS) for _ in range(6))
+
+        self.transactions[transaction_id] = {
+            'transactionType': _find(transactionRequest, 'transactionType'),
+            'amount': _find(transactionRequest, 'amount'),
+            'invoiceNumber': _find(transactionRequest, 'order/invoiceNumber'),
+            'refId': _find(request, 'refId'),
+            'customerProfileId': customer_profile_id,
+            'customerPaymentProfileId': payment_profile_id,
+            'responseCode': response_code,
+            'reasonCode': reason_code,
+            'authCode': auth_code,
+            'accountNumber': account_number,
+            'accountType': account_type,
+            'submitTimeUTC': datetime.datetime.now(datetime.timezone.utc),
+            'transactionStatus':
+                CAPTURED if response_code == APPROVED else DECLINED_STATUS,
+            'batchId': None,
+        }
+
+        if response_code == APPROVED:
+            self.messages(response, *SUCCESSFUL)
+        else:
+            self.messages(response, *TRANSACTION_FAILED, result_code=ERROR)
+
+        reason_text = get_response_codes().text(reason_code)
+
+        tr = _add(response, 'transactionResponse')
+        _add(tr, 'responseCode', response_code)
+        _add(tr, 'authCode', auth_code)
+        _add(tr, 'avsResultCode', 'Y' if 'creditCard' in stored else 'P')
+        _add(tr, 'cvvResultCode', 'P' if 'creditCard' in stored else '')
+        _add(tr, 'cavvResultCode', '2' if 'creditCard' in stored else '')
+        _add(tr, 'transId', transaction_id)
+        _add(tr, 'refTransID', '')
+        _add(tr, 'transHash', '')
+        _add(tr, 'testRequest', '0')
+        _add(tr, 'accountNumber', account_number)
+        _add(tr, 'accountType', account_type)
+
+        if response_code == APPROVED:
+            message = _add(_add(tr, 'messages'), 'message')
+            _add(message, 'code', reason_code)
+            _add(message, 'description', reason_text)
+        else:
+            error = _add(_add(tr, 'errors'), 'error')
+            _add(error, 'errorCode', reason_code)
+            _add(error, 'errorText', reason_text)
+
+        _add(tr, 'transHashSha2', '')
+
+        profile = _add(tr, 'profile')
+        _add(profile, 'customerProfileId', customer_profile_id)
+        _add(profile, 'customerPaymentProfileId', payment_profile_id)
+
+    # ********** Transaction reporting *********
+
+    def do_getSettledBatchList(self, request, response):
+        last = _find(request, 'lastSettlementDate')
+        last = datetime.datetime.now(datetime.timezone.utc) \
+            if last is None else parse_datetime(last)
+        first = _find(request, 'firstSettlementDate')
+        first = last - datetime.timedelta(days=1) \
+            if first is None else parse_datetime(first)
+
+        self.messages(response, *SUCCESSFUL)
+        batchList = None
+
+        for batch_id, batch in self.batches.items():
+            if not first <= batch['settlementTimeUTC'] <= last:
+                continue
+
+            if batchList is None:
+                batchList = _add(response, 'batchList')
+
+            element = _add(batchList, 'batch')
+            _add(element, 'batchId', batch_id)
+            _add(element, 'settlementTimeUTC',
+                 _utc(batch['settlementTimeUTC']))
+            _add(element, 'settlementTimeLocal',
+                 _local_time(batch['settlementTimeUTC']))
+            _add(element, 'settlementState', 'settledSuccessfully')
+            _add(element, 'paymentMethod', batch['paymentMethod'])
+
+    def page(self, request, response, transaction_ids):
+        """Add the sorted page of transactions a list request asks for"""
+
+        transaction_ids = sorted(
+            transaction_ids,
+            key=lambda transaction_id:
+                (self.transactions[transaction_id]['submitTimeUTC'],
+                 int(transaction_id)),
+            reverse=_find(request, 'sorting/orderDescending') == 'true')
+
+        limit = _find(request, 'paging/limit')
+
+        if limit is not None:
+            limit = int(limit)
+            start = (int(_find(request, 'paging/offset')) - 1) * limit
+            page = transaction_ids[start:start + limit]
+        else:
+            page = transaction_ids
+
+        self.messages(response, *SUCCESSFUL)
+
+        if page:
+            transactions = _add(response, 'transactions')
+            for transaction_id in page:
+                self.add_transaction_summary(
+                    _add(transactions, 'transaction'), transaction_id)
+
+        _add(response, 'totalNumInResultSet', len(transaction_ids))
+
+    def add_transaction_summary(self, element, transaction_id):
+        transaction = self.transactions[transaction_id]
+
+        _add(element, 'transId', transaction_id)
+        _add(element, 'submitTimeUTC', _utc(transaction['submitTimeUTC']))
+        _add(element, 'submitTimeLocal',
+             _local_time(transaction['submitTimeUTC']))
+        _add(element, 'transactionStatus', transaction['transactionStatus'])
+
+        if transaction['invoiceNumber'] is not None:
+            _add(element, 'invoiceNumber', transaction['invoiceNumber'])
+
+        _add(element, 'accountType', transaction['accountType'])
+        _add(element, 'accountNumber', transaction['accountNumber'])
+        _add(element, 'settleAmount', self.settle_amount(transaction))
+
+        profile = _add(element, 'profile')
+        _add(profile, 'customerProfileId', transaction['customerProfileId'])
+        _add(profile, 'customerPaymentProfileId',
+             transaction['customerPaymentProfileId'])
+
+    def settle_amount(self, transaction):
+        if transaction['transactionStatus'] == DECLINED_STATUS:
+            return '0.00'
+        return transaction['amount']
+
+    def do_getTransactionList(self, request, response):
+        batch = self.batches.get(_find(request, 'batchId'))
+
+        if batch is None:
+            self.messages(response, *NOT_FOUND, result_code=ERROR)
+            return
+
+        self.page(request, response, batch['transactions'])
+
+    def do_getUnsettledTransactionList(self, request, response):
+        self.page(request, response, [
+            transaction_id
+            for transaction_id, transaction in self.transactions.items()
+            if transaction['batchId'] is None])
+
+    def do_getTransactionListForCustomer(self, request, response):
+        customer_profile_id = _find(request, 'customerProfileId')
+
+        if customer_profile_id not in self.customer_profiles:
+            self.messages(response, *NOT_FOUND, result_code=ERROR)
+            return
+
+        self.page(request, response, [
+            transaction_id
+            for transaction_id, transaction in self.transactions.items()
+            if transaction['customerProfileId'] == customer_profile_id])
+
+    def do_getTransactionDetails(self, request, response):
+        transaction_id = _find(request, 'transId')
+        transaction = self.transactions.get(transaction_id)
+
+        if transaction is None:
+            self.messages(response, *NOT_FOUND, result_code=ERROR)
+            return
+
+        self.messages(response, *SUCCESSFUL)
+
+        element = _add(response, 'transaction')
+        _add(element, 'transId', transaction_id)
+        _add(element, 'submitTimeUTC', _utc(transaction['submitTimeUTC']))
+        _add(element, 'submitTimeLocal',
+             _local_time(transaction['submitTimeUTC']))
+        _add(element, 'transactionType', transaction['transactionType'])
+        _add(element, 'transactionStatus', transaction['transactionStatus'])
+        _add(element, 'responseCode', transaction['responseCode'])
+        _add(element, 'responseReasonCode', transaction['reasonCode'])
+        _add(element, 'responseReasonDescription',
+             get_response_codes().text(transaction['reasonCode']))
+        _add(element, 'authCode', transaction['authCode'])
+
+        batch = self.batches.get(transaction['batchId'])
+
+        if batch is not None:
+            batchElement = _add(element, 'batch')
+            _add(batchElement, 'batchId', transaction['batchId'])
+            _add(batchElement, 'settlementTimeUTC',
+                 _utc(batch['settlementTimeUTC']))
+            _add(batchElement, 'settlementTimeLocal',
+                 _local_time(batch['settlementTimeUTC']))
+            _add(batchElement, 'settlementState', 'settledSuccessfully')
+
+        if transaction['invoiceNumber'] is not None:
+            _add(_add(element, 'order'), 'invoiceNumber',
+                 transaction['invoiceNumber'])
+
+        _add(element, 'authAmount', transaction['amount'])
+        _add(element, 'settleAmount', self.settle_amount(transaction))
+
+        payment = _add(element, 'payment')
+
+        if transaction['accountType'] == 'eCheck':
+            bankAccount = _add(payment, 'bankAccount')
+            _add(bankAccount, 'routingNumber', 'XXXX')
+            _add(bankAccount, 'accountNumber', transaction['accountNumber'])
+            _add(bankAccount, 'nameOnAccount', '')
+        else:
+            creditCard = _add(payment, 'creditCard')
+            _add(creditCard, 'cardNumber', transaction['accountNumber'])
+            _add(creditCard, 'expirationDate', 'XXXX')
+            _add(creditCard, 'cardType', transaction['accountType'])
+
+        _add(element, 'recurringBilling', 'false')
+
+        profile = _add(element, 'profile')
+        _add(profile, 'customerProfileId', transaction['customerProfileId'])
+        _add(profile, 'customerPaymentProfileId',
+             transaction['customerPaymentProfileId'])
+
+
+def _handler(gateway):
+    """Return a request handler class that answers with gateway"""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+
+        protocol_version = 'HTTP/1.1'
+
+        # headers and body are written separately. Without this, keep-alive
+        # connections wait on delayed ACKs for every response
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers['Content-Length']))
+
+            try:
+                content = gateway.handle(body)
+                status = 200
+            except ET.ParseError:
+                content = b'Unable to parse the request'
+                status = 400
+
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/xml; charset=utf-8')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
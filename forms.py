@@ -9,6 +9,11 @@ from payment_authorizenet.enums import (
     AccountType,
     CustomerType)
 from payment_authorizenet.merchant_auth import AuthorizeNetError
+from payment_authorizenet.routing_directory import get_routing_directory
+from payment_authorizenet.validators import (
+    MAX_CARD_DIGITS,
+    validate_card_number,
+    validate_routing_number)
 
 
 # ****************** Validators
@@ -245,10 +250,11 @@ class CreditCardForm(ContactForm):
     credit_card_number = forms.CharField(
         widget=forms.TextInput(attrs={'type': 'number'}),
         validators=[
-            length_range(
-                constants.MIN_CREDIT_CARD_DIGITS,
-                constants.MAX_CREDIT_CARD_DIGITS),
-            is_integer])
+            # validate_card_number knows the lengths of each brand, up to
+            # 19 digits
+            length_range(constants.MIN_CREDIT_CARD_DIGITS, MAX_CARD_DIGITS),
+            is_integer,
+            validate_card_number])
     expiration_month = forms.ChoiceField()
     expiration_year = forms.ChoiceField()
     card_code = forms.CharField(
@@ -282,6 +288,32 @@ class ECheckForm(ContactForm):
             fields[key] = self.fields.pop(key)
         self.fields = fields
 
+    def clean(self):
+        """Fill in a blank bank_name from the routing directory. Without
+        one, bank_name must be entered"""
+
+        cleaned_data = super().clean()
+
+        if cleaned_data.get('bank_name') or \
+                'routing_number' not in cleaned_data:
+            return cleaned_data
+
+        directory = get_routing_directory()
+        entry = None
+
+        if directory is not None:
+            entry = directory.get(cleaned_data['routing_number'])
+
+        if entry is not None and entry.bank_name:
+            cleaned_data['bank_name'] = \
+                entry.bank_name[:constants.MAX_BANK_NAME_CHARS]
+        else:
+            self.add_error('bank_name', ValidationError(
+                self.fields['bank_name'].error_messages['required'],
+                code='required'))
+
+        return cleaned_data
+
     def create_payment_profile(self, customer_profile):
         """Create a Credit Card Payment Profile using this form
 
@@ -318,11 +350,14 @@ class ECheckForm(ContactForm):
             length_range(
                 constants.ABA_DIGITS,
                 constants.ABA_DIGITS),
-            is_integer])
+            is_integer,
+            validate_routing_number])
     account_number = forms.CharField(
         widget=forms.TextInput(attrs={'type': 'number'}),
         validators=[is_integer])
     name_on_account = forms.CharField(
         max_length=constants.MAX_NAME_ON_ACCOUNT_CHARS)
+    # filled in from the routing directory when left blank
     bank_name = forms.CharField(
-        max_length=constants.MAX_BANK_NAME_CHARS)
+        max_length=constants.MAX_BANK_NAME_CHARS,
+        required=False)
@@ -0,0 +1,383 @@
+"""Charge each invoice (or ref_id) only once.
+
+When AUTHORIZE_NET_IDEMPOTENT_CHARGES is 'invoice_number' or 'ref_id',
+charge_customer_profile() first claims a key made of the customer profile
+id and that value in the IdempotentCharge table:
+
+  - the first call claims the key, charges, and stores the Transaction
+    once it is approved
+  - a repeated call returns the stored Transaction without charging
+  - a call made while the first is still in flight waits for its result,
+    up to AUTHORIZE_NET_IDEMPOTENCY_WAIT seconds (at most MAX_WAIT)
+
+A declined charge releases its claim, so the invoice can be paid with
+another card. A charge that raised or got no response may still have gone
+through, so its claim is kept as unknown. So is a claim held longer than
+AUTHORIZE_NET_IDEMPOTENCY_LEASE seconds, as when the process making the
+charge died. The next call for the key looks the invoice number up in
+the transactions of its customer profile: if it was charged, that
+Transaction is stored and returned, and otherwise the call charges. Charges keyed by
+ref_id can't be looked up, so their unknown claims raise AuthorizeNetError
+until the row is deleted by hand."""
+
+from asgiref.sync import sync_to_async
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from payment_authorizenet.merchant_auth import AuthNet, AuthorizeNetError
+from payment_authorizenet.models import IdempotentCharge
+from payment_authorizenet.records import integer, text
+from payment_authorizenet.response_codes import get_response_codes
+from payment_authorizenet.sdk import apicontractsv1, apicontrollers
+from payment_authorizenet.transaction import Transaction
+import datetime
+import itertools
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+INVOICE_NUMBER = 'invoice_number'
+REF_ID = 'ref_id'
+KEY_FIELDS = (INVOICE_NUMBER, REF_ID)
+
+DEFAULT_WAIT = 10  # seconds
+# waits are capped well below the timeout of a web request, so a repeat
+# fails with 'still in progress' rather than tying up its worker
+MAX_WAIT = 20  # seconds
+DEFAULT_LEASE = 600  # seconds
+POLL_INTERVAL = 0.1  # seconds
+LOOKUP_PAGE_SIZE = 100
+
+OK = 'Ok'
+
+# transactionStatus of transactions that took no money
+NOT_CHARGED = frozenset([
+    'declined',
+    'voided',
+    'expired',
+    'generalError',
+    'communicationError',
+    'failedReview',
+    'settlementError',
+])
+
+
+def key_field():
+    """The charge argument charges are keyed by, or None when idempotent
+    charges are off"""
+    return getattr(settings, 'AUTHORIZE_NET_IDEMPOTENT_CHARGES', None)
+
+
+def charge_key(customer_profile_id, ref_id, invoice_number):
+    """Return the idempotency key of a charge, or None if charges are not
+    idempotent or the charge has no value to key it by"""
+
+    field = key_field()
+
+    if field is None:
+        return None
+
+    value = invoice_number if field == INVOICE_NUMBER else ref_id
+
+    if value is None or value == '':
+        return None
+
+    return '{}:{}'.format(customer_profile_id, value)
+
+
+def _amount(amount):
+    try:
+        return Decimal(str(amount))
+    except InvalidOperation:
+        raise ValueError('{!r} is not an amount'.format(amount))
+
+
+def _lease():
+    seconds = getattr(
+        settings, 'AUTHORIZE_NET_IDEMPOTENCY_LEASE', DEFAULT_LEASE)
+    return timezone.now() + datetime.timedelta(seconds=seconds)
+
+
+def _expired(charge):
+    return charge.status == IdempotentCharge.UNKNOWN or (
+        charge.status == IdempotentCharge.PENDING and
+        charge.lease_expires is not None and
+        charge.lease_expires <= timezone.now())
+
+
+def claim(key, payment_profile_id, amount, wait=None):
+    """Claim key for a new charge and return None, or return the
+    Transaction of the charge that already claimed it.
+
+    Raises ValueError if key was charged to a different payment profile or
+    amount, and AuthorizeNetError if the other charge is still in flight
+    after waiting"""
+
+    payment_profile_id = str(payment_profile_id)
+    amount = _amount(amount)
+
+    try:
+        with transaction.atomic():
+            IdempotentCharge.objects.create(
+                key=key, payment_profile_id=payment_profile_id,
+                amount=str(amount), lease_expires=_lease())
+        return None
+    except IntegrityError:
+        pass
+
+    if wait is None:
+        wait = getattr(settings, 'AUTHORIZE_NET_IDEMPOTENCY_WAIT',
+                       DEFAULT_WAIT)
+
+    deadline = time.monotonic() + min(wait, MAX_WAIT)
+
+    while True:
+        charge = IdempotentCharge.objects.filter(key=key).first()
+
+        if charge is None:
+            # the other charge released its claim. Try to take it over
+            return claim(key, payment_profile_id, amount,
+                         max(deadline - time.monotonic(), 0))
+
+        if _expired(charge):
+            result = _take_over(charge, payment_profile_id, amount)
+
+            if result is None or result is not charge:
+                return result
+
+            # another call took it over first. Wait on that one
+        elif charge.status == IdempotentCharge.COMPLETE:
+            if (charge.payment_profile_id, _amount(charge.amount)) != \
+                    (payment_profile_id, amount):
+                msg = 'The charge {} was already made for payment ' \
+                      'profile {} and amount {}'
+                raise ValueError(msg.format(
+                    key, charge.payment_profile_id, charge.amount))
+
+            return Transaction.from_dict(json.loads(charge.result))
+
+        if time.monotonic() >= deadline:
+            msg = 'The charge {} is still in progress'
+            raise AuthorizeNetError(msg.format(key))
+
+        time.sleep(POLL_INTERVAL)
+
+
+def _take_over(charge, payment_profile_id, amount):
+    """Resolve a charge whose outcome is unknown. Returns None when this
+    call now holds the claim and should charge, the Transaction when the
+    charge went through, or charge itself when another call took the
+    claim over first"""
+
+    taken = IdempotentCharge.objects.filter(
+        pk=charge.pk, status=charge.status,
+        lease_expires=charge.lease_expires).update(
+            status=IdempotentCharge.PENDING, lease_expires=_lease())
+
+    if not taken:
+        return charge
+
+    try:
+        found = find_charge(charge.key)
+    except BaseException:
+        IdempotentCharge.objects.filter(pk=charge.pk).update(
+            status=IdempotentCharge.UNKNOWN)
+        raise
+
+    if found is None:
+        logger.info(
+            'Charge %s was not made. Charging it again', charge.key,
+            extra={'operation': 'createTransaction', 'key': charge.key})
+
+        IdempotentCharge.objects.filter(pk=charge.pk).update(
+            payment_profile_id=payment_profile_id, amount=str(amount))
+        return None
+
+    complete(charge.key, found)
+    charge.refresh_from_db()
+
+    if (charge.payment_profile_id, _amount(charge.amount)) != \
+            (payment_profile_id, amount):
+        msg = 'The charge {} was already made for payment profile {} ' \
+              'and amount {}'
+        raise ValueError(msg.format(
+            charge.key, charge.payment_profile_id, charge.amount))
+
+    return found
+
+
+def find_charge(key):
+    """Look the invoice number of key up in the transactions of its
+    customer profile and return the Transaction that charged it, or None
+    if it was not charged. Raises AuthorizeNetError if the key can't be
+    looked up"""
+
+    if key_field() != INVOICE_NUMBER:
+        msg = 'The outcome of the charge {} is unknown. Check it in the ' \
+              'Merchant Interface and delete its IdempotentCharge row to ' \
+              'charge it again'
+        raise AuthorizeNetError(msg.format(key))
+
+    charge = IdempotentCharge.objects.get(key=key)
+    customer_profile_id, invoice_number = key.split(':', 1)
+
+    # allow for the clocks of this host and the gateway to differ
+    since = charge.created - datetime.timedelta(minutes=5)
+
+    for summary in _customer_transactions(customer_profile_id):
+        submitted = parse_datetime(text(summary.submitTimeUTC))
+
+        # newest first, so the rest were made before the claim
+        if submitted is not None and submitted < since:
+            break
+
+        if text(getattr(summary, 'invoiceNumber', None)) == invoice_number \
+                and text(summary.transactionStatus) not in NOT_CHARGED:
+            return _transaction(summary)
+
+    return None
+
+
+def _customer_transactions(customer_profile_id):
+    """Yield the transactions of a customer profile, newest first"""
+
+    auth = AuthNet()
+
+    sorting = apicontractsv1.TransactionListSorting()
+    sorting.orderBy = apicontractsv1.TransactionListOrderFieldEnum \
+        .submitTimeUTC
+    sorting.orderDescending = True
+
+    for offset in itertools.count(1):
+        request = apicontractsv1.getTransactionListForCustomerRequest()
+        request.merchantAuthentication = auth.merchantAuth
+        request.customerProfileId = str(customer_profile_id)
+        request.sorting = sorting
+        request.paging = apicontractsv1.Paging()
+        request.paging.limit = LOOKUP_PAGE_SIZE
+        request.paging.offset = offset
+
+        response = auth.execute(
+            apicontrollers.getTransactionListForCustomerController(request))
+
+        if response is None:
+            raise AuthorizeNetError('Null response from Authorize.net')
+
+        if response.messages.resultCode != OK:
+            raise AuthorizeNetError(response.messages.message[0]['text'].text)
+
+        transactions = getattr(response, 'transactions', None)
+        page = [] if transactions is None else list(
+            getattr(transactions, 'transaction', []))
+
+        yield from page
+
+        if len(page) < LOOKUP_PAGE_SIZE:
+            return
+
+
+def _transaction(summary):
+    """A Transaction made from the transaction summary of a charge"""
+
+    profile = getattr(summary, 'profile', None)
+
+    return Transaction.from_dict({
+        'result': Transaction.APPROVED,
+        'approval_code': get_response_codes().approval_code,
+        'transaction_response': {
+            'response_code': 1,
+            'transaction_id': text(summary.transId),
+            'account_number': text(getattr(summary, 'accountNumber', None)),
+            'account_type': text(getattr(summary, 'accountType', None)),
+            'profile': {
+                'customer_profile_id': integer(
+                    getattr(profile, 'customerProfileId', None)),
+                'customer_payment_profile_id': integer(
+                    getattr(profile, 'customerPaymentProfileId', None)),
+            },
+        },
+    })
+
+
+def complete(key, result):
+    """Store the Transaction of an approved charge"""
+
+    IdempotentCharge.objects.filter(key=key).update(
+        status=IdempotentCharge.COMPLETE,
+        result=json.dumps(result.as_dict()),
+        completed=timezone.now())
+
+
+def release(key):
+    """Give up the claim on a charge that was not made, so it may be tried
+    again"""
+
+    IdempotentCharge.objects.filter(
+        key=key, status=IdempotentCharge.PENDING).delete()
+
+
+def unknown(key):
+    """Keep the claim on a charge that may have been made, to be resolved
+    by the next call for key"""
+
+    IdempotentCharge.objects.filter(
+        key=key, status=IdempotentCharge.PENDING).update(
+            status=IdempotentCharge.UNKNOWN)
+
+
+def finish(key, result):
+    """Store, release or keep the claim on key, depending on the
+    Transaction of its charge"""
+
+    if getattr(result, 'result', None) == Transaction.APPROVED:
+        complete(key, result)
+    elif hasattr(result, 'transaction_response'):
+        release(key)
+    else:
+        unknown(key)
+
+
+def charge_once(key, payment_profile_id, amount, charge):
+    """Return the Transaction of charge(), calling it only if no other
+    call has claimed key"""
+
+    result = claim(key, payment_profile_id, amount)
+
+    if result is not None:
+        return result
+
+    try:
+        result = charge()
+    except BaseException:
+        unknown(key)
+        raise
+
+    finish(key, result)
+
+    return result
+
+
+async def acharge_once(key, payment_profile_id, amount, charge):
+    """charge_once() for an async charge(), which returns an awaitable.
+    The database calls run in threads"""
+
+    # waiting on a charge in flight must not hold the shared thread
+    result = await sync_to_async(claim, thread_sensitive=False)(
+        key, payment_profile_id, amount)
+
+    if result is not None:
+        return result
+
+    try:
+        result = await charge()
+    except BaseException:
+        await sync_to_async(unknown)(key)
+        raise
+
+    await sync_to_async(finish)(key, result)
+
+    return result
@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from payment_authorizenet import profile_index
+from payment_authorizenet.customer_profile import (
+    fetch_customer_profile,
+    get_customer_profile_ids)
+from payment_authorizenet.merchant_auth import AuthNet, AuthorizeNetError
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the index of customer profile ids by ' \
+           'merchantCustomerId, description and email from Authorize.net'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help='How many profiles to fetch from Authorize.net at once')
+
+    def handle(self, *args, **options):
+        auth = AuthNet()
+
+        # getCustomerProfileIds only returns ids, so every profile is
+        # fetched for its merchantCustomerId, description and email
+        customer_profile_ids = get_customer_profile_ids(auth)
+
+        def fetch(customer_profile_id):
+            try:
+                return fetch_customer_profile(customer_profile_id, auth)
+            except AuthorizeNetError as err:
+                return err
+
+        entries = []
+        failed = []
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            profiles = executor.map(fetch, customer_profile_ids)
+
+            for customer_profile_id, profile in zip(
+                    customer_profile_ids, profiles):
+                if isinstance(profile, AuthorizeNetError):
+                    failed.append(customer_profile_id)
+                    self.stderr.write('{}: {}'.format(
+                        customer_profile_id, profile))
+                    continue
+
+                key = profile_index.identity(
+                    getattr(profile, 'merchantCustomerId', None),
+                    getattr(profile, 'description', None),
+                    getattr(profile, 'email', None))
+
+                entries.append(key + (customer_profile_id,))
+
+        # rows of profiles that couldn't be fetched are kept as they are
+        indexed = profile_index.replace(entries, keep=failed)
+
+        self.stdout.write(self.style.SUCCESS(
+            'Indexed {} of {} customer profiles, {} failed'.format(
+                indexed, len(customer_profile_ids), len(failed))))
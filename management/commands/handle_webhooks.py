@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from payment_authorizenet import webhooks
+
+
+class Command(BaseCommand):
+    help = 'Handle the webhook notifications that were received but ' \
+           'never handled, such as those in flight when a process died'
+
+    def handle(self, *args, **options):
+        handled = webhooks.handle_pending()
+
+        self.stdout.write(self.style.SUCCESS(
+            'Handled {} webhook notifications'.format(handled)))
@@ -0,0 +1,55 @@
+import urllib.request
+
+from django.core.management.base import BaseCommand, CommandError
+from payment_authorizenet.routing_directory import (
+    clear_routing_directory,
+    directory_path,
+    read_source,
+    write_directory)
+
+
+class Command(BaseCommand):
+    help = 'Build the routing directory used by ECheckForm from the ' \
+           'FedACH directory of the Federal Reserve'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'source',
+            help='FedACHdir.txt or its JSON form, as a path or a URL')
+        parser.add_argument(
+            '--output',
+            help='Where to save the directory. Defaults to '
+                 'AUTHORIZE_NET_ROUTING_DIRECTORY')
+
+    def handle(self, *args, **options):
+        source = options['source']
+        output = options['output'] or directory_path()
+
+        if not output:
+            raise CommandError(
+                'Set AUTHORIZE_NET_ROUTING_DIRECTORY, or pass --output, to '
+                'say where to save the routing directory')
+
+        try:
+            if source.startswith(('http://', 'https://')):
+                with urllib.request.urlopen(source) as url:
+                    text = url.read().decode('utf-8-sig')
+            else:
+                with open(source, encoding='utf-8-sig') as f:
+                    text = f.read()
+
+            entries = read_source(text)
+        except (OSError, ValueError, KeyError, TypeError) as err:
+            raise CommandError(
+                'Unable to read the routing directory: {}'.format(err))
+
+        if not entries:
+            raise CommandError('{} has no routing numbers'.format(source))
+
+        count = write_directory(entries, output)
+
+        # other processes map the new file on their next lookup
+        clear_routing_directory()
+
+        self.stdout.write(self.style.SUCCESS(
+            'Saved {} routing numbers to {}'.format(count, output)))
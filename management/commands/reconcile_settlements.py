@@ -0,0 +1,116 @@
+import datetime
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+from payment_authorizenet import reconciliation
+from payment_authorizenet.merchant_auth import AuthorizeNetError
+from payment_authorizenet.reporting import Reporting
+
+
+def _date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise CommandError('{} is not a YYYY-MM-DD date'.format(value))
+
+
+class Command(BaseCommand):
+    help = 'Reconcile local rows, such as invoices, against the ' \
+           'transactions Authorize.net settled in a date range. Batches ' \
+           'reconciled by an earlier run are skipped'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'source',
+            help='The rows to reconcile: a model as app_label.Model, or the '
+                 'dotted path of a function that takes the first and last '
+                 'dates and returns a QuerySet')
+        parser.add_argument(
+            '--first', type=_date,
+            help='First settlement date (UTC), YYYY-MM-DD. Defaults to 30 '
+                 'days before --last')
+        parser.add_argument(
+            '--last', type=_date,
+            help='Last settlement date (UTC), YYYY-MM-DD. Defaults to now')
+        parser.add_argument(
+            '--key', choices=reconciliation.KEYS,
+            default=reconciliation.INVOICE_NUMBER,
+            help='The transaction attribute to join rows on')
+        parser.add_argument(
+            '--field',
+            help='The field of the rows holding the --key value. Defaults '
+                 'to the name of the key')
+        parser.add_argument(
+            '--amount-field', default='amount',
+            help='The field of the rows holding the amount charged')
+        parser.add_argument(
+            '--no-amounts', action='store_true',
+            help='Do not compare amounts')
+        parser.add_argument(
+            '--rerun', action='store_true',
+            help='Read batches that earlier runs already reconciled again')
+        parser.add_argument(
+            '--page-size', type=int, default=1000,
+            help='Transactions to read per call to Authorize.net')
+
+    def queryset(self, source, first, last):
+        """Return the rows of source and the name their checkpoints are
+        kept under"""
+
+        try:
+            model = apps.get_model(source)
+        except (LookupError, ValueError):
+            model = None
+
+        if model is not None:
+            return model._default_manager.all(), model._meta.label
+
+        try:
+            function = import_string(source)
+        except ImportError:
+            raise CommandError(
+                '{} is neither a model nor a function'.format(source))
+
+        # each function has its own checkpoints, even when it filters the
+        # rows of a model reconciled on its own too
+        return function(first, last), source
+
+    def handle(self, *args, **options):
+        # settlement dates are in UTC
+        last = options['last']
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        first = options['first'] or \
+            (last or today) - datetime.timedelta(days=30)
+
+        if last is not None and first > last:
+            raise CommandError('--first must not be after --last')
+
+        try:
+            reporting = Reporting(page_size=options['page_size'])
+        except ValueError as err:
+            raise CommandError(err)
+
+        queryset, source = self.queryset(options['source'], first, last)
+
+        try:
+            report = reconciliation.reconcile(
+                queryset, first, last,
+                key=options['key'],
+                field=options['field'],
+                amount_field=None if options['no_amounts']
+                else options['amount_field'],
+                reporting=reporting,
+                rerun=options['rerun'],
+                source=source)
+        except (AuthorizeNetError, ValueError) as err:
+            raise CommandError(err)
+
+        for discrepancy in report.discrepancies:
+            self.stdout.write('{}: {} (row {}, amount {}) {}'.format(
+                discrepancy.kind, discrepancy.key, discrepancy.pk,
+                discrepancy.amount, discrepancy.transaction or '').rstrip())
+
+        style = self.style.SUCCESS if not report.discrepancies \
+            else self.style.WARNING
+        self.stdout.write(style(str(report)))
@@ -0,0 +1,64 @@
+import datetime
+import json
+import ssl
+import urllib.request
+
+from django.core.management.base import BaseCommand, CommandError
+from payment_authorizenet.response_codes import (
+    BUNDLED_PATH,
+    SOURCE_URL,
+    ResponseCodeTable,
+    clear_response_codes)
+
+
+class Command(BaseCommand):
+    help = 'Download responseCodes.json from Authorize.net and save it as ' \
+           'the bundled response code table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url', default=SOURCE_URL,
+            help='Where to download the response codes from')
+        parser.add_argument(
+            '--output', default=BUNDLED_PATH,
+            help='Where to save the table. Defaults to the bundled copy')
+        parser.add_argument(
+            '--insecure', action='store_true',
+            help='Skip certificate verification when downloading')
+
+    def handle(self, *args, **options):
+        context = None
+
+        if options['insecure']:
+            context = ssl._create_unverified_context()
+
+        try:
+            with urllib.request.urlopen(
+                    options['url'], context=context) as url:
+                codes = json.loads(url.read().decode())
+        except (OSError, ValueError) as err:
+            raise CommandError('Unable to download response codes: {}'.format(
+                err))
+
+        if not isinstance(codes, list) or not codes:
+            raise CommandError('Expected a non-empty list of response codes')
+
+        # build the table before saving to confirm that the data is usable
+        table = ResponseCodeTable(codes)
+
+        data = {
+            'source': options['url'],
+            'version': datetime.date.today().isoformat(),
+            'codes': [
+                {'code': x['code'], 'text': x.get('text')} for x in codes],
+        }
+
+        with open(options['output'], 'w') as f:
+            json.dump(data, f, indent=2)
+            f.write('\n')
+
+        clear_response_codes()
+
+        self.stdout.write(self.style.SUCCESS(
+            'Saved {} response codes to {}'.format(
+                len(table), options['output'])))
@@ -0,0 +1,40 @@
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+from payment_authorizenet import charge_queue
+
+
+class Command(BaseCommand):
+    help = 'Run the charges queued with charge_queue.enqueue() until ' \
+           'stopped. Any number of workers can share the queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int,
+            default=charge_queue.DEFAULT_CONCURRENCY,
+            help='How many charges to run at once')
+        parser.add_argument(
+            '--poll-interval', type=float,
+            default=charge_queue.DEFAULT_POLL_INTERVAL,
+            help='Seconds to wait when the queue is empty')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        try:
+            worker = charge_queue.Worker(
+                options['concurrency'], options['poll_interval'])
+        except ValueError as err:
+            raise CommandError(err)
+
+        # finish the charges in flight before exiting
+        signal.signal(signal.SIGTERM, lambda *args: worker.stop())
+
+        try:
+            worker.run(once=options['once'])
+        except KeyboardInterrupt:
+            worker.stop()
+
+        self.stdout.write(self.style.SUCCESS(
+            'Ran {} charges'.format(worker.processed)))
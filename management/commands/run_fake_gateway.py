@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from payment_authorizenet.fake_gateway import FakeGateway
+
+
+class Command(BaseCommand):
+    help = 'Serve a fake Authorize.net XML API from memory, for load ' \
+           'tests. Point AUTHORIZE_NET_POST_URL at the URL it prints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument(
+            '--latency', type=float, nargs='+', default=[0],
+            help='Seconds to wait before each response. Pass two numbers '
+                 'to wait a random time between them')
+        parser.add_argument(
+            '--error-rate', type=float, default=0,
+            help='Share of requests answered with E00001, from 0 to 1')
+        parser.add_argument(
+            '--decline-rate', type=float, default=0,
+            help='Share of transactions that are declined, from 0 to 1')
+        parser.add_argument(
+            '--decline-codes', nargs='+', default=['2'],
+            help='Response reason codes to decline with')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        latency = options['latency']
+
+        if len(latency) > 2:
+            raise CommandError('--latency takes one or two numbers')
+
+        try:
+            gateway = FakeGateway(
+                latency=latency[0] if len(latency) == 1 else tuple(latency),
+                error_rate=options['error_rate'],
+                decline_rate=options['decline_rate'],
+                decline_codes=options['decline_codes'],
+                seed=options['seed'],
+                host=options['host'],
+                port=options['port'])
+        except ValueError as err:
+            raise CommandError(err)
+
+        self.stdout.write('AUTHORIZE_NET_POST_URL = {!r}'.format(
+            gateway.start()))
+
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            gateway.stop()
@@ -0,0 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from payment_authorizenet import mirror
+from payment_authorizenet.customer_profile import (
+    fetch_customer_profile,
+    get_customer_profile_ids)
+from payment_authorizenet.merchant_auth import AuthNet, AuthorizeNetError
+from payment_authorizenet.models import CustomerProfileMirror
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the local mirror of customer and payment profiles ' \
+           'from Authorize.net'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'customer_profile_ids', nargs='*', type=int,
+            help='Only sync these customer profiles. By default every '
+                 'customer profile on the account is synced and mirrors of '
+                 'deleted profiles are removed')
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help='How many profiles to fetch from Authorize.net at once')
+
+    def handle(self, *args, **options):
+        auth = AuthNet()
+        started = timezone.now()
+
+        customer_profile_ids = options['customer_profile_ids']
+        full_sync = not customer_profile_ids
+
+        if full_sync:
+            customer_profile_ids = get_customer_profile_ids(auth)
+
+        def fetch(customer_profile_id):
+            try:
+                return fetch_customer_profile(customer_profile_id, auth)
+            except AuthorizeNetError as err:
+                return err
+
+        synced = 0
+        failed = []
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            profiles = executor.map(fetch, customer_profile_ids)
+
+            # database writes stay on this thread
+            for customer_profile_id, profile in zip(
+                    customer_profile_ids, profiles):
+                if isinstance(profile, AuthorizeNetError):
+                    failed.append(customer_profile_id)
+                    self.stderr.write('{}: {}'.format(
+                        customer_profile_id, profile))
+                    continue
+
+                mirror.record_profile_response(profile)
+                synced += 1
+
+        removed = 0
+
+        if full_sync:
+            # every profile still on the account was saved after started
+            removed, _ = CustomerProfileMirror.objects.filter(
+                synced__lt=started).exclude(
+                customer_profile_id__in=failed).delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            'Synced {} customer profiles, {} failed, {} rows removed'.format(
+                synced, len(failed), removed)))
@@ -1,6 +1,29 @@
-from authorizenet import apicontractsv1
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from payment_authorizenet import metrics, resilience
 from payment_authorizenet.enums import ServerMode
+from payment_authorizenet.sdk import apicontractsv1
+from payment_authorizenet.transport import get_transport, reset_transport
+
+SANDBOX = 'https://apitest.authorize.net/xml/v1/request.api'
+PRODUCTION = 'https://api2.authorize.net/xml/v1/request.api'
+
+# Changing any of these settings rebuilds the GatewayConfig
+GATEWAY_SETTINGS = (
+    'AUTHORIZE_NET_API_LOGIN_ID',
+    'AUTHORIZE_NET_TRANSACTION_KEY',
+    'SERVER_MODE',
+    'AUTHORIZE_NET_POST_URL',
+)
+
+# Changing any of these settings rebuilds the shared transport
+TRANSPORT_SETTINGS = (
+    'AUTHORIZE_NET_TRANSPORT',
+    'AUTHORIZE_NET_POOL_SIZE',
+    'AUTHORIZE_NET_POOL_IDLE_TIMEOUT',
+    'AUTHORIZE_NET_TIMEOUT',
+)
 
 
 class AuthorizeNetError(Exception):
@@ -11,45 +34,135 @@ class AuthorizeNetError(Exception):
     pass
 
 
-class AuthNet:
-    """This class is intended to be inherited by any class wishing to perform
-    operations on the Authorize.net gateway.
-    You'll always need to supply credentials, which this class sets
-    and makes available from settings"""
+class CircuitOpenError(AuthorizeNetError):
+    """Raised instead of calling Authorize.net while it is failing.
+    See resilience.py"""
 
-    def __init__(self):
+    pass
 
-        # ********** Set Authentication Credentials *************
 
-        merchantAuth = apicontractsv1.merchantAuthenticationType()
+class GatewayConfig:
+    """Credentials and the POST URL for the gateway, read from settings.
 
-        if not hasattr(settings, 'AUTHORIZE_NET_API_LOGIN_ID'):
-            msg = 'AUTHORIZE_NET_API_LOGIN_ID does not exist ' \
-                  'in your Django settings'
-            raise AuthorizeNetError(msg)
+    One GatewayConfig is shared by every AuthNet in the process. Use
+    get_gateway_config() rather than building your own. The settings are
+    validated by the payment_authorizenet system checks at startup"""
 
-        merchantAuth.name = settings.AUTHORIZE_NET_API_LOGIN_ID
+    def __init__(self):
+        super().__init__()
 
-        if not hasattr(settings, 'AUTHORIZE_NET_TRANSACTION_KEY'):
-            msg = 'AUTHORIZE_NET_TRANSACTION_KEY does not exist ' \
-                  'in your Django settings'
-            raise AuthorizeNetError(msg)
+        errors = GatewayConfig.errors()
+
+        if errors:
+            raise AuthorizeNetError(errors[0])
 
+        merchantAuth = apicontractsv1.merchantAuthenticationType()
+        merchantAuth.name = settings.AUTHORIZE_NET_API_LOGIN_ID
         merchantAuth.transactionKey = settings.AUTHORIZE_NET_TRANSACTION_KEY
 
         self.merchantAuth = merchantAuth
+        self.server_mode = settings.SERVER_MODE
+
+        if getattr(settings, 'AUTHORIZE_NET_POST_URL', None):
+            # such as a FakeGateway. See fake_gateway.py
+            self.post_url = settings.AUTHORIZE_NET_POST_URL
+        elif settings.SERVER_MODE == ServerMode.production.value:
+            self.post_url = PRODUCTION
+        else:  # any evironment that's not production should use sandbox
+            self.post_url = SANDBOX
+
+    @staticmethod
+    def errors():
+        """Return a list of problems with the gateway settings"""
+
+        errors = []
 
-        # ********** Set the POST URL for the controllers *************
+        if not hasattr(settings, 'AUTHORIZE_NET_API_LOGIN_ID'):
+            errors.append('AUTHORIZE_NET_API_LOGIN_ID does not exist '
+                          'in your Django settings')
 
-        SANDBOX = 'https://apitest.authorize.net/xml/v1/request.api'
-        PRODUCTION = 'https://api2.authorize.net/xml/v1/request.api'
+        if not hasattr(settings, 'AUTHORIZE_NET_TRANSACTION_KEY'):
+            errors.append('AUTHORIZE_NET_TRANSACTION_KEY does not exist '
+                          'in your Django settings')
 
         if not hasattr(settings, 'SERVER_MODE'):
             msg = 'You must set SERVER_MODE in your Django settings to a ' \
-                  'ServerMode enum: {}}'
-            raise AuthorizeNetError(msg.format(ServerMode.str_list()))
+                  'ServerMode enum: {}'
+            errors.append(msg.format(ServerMode.str_list()))
 
-        if settings.SERVER_MODE == ServerMode.production.value:
-            self.post_url = PRODUCTION
-        else:  # any evironment that's not production should use sandbox
-            self.post_url = SANDBOX
+        return errors
+
+
+_gateway_config = None
+
+
+def get_gateway_config():
+    """Return the GatewayConfig shared by this process"""
+    global _gateway_config
+
+    if _gateway_config is None:
+        _gateway_config = GatewayConfig()
+
+    return _gateway_config
+
+
+@receiver(setting_changed)
+def gateway_setting_changed(setting, **kwargs):
+    """Rebuild the shared config or transport when their settings change,
+    such as under override_settings in tests"""
+    global _gateway_config
+
+    if setting in GATEWAY_SETTINGS:
+        _gateway_config = None
+
+    if setting in TRANSPORT_SETTINGS:
+        reset_transport()
+
+
+class AuthNet:
+    """This class is intended to be inherited by any class wishing to perform
+    operations on the Authorize.net gateway.
+    You'll always need to supply credentials, which this class takes from
+    the process-wide GatewayConfig"""
+
+    def __init__(self):
+
+        self.gateway_config = get_gateway_config()
+
+        self.merchantAuth = self.gateway_config.merchantAuth
+        self.post_url = self.gateway_config.post_url
+
+        # ********** Share one connection pool across controllers *********
+
+        self.transport = get_transport()
+
+    def execute(self, controller):
+        """Send the request of an SDK controller to post_url through the
+        process-wide transport and return the response.
+        Use this instead of controller.execute(), which opens a new
+        connection for every call.
+
+        Every call is timed and counted (see metrics.py), and retried or
+        failed fast when the gateway is failing (see resilience.py)"""
+
+        operation = metrics.operation_name(controller)
+
+        return resilience.call(
+            operation,
+            self.post_url,
+            lambda: self.execute_once(controller, operation))
+
+    def execute_once(self, controller, operation):
+        """Call the gateway once, without retries, and measure the call"""
+
+        start = metrics.call_started(self, operation)
+
+        try:
+            response = self.transport.execute(controller, self.post_url)
+        except Exception:
+            metrics.call_finished(self, operation, start, exception=True)
+            raise
+
+        metrics.call_finished(self, operation, start, response)
+
+        return response
@@ -0,0 +1,286 @@
+"""Latency and outcome of every call to the gateway.
+
+AuthNet.execute() reports each call to the metrics sink named by
+AUTHORIZE_NET_METRICS_SINK, and sends the gateway_call_started and
+gateway_call_finished signals from signals.py around it. The default sink,
+InMemorySink, keeps counters and latency histograms for the process and
+renders them for Prometheus; see views.metrics"""
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from payment_authorizenet.signals import (
+    gateway_call_finished,
+    gateway_call_started)
+import bisect
+import threading
+import time
+
+DEFAULT_SINK = 'payment_authorizenet.metrics.InMemorySink'
+
+# upper bounds, in seconds, of the latency histogram buckets
+DEFAULT_BUCKETS = (
+    0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10, 30, 60)
+
+# result codes for calls that got no gateway response
+NO_RESPONSE = 'NoResponse'
+EXCEPTION = 'Exception'
+
+
+def operation_name(controller):
+    """The API name of a controller's request, such as createTransaction"""
+
+    name = type(controller).__name__
+
+    if name.endswith('Controller'):
+        name = name[:-len('Controller')]
+
+    return name
+
+
+def response_codes(response):
+    """Return the result code and the first error code of a response"""
+
+    if response is None:
+        return NO_RESPONSE, ''
+
+    messages = getattr(response, 'messages', None)
+
+    if messages is None:
+        return NO_RESPONSE, ''
+
+    result_code = str(messages.resultCode)
+    error_code = ''
+
+    if result_code != 'Ok':
+        message = getattr(messages, 'message', None)
+        if message is not None:
+            error_code = str(getattr(message[0], 'code', ''))
+
+    return result_code, error_code
+
+
+class MetricsSink:
+    """Receives one observation for every call to the gateway.
+    Subclass this and name it in AUTHORIZE_NET_METRICS_SINK to send the
+    observations elsewhere, such as to statsd"""
+
+    def observe(
+            self, operation, server_mode, result_code, error_code, duration):
+        raise NotImplementedError
+
+
+class NullSink(MetricsSink):
+    """Discard observations"""
+
+    def observe(self, *args, **kwargs):
+        pass
+
+
+class Histogram:
+
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.counts = [0] * (len(buckets) + 1)  # the last is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+
+class InMemorySink(MetricsSink):
+    """Counters of calls and latency histograms, kept in this process.
+
+    calls are counted by (operation, server_mode, result_code,
+    error_code). Latency is kept by (operation, server_mode, result_code)"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        super().__init__()
+
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.counters = {}
+            self.histograms = {}
+
+    def observe(
+            self, operation, server_mode, result_code, error_code, duration):
+        counter_key = (operation, server_mode, result_code, error_code)
+        histogram_key = (operation, server_mode, result_code)
+        bucket = bisect.bisect_left(self.buckets, duration)
+
+        with self.lock:
+            self.counters[counter_key] = self.counters.get(counter_key, 0) + 1
+
+            histogram = self.histograms.get(histogram_key)
+            if histogram is None:
+                histogram = Histogram(self.buckets)
+                self.histograms[histogram_key] = histogram
+
+            histogram.counts[bucket] += 1
+            histogram.sum += duration
+            histogram.count += 1
+
+    def count(self, operation=None, result_code=None, error_code=None):
+        """The number of calls that match the given labels"""
+
+        with self.lock:
+            return sum(
+                n for (op, _, result, error), n in self.counters.items()
+                if operation in (None, op) and
+                result_code in (None, result) and
+                error_code in (None, error))
+
+    def quantile(self, q, operation=None):
+        """Estimate a latency quantile, such as 0.99, in seconds from the
+        histograms of one operation or of all of them. Like Prometheus'
+        histogram_quantile(), this interpolates within a bucket"""
+
+        counts = [0] * (len(self.buckets) + 1)
+
+        with self.lock:
+            for (op, _, _), histogram in self.histograms.items():
+                if operation in (None, op):
+                    for i, n in enumerate(histogram.counts):
+                        counts[i] += n
+
+        total = sum(counts)
+
+        if not total:
+            return None
+
+        rank = q * total
+        seen = 0
+
+        for i, n in enumerate(counts):
+            if seen + n >= rank and n:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+
+                lower = self.buckets[i - 1] if i else 0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / n
+
+            seen += n
+
+        return self.buckets[-1]
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format"""
+
+        lines = [
+            '# HELP authorizenet_calls_total Calls to the Authorize.net '
+            'gateway',
+            '# TYPE authorizenet_calls_total counter',
+        ]
+
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(
+                (key, list(h.counts), h.sum, h.count)
+                for key, h in self.histograms.items())
+
+        for (operation, server_mode, result_code, error_code), n \
+                in counters:
+            lines.append('authorizenet_calls_total{{{}}} {}'.format(
+                _labels(operation=operation, server_mode=server_mode,
+                        result_code=result_code, error_code=error_code),
+                n))
+
+        lines.extend([
+            '# HELP authorizenet_call_duration_seconds Latency of calls to '
+            'the Authorize.net gateway',
+            '# TYPE authorizenet_call_duration_seconds histogram',
+        ])
+
+        for (operation, server_mode, result_code), counts, total, n \
+                in histograms:
+            labels = _labels(operation=operation, server_mode=server_mode,
+                             result_code=result_code)
+            cumulative = 0
+
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(
+                    'authorizenet_call_duration_seconds_bucket{{{},le="{}"}} '
+                    '{}'.format(labels, bound, cumulative))
+
+            lines.append('authorizenet_call_duration_seconds_sum{{{}}} {}'
+                         .format(labels, repr(total)))
+            lines.append('authorizenet_call_duration_seconds_count{{{}}} {}'
+                         .format(labels, n))
+
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(**labels):
+    return ','.join(
+        '{}="{}"'.format(name, _escape(value))
+        for name, value in sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace(
+        '\n', r'\n')
+
+
+_sink = None
+
+
+def get_metrics_sink():
+    """Return the metrics sink shared by this process"""
+    global _sink
+
+    if _sink is None:
+        path = getattr(settings, 'AUTHORIZE_NET_METRICS_SINK', DEFAULT_SINK)
+        _sink = import_string(path)()
+
+    return _sink
+
+
+@receiver(setting_changed)
+def metrics_setting_changed(setting, **kwargs):
+    global _sink
+
+    if setting == 'AUTHORIZE_NET_METRICS_SINK':
+        _sink = None
+
+
+def call_started(auth, operation):
+    """Signal that auth, an AuthNet, is calling the gateway. Return the
+    start time to pass to call_finished()"""
+
+    gateway_call_started.send(
+        sender=type(auth),
+        instance=auth,
+        operation=operation,
+        server_mode=auth.gateway_config.server_mode)
+
+    return time.perf_counter()
+
+
+def call_finished(auth, operation, start, response=None, exception=False):
+    """Record a finished call to the gateway and signal it"""
+
+    duration = time.perf_counter() - start
+    server_mode = auth.gateway_config.server_mode
+
+    if exception:
+        result_code, error_code = EXCEPTION, ''
+    else:
+        result_code, error_code = response_codes(response)
+
+    get_metrics_sink().observe(
+        operation, server_mode, result_code, error_code, duration)
+
+    gateway_call_finished.send(
+        sender=type(auth),
+        instance=auth,
+        operation=operation,
+        server_mode=server_mode,
+        result_code=result_code,
+        error_code=error_code,
+        duration=duration,
+        response=response)
@@ -0,0 +1,10 @@
+from django.urls import path
+from payment_authorizenet import views
+
+# kept apart from urls, which serves the public webhook, so that the
+# metrics can be mounted somewhere only monitoring can reach
+app_name = 'payment_authorizenet_metrics'
+
+urlpatterns = [
+    path('metrics/', views.metrics, name='metrics'),
+]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerProfileMirror',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customer_profile_id', models.BigIntegerField(unique=True)),
+                ('merchant_customer_id', models.CharField(blank=True, db_index=True, max_length=20)),
+                ('email', models.CharField(blank=True, max_length=255)),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('synced', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PaymentProfileMirror',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customer_payment_profile_id', models.BigIntegerField(unique=True)),
+                ('payment_type', models.CharField(choices=[('bankAccount', 'Bank Account'), ('creditCard', 'Credit Card')], max_length=20)),
+                ('card_type', models.CharField(blank=True, max_length=30)),
+                ('last_4', models.CharField(blank=True, max_length=4)),
+                ('expiration_date', models.CharField(blank=True, max_length=7)),
+                ('bank_name', models.CharField(blank=True, max_length=50)),
+                ('is_default', models.BooleanField(default=False)),
+                ('synced', models.DateTimeField(auto_now=True)),
+                ('customer_profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payment_profiles', to='payment_authorizenet.customerprofilemirror')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['customer_profile', 'is_default'], name='payment_aut_custome_e3fb94_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment_authorizenet', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotentCharge',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('payment_profile_id', models.CharField(max_length=20)),
+                ('amount', models.CharField(max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('unknown', 'Unknown'), ('complete', 'Complete')], default='pending', max_length=10)),
+                ('result', models.TextField(blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('lease_expires', models.DateTimeField(blank=True, null=True)),
+                ('completed', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
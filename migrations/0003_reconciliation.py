@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment_authorizenet', '0002_idempotentcharge'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReconciledBatch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch_id', models.CharField(max_length=20, unique=True)),
+                ('settlement_time', models.DateTimeField(db_index=True)),
+                ('transactions', models.PositiveIntegerField(default=0)),
+                ('reconciled', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SettledTransaction',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_id', models.CharField(max_length=20, unique=True)),
+                ('invoice_number', models.CharField(blank=True, db_index=True, max_length=20)),
+                ('status', models.CharField(max_length=40)),
+                ('settle_amount', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('outcome', models.CharField(blank=True, choices=[('matched', 'Matched'), ('mismatched', 'Mismatched'), ('unexpected', 'Unexpected')], max_length=10)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='settled_transactions', to='payment_authorizenet.reconciledbatch')),
+            ],
+        ),
+    ]
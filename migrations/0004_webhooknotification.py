@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment_authorizenet', '0003_reconciliation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookNotification',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_id', models.CharField(max_length=64, unique=True)),
+                ('event_type', models.CharField(max_length=100)),
+                ('body', models.TextField(blank=True)),
+                ('received', models.DateTimeField(auto_now_add=True)),
+                ('claimed', models.DateTimeField(blank=True, null=True)),
+                ('handled', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
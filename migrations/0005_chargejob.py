@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment_authorizenet', '0004_webhooknotification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChargeJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('app_label', models.CharField(max_length=100)),
+                ('model_name', models.CharField(max_length=100)),
+                ('object_id', models.CharField(max_length=64)),
+                ('payment_profile_id', models.CharField(max_length=20)),
+                ('amount', models.CharField(max_length=20)),
+                ('ref_id', models.CharField(blank=True, max_length=20)),
+                ('invoice_number', models.CharField(blank=True, max_length=20)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('complete', 'Complete'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('result', models.TextField(blank=True)),
+                ('error', models.TextField(blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('started', models.DateTimeField(blank=True, null=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='payment_aut_status_f7ef5f_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment_authorizenet', '0005_chargejob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerProfileIndex',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('merchant_customer_id', models.CharField(max_length=20)),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('email', models.CharField(blank=True, max_length=255)),
+                ('customer_profile_id', models.BigIntegerField(unique=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('merchant_customer_id', 'description', 'email')},
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment_authorizenet', '0006_customerprofileindex'),
+    ]
+
+    operations = [
+        # checkpoints written before have no source and are read again
+        migrations.AddField(
+            model_name='reconciledbatch',
+            name='source',
+            field=models.CharField(default='', max_length=200),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='reconciledbatch',
+            name='batch_id',
+            field=models.CharField(max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='settledtransaction',
+            name='transaction_id',
+            field=models.CharField(db_index=True, max_length=20),
+        ),
+        migrations.AlterUniqueTogether(
+            name='reconciledbatch',
+            unique_together={('source', 'batch_id')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='settledtransaction',
+            unique_together={('batch', 'transaction_id')},
+        ),
+    ]
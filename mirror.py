@@ -0,0 +1,275 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from payment_authorizenet.enums import PaymentProfileType
+from payment_authorizenet.models import (
+    CustomerProfileMirror,
+    PaymentProfileMirror)
+from payment_authorizenet.validators import card_brand
+
+# the columns of a PaymentProfileMirror read from the gateway
+PAYMENT_FIELDS = (
+    'customer_profile_id', 'payment_type', 'card_type', 'last_4',
+    'expiration_date', 'bank_name', 'is_default')
+
+
+def mirror_enabled():
+    """Mirror tables are only written when AUTHORIZE_NET_MIRROR_PROFILES
+    is True in your Django settings"""
+    return getattr(settings, 'AUTHORIZE_NET_MIRROR_PROFILES', False)
+
+
+def _text(element, name, default=''):
+    """Read a child of an SDK response element as a string"""
+    value = getattr(element, name, None)
+    return default if value is None else str(value)
+
+
+def _card_type(number):
+    """The cardType Authorize.net gives a card number that was sent in
+    full, or '' for a masked number"""
+
+    brand = card_brand(number) if number.isdigit() else None
+    return '' if brand is None else brand.value
+
+
+def payment_details(payment):
+    """Return the masked fields of a payment, either a payment sent to
+    Authorize.net or a payment element of a getCustomerProfile response"""
+
+    creditCard = getattr(payment, PaymentProfileType.creditCard.name, None)
+
+    if creditCard is not None:
+        number = _text(creditCard, 'cardNumber')
+        card_type = _text(creditCard, 'cardType') or _card_type(number)
+
+        return {
+            'payment_type': PaymentProfileType.creditCard.name,
+            'card_type': card_type,
+            'last_4': number[-4:],
+            'expiration_date': _text(creditCard, 'expirationDate')[:7],
+            'bank_name': '',
+        }
+
+    bankAccount = getattr(payment, PaymentProfileType.bankAccount.name, None)
+
+    if bankAccount is not None:
+        return {
+            'payment_type': PaymentProfileType.bankAccount.name,
+            'card_type': '',
+            'last_4': _text(bankAccount, 'accountNumber')[-4:],
+            'expiration_date': '',
+            'bank_name': _text(bankAccount, 'bankName'),
+        }
+
+    return None
+
+
+def record_details(payment):
+    """Return the masked fields of the Payment record of a PaymentProfile,
+    as payment_details() does for an element"""
+
+    if payment.credit_card is not None:
+        return {
+            'payment_type': PaymentProfileType.creditCard.name,
+            'card_type': payment.credit_card.card_type or '',
+            'last_4': (payment.credit_card.card_number or '')[-4:],
+            'expiration_date':
+                (payment.credit_card.card_expiration_date or '')[:7],
+            'bank_name': '',
+        }
+
+    if payment.bank_account is not None:
+        return {
+            'payment_type': PaymentProfileType.bankAccount.name,
+            'card_type': '',
+            'last_4': (payment.bank_account.account_number or '')[-4:],
+            'expiration_date': '',
+            'bank_name': payment.bank_account.bank_name or '',
+        }
+
+    return None
+
+
+def record_customer_profile(
+        customer_profile_id, merchant_customer_id='', email='',
+        description=''):
+    """Create or update the mirror of a customer profile"""
+
+    mirror, _ = CustomerProfileMirror.objects.update_or_create(
+        customer_profile_id=int(customer_profile_id),
+        defaults={
+            'merchant_customer_id': merchant_customer_id or '',
+            'email': email or '',
+            'description': description or '',
+        })
+
+    return mirror
+
+
+def record_payment_profile(
+        customer_profile_id, customer_payment_profile_id, payment,
+        is_default=False):
+    """Create or update the mirror of one payment profile from the payment
+    that was sent to or received from Authorize.net"""
+
+    details = payment_details(payment)
+
+    if details is None:
+        return None
+
+    with transaction.atomic():
+        customer, _ = CustomerProfileMirror.objects.get_or_create(
+            customer_profile_id=int(customer_profile_id))
+
+        if is_default:
+            customer.payment_profiles.filter(is_default=True).exclude(
+                customer_payment_profile_id=int(customer_payment_profile_id)
+            ).update(is_default=False)
+
+        details['customer_profile'] = customer
+        details['is_default'] = is_default
+
+        # a card updated with its masked number keeps its card type
+        if not details['card_type'] and \
+                details['payment_type'] == PaymentProfileType.creditCard.name:
+            del details['card_type']
+
+        mirror, _ = PaymentProfileMirror.objects.update_or_create(
+            customer_payment_profile_id=int(customer_payment_profile_id),
+            defaults=details)
+
+    return mirror
+
+
+def record_profile_response(profile, default_payment_profile_id=None):
+    """Replace the mirror of a customer profile and all of its payment
+    profiles with the profile element of a getCustomerProfile response"""
+
+    customer_profile_id = int(profile.customerProfileId)
+
+    if default_payment_profile_id is not None:
+        default_payment_profile_id = int(default_payment_profile_id)
+
+    payment_profiles = []
+
+    for pp in getattr(profile, 'paymentProfiles', []):
+        details = payment_details(pp.payment)
+
+        if details is None:
+            continue
+
+        payment_profile_id = int(pp.customerPaymentProfileId)
+
+        if default_payment_profile_id is not None:
+            is_default = payment_profile_id == default_payment_profile_id
+        else:
+            is_default = _text(pp, 'defaultPaymentProfile').lower() == 'true'
+
+        payment_profiles.append((payment_profile_id, details, is_default))
+
+    return _replace_profile(
+        customer_profile_id,
+        _text(profile, 'merchantCustomerId'),
+        _text(profile, 'email'),
+        _text(profile, 'description'),
+        payment_profiles)
+
+
+def record_parsed_profile(response, default_payment_profile_id=None):
+    """Replace the mirror of a customer profile and all of its payment
+    profiles with a CustomerProfileResponse. See profile_parser.py"""
+
+    if default_payment_profile_id is None:
+        default_payment_profile_id = response.default_payment_profile_id
+
+    if default_payment_profile_id is not None:
+        default_payment_profile_id = int(default_payment_profile_id)
+
+    payment_profiles = []
+
+    for pp in response.payment_profiles:
+        details = record_details(pp.payment)
+
+        if details is not None:
+            payment_profiles.append((
+                pp.customer_payment_profile_id,
+                details,
+                pp.customer_payment_profile_id == default_payment_profile_id))
+
+    return _replace_profile(
+        response.customer_profile_id,
+        response.merchant_customer_id,
+        response.email,
+        response.description,
+        payment_profiles)
+
+
+def _replace_profile(
+        customer_profile_id, merchant_customer_id, email, description,
+        payment_profiles):
+    """payment_profiles is a list of (customer payment profile id,
+    payment_details(), is default). Only the rows that differ from the
+    profile are written, so reading an unchanged profile costs no writes"""
+
+    values = {
+        'merchant_customer_id': merchant_customer_id or '',
+        'email': email or '',
+        'description': description or '',
+    }
+
+    with transaction.atomic():
+        customer, created = CustomerProfileMirror.objects.get_or_create(
+            customer_profile_id=int(customer_profile_id), defaults=values)
+
+        if not created and any(
+                getattr(customer, name) != value
+                for name, value in values.items()):
+            for name, value in values.items():
+                setattr(customer, name, value)
+
+            customer.save()
+
+        stored = {
+            row.customer_payment_profile_id: row
+            for row in customer.payment_profiles.all()}
+        new = []
+        changed = []
+
+        for payment_profile_id, details, is_default in payment_profiles:
+            details['is_default'] = is_default
+            details['customer_profile_id'] = customer.pk
+
+            row = stored.pop(payment_profile_id, None)
+
+            if row is None:
+                new.append(PaymentProfileMirror(
+                    customer_payment_profile_id=payment_profile_id,
+                    **details))
+            elif any(getattr(row, name) != details[name]
+                     for name in PAYMENT_FIELDS):
+                for name in PAYMENT_FIELDS:
+                    setattr(row, name, details[name])
+
+                row.synced = timezone.now()
+                changed.append(row)
+
+        if stored:
+            PaymentProfileMirror.objects.filter(
+                pk__in=[row.pk for row in stored.values()]).delete()
+
+        PaymentProfileMirror.objects.bulk_update(
+            changed, PAYMENT_FIELDS + ('synced',))
+        PaymentProfileMirror.objects.bulk_create(new)
+
+    return customer
+
+
+def forget_payment_profile(customer_payment_profile_id):
+    PaymentProfileMirror.objects.filter(
+        customer_payment_profile_id=int(customer_payment_profile_id)).delete()
+
+
+def forget_customer_profile(customer_profile_id):
+    CustomerProfileMirror.objects.filter(
+        customer_profile_id=int(customer_profile_id)).delete()
@@ -1,5 +1,249 @@
 from __future__ import unicode_literals
 
+from django.apps import apps
 from django.db import models
+from payment_authorizenet import constants
+from payment_authorizenet.enums import PaymentProfileType
+from payment_authorizenet.transaction import Transaction
+import json
 
-# Create your models here.
+
+class CustomerProfileMirror(models.Model):
+    """A local copy of a customer profile (CIM) on Authorize.net.
+    Rows are only written when AUTHORIZE_NET_MIRROR_PROFILES is True.
+    See mirror.py"""
+
+    customer_profile_id = models.BigIntegerField(unique=True)
+    merchant_customer_id = models.CharField(
+        max_length=constants.MAX_MERCHANT_CUSTOMER_ID_CHARS,
+        blank=True,
+        db_index=True)
+    email = models.CharField(
+        max_length=constants.MAX_EMAIL_CHARS, blank=True)
+    description = models.CharField(
+        max_length=constants.MAX_DESCRIPTION_CHARS, blank=True)
+    synced = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return '{} ({})'.format(
+            self.customer_profile_id, self.merchant_customer_id)
+
+
+class PaymentProfileMirror(models.Model):
+    """A local, masked copy of a payment profile on Authorize.net.
+    Only the details Authorize.net returns masked are kept"""
+
+    customer_profile = models.ForeignKey(
+        CustomerProfileMirror,
+        on_delete=models.CASCADE,
+        related_name='payment_profiles')
+    customer_payment_profile_id = models.BigIntegerField(unique=True)
+    payment_type = models.CharField(
+        max_length=20, choices=PaymentProfileType.as_tuple())
+    card_type = models.CharField(max_length=30, blank=True)
+    last_4 = models.CharField(max_length=4, blank=True)
+    expiration_date = models.CharField(
+        max_length=constants.EXPIRATION_CHARS, blank=True)
+    bank_name = models.CharField(
+        max_length=constants.MAX_BANK_NAME_CHARS, blank=True)
+    is_default = models.BooleanField(default=False)
+    synced = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['customer_profile', 'is_default'])]
+
+    def __str__(self):
+        if self.payment_type == PaymentProfileType.bankAccount.name:
+            return '{} {}'.format(self.bank_name, self.last_4)
+
+        return '{} {}'.format(self.card_type, self.last_4)
+
+
+class CustomerProfileIndex(models.Model):
+    """The customer profile id of each (merchantCustomerId, description,
+    email), the values the gateway finds duplicate profiles by. Rows are
+    only read and written when AUTHORIZE_NET_PROFILE_INDEX is True. See
+    profile_index.py"""
+
+    merchant_customer_id = models.CharField(
+        max_length=constants.MAX_MERCHANT_CUSTOMER_ID_CHARS)
+    description = models.CharField(
+        max_length=constants.MAX_DESCRIPTION_CHARS, blank=True)
+    email = models.CharField(
+        max_length=constants.MAX_EMAIL_CHARS, blank=True)
+    customer_profile_id = models.BigIntegerField(unique=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('merchant_customer_id', 'description', 'email')
+
+    def __str__(self):
+        return '{} ({})'.format(
+            self.customer_profile_id, self.merchant_customer_id)
+
+
+class IdempotentCharge(models.Model):
+    """One charge_customer_profile() call, so that repeating it returns the
+    first result instead of charging again. Rows are only written when
+    AUTHORIZE_NET_IDEMPOTENT_CHARGES is set. See idempotency.py"""
+
+    PENDING = 'pending'
+    UNKNOWN = 'unknown'
+    COMPLETE = 'complete'
+    STATUSES = (
+        (PENDING, 'Pending'),
+        (UNKNOWN, 'Unknown'),
+        (COMPLETE, 'Complete'),
+    )
+
+    key = models.CharField(max_length=255, unique=True)
+    payment_profile_id = models.CharField(max_length=20)
+    amount = models.CharField(max_length=20)
+    status = models.CharField(
+        max_length=10, choices=STATUSES, default=PENDING)
+    result = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    lease_expires = models.DateTimeField(null=True, blank=True)
+    completed = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return '{} ({})'.format(self.key, self.status)
+
+
+class ReconciledBatch(models.Model):
+    """A settled batch that reconcile() has been through. Later runs skip
+    it. See reconciliation.py"""
+
+    MAX_SOURCE_CHARS = 200
+
+    # the rows reconciled, as 'app_label.Model:key:field'. Each source has
+    # its own checkpoints
+    source = models.CharField(max_length=MAX_SOURCE_CHARS)
+    batch_id = models.CharField(max_length=20)
+    settlement_time = models.DateTimeField(db_index=True)
+    transactions = models.PositiveIntegerField(default=0)
+    reconciled = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('source', 'batch_id')
+
+    def __str__(self):
+        return '{} ({}, {})'.format(
+            self.batch_id, self.settlement_time, self.source)
+
+
+class SettledTransaction(models.Model):
+    """A transaction of a ReconciledBatch, kept so that later runs know
+    which local rows were already matched, and which discrepancies are
+    still open"""
+
+    OUTCOMES = (
+        ('matched', 'Matched'),
+        ('mismatched', 'Mismatched'),
+        ('unexpected', 'Unexpected'),
+    )
+
+    batch = models.ForeignKey(
+        ReconciledBatch,
+        on_delete=models.CASCADE,
+        related_name='settled_transactions')
+    transaction_id = models.CharField(max_length=20, db_index=True)
+    invoice_number = models.CharField(
+        max_length=constants.MAX_INVOICE_NUMBER_CHARS, blank=True,
+        db_index=True)
+    status = models.CharField(max_length=40)
+    settle_amount = models.DecimalField(max_digits=15, decimal_places=2)
+    # blank for transactions that didn't settle, which aren't joined
+    outcome = models.CharField(max_length=10, choices=OUTCOMES, blank=True)
+
+    class Meta:
+        unique_together = ('batch', 'transaction_id')
+
+    def __str__(self):
+        return '{}: {} {}'.format(
+            self.transaction_id, self.status, self.settle_amount)
+
+
+class WebhookNotification(models.Model):
+    """A webhook notification from Authorize.net, recorded so that retries
+    of it are not handled twice, and kept until it is handled so that it
+    isn't lost. See webhooks.py"""
+
+    notification_id = models.CharField(max_length=64, unique=True)
+    event_type = models.CharField(max_length=100)
+    # the decoded JSON body, to hand the notification to the handlers again
+    body = models.TextField(blank=True)
+    received = models.DateTimeField(auto_now_add=True)
+    # when the notification was last passed to the handlers
+    claimed = models.DateTimeField(null=True, blank=True)
+    handled = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return '{} {}'.format(self.event_type, self.notification_id)
+
+
+class ChargeJob(models.Model):
+    """A charge_customer_profile() call queued for the charge workers.
+    See charge_queue.py"""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    COMPLETE = 'complete'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (COMPLETE, 'Complete'),
+        (FAILED, 'Failed'),
+    )
+
+    # the model instance passed to CustomerProfile, by app label, model
+    # name and primary key, so that django.contrib.contenttypes isn't needed
+    app_label = models.CharField(max_length=100)
+    model_name = models.CharField(max_length=100)
+    object_id = models.CharField(max_length=64)
+
+    payment_profile_id = models.CharField(max_length=20)
+    amount = models.CharField(max_length=20)
+    ref_id = models.CharField(max_length=20, blank=True)
+    invoice_number = models.CharField(
+        max_length=constants.MAX_INVOICE_NUMBER_CHARS, blank=True)
+    status = models.CharField(
+        max_length=10, choices=STATUSES, default=QUEUED)
+    result = models.TextField(blank=True)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'id'])]
+
+    @property
+    def done(self):
+        return self.status in (self.COMPLETE, self.FAILED)
+
+    @property
+    def instance(self):
+        """The model instance to charge"""
+
+        model = apps.get_model(self.app_label, self.model_name)
+        return model._default_manager.get(pk=self.object_id)
+
+    @instance.setter
+    def instance(self, instance):
+        self.app_label = instance._meta.app_label
+        self.model_name = instance._meta.model_name
+        self.object_id = str(instance.pk)
+
+    @property
+    def transaction(self):
+        """The Transaction of a finished charge, or None"""
+
+        if not self.result:
+            return None
+
+        return Transaction.from_dict(json.loads(self.result))
+
+    def __str__(self):
+        return '{} {} ({})'.format(self.pk, self.amount, self.status)
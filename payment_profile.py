@@ -1,78 +1,105 @@
 from payment_authorizenet.enums import PaymentProfileType
+from payment_authorizenet.records import Record, integer, text
 
 
-class PaymentProfile:
+class PaymentProfile(Record):
 
-    def __init__(self, response):
-        super().__init__()
+    fields = (
+        ('customerPaymentProfileId', 'customer_payment_profile_id', integer),
+    )
+
+    __slots__ = ('customer_payment_profile_id', 'payment')
 
-        self.customer_payment_profile_id = response.customerPaymentProfileId
-        self.payment = Payment(response.payment)
+    def __init__(self, response):
+        self._fill(*self.extract(response), payment=Payment(response.payment))
 
     def __str__(self):
         return '{}: {}'.format(self.customer_payment_profile_id, self.payment)
 
 
-class CreditCard:
+class CreditCard(Record):
     """Stores details of an credit card in PaymentProfile"""
-    def __init__(self, creditCard):
-        super().__init__()
 
-        self.card_number = creditCard.cardNumber
-        self.card_expiration_date = creditCard.expirationDate
-        self.card_type = creditCard.cardType
+    fields = (
+        ('cardNumber', 'card_number', text),
+        ('expirationDate', 'card_expiration_date', text),
+        ('cardType', 'card_type', text),
+        ('issuerNumber', 'issuer_number', text),
+    )
 
-        if hasattr(creditCard, 'issuerNumber'):
-            self.issuer_number = creditCard.issuerNumber
+    __slots__ = tuple(name for _, name, _ in fields)
+
+    def __init__(self, creditCard):
+        self._fill(*self.extract(creditCard))
 
     def __str__(self):
         return '{} {}'.format(self.card_type, self.card_number)
 
 
-class BankAccount:
+class BankAccount(Record):
     """Stores details of an eCheck in PaymentProfile"""
-    def __init__(self, bank_account):
-        super().__init__()
 
-        self.account_type = bank_account.accountType
-        self.routing_number = bank_account.routingNumber
-        self.account_number = bank_account.accountNumber
-        self.name_on_account = bank_account.nameOnAccount
-        self.echeck_type = bank_account.echeckType
+    fields = (
+        ('accountType', 'account_type', text),
+        ('routingNumber', 'routing_number', text),
+        ('accountNumber', 'account_number', text),
+        ('nameOnAccount', 'name_on_account', text),
+        ('echeckType', 'echeck_type', text),
+        ('bankName', 'bank_name', text),
+    )
 
-        if hasattr(bank_account, 'bankName'):
-            self.bank_name = bank_account.bankName
+    __slots__ = tuple(name for _, name, _ in fields)
+
+    def __init__(self, bank_account):
+        self._fill(*self.extract(bank_account))
 
     def __str__(self):
         return '{} {}'.format(self.bank_name, self.account_number)
 
 
-class Payment:
+class Payment(Record):
+    """The credit card or bank account of a PaymentProfile. Only the
+    details are kept, not the payment element of the response"""
 
-    credit_card = None
-    bank_account = None
-    payment_type = 'Not set'
+    __slots__ = ('credit_card', 'bank_account', 'payment_type')
 
     def __init__(self, payment):
-        super().__init__()
-        self.payment = payment
-
-        if hasattr(self.payment, PaymentProfileType.creditCard.name):
-            print('setting credit card details')
-            self.credit_card = CreditCard(payment.creditCard)
-            self.payment_type = PaymentProfileType.creditCard
-            self.output = str(self.credit_card)
-            self.entity = self.credit_card.card_type
-            self.account_number = self.credit_card.card_number
-        elif hasattr(self.payment, PaymentProfileType.bankAccount.name):
-            print('setting bank account details')
-            self.bank_account = BankAccount(payment.bankAccount)
-            self.payment_type = PaymentProfileType.bankAccount
-            self.output = str(self.bank_account)
-            self.entity = self.bank_account.bank_name
-            self.account_number = self.bank_account.account_number
+        creditCard = getattr(payment, PaymentProfileType.creditCard.name, None)
+        bankAccount = getattr(
+            payment, PaymentProfileType.bankAccount.name, None)
+
+        if creditCard is not None:
+            self._fill(credit_card=CreditCard(creditCard),
+                       payment_type=PaymentProfileType.creditCard)
+        elif bankAccount is not None:
+            self._fill(bank_account=BankAccount(bankAccount),
+                       payment_type=PaymentProfileType.bankAccount)
         else:
-            print('no payment was set')
+            self._fill(payment_type='Not set')
+
+    @property
+    def details(self):
+        return self.credit_card or self.bank_account
+
+    @property
+    def entity(self):
+        if self.credit_card is not None:
+            return self.credit_card.card_type
+        if self.bank_account is not None:
+            return self.bank_account.bank_name
+        return None
+
+    @property
+    def account_number(self):
+        if self.credit_card is not None:
+            return self.credit_card.card_number
+        if self.bank_account is not None:
+            return self.bank_account.account_number
+        return None
+
+    @property
+    def output(self):
+        return str(self.details) if self.details is not None else ''
 
     def __str__(self):
         return self.output
@@ -0,0 +1,233 @@
+from concurrent import futures
+import asyncio
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+DEFAULT_TIMEOUT = 300  # seconds a customer profile stays cached
+DEFAULT_LOCK_TIMEOUT = 30  # seconds before an abandoned fill lock expires
+DEFAULT_POLL_INTERVAL = 0.05  # seconds between checks while another fills
+
+KEY_PREFIX = 'payment_authorizenet:customer_profile:'
+
+# the table of loads in flight within a process is guarded by one of a
+# fixed set of locks, picked by key
+LOCK_STRIPES = 64
+
+
+class ProfileCache:
+    """A read-through cache of the payment profiles of customer profiles,
+    stored in one of Django's caches and keyed by
+    authorizenet_customer_profile_id.
+
+    When several threads or workers miss the same key at once, only one of
+    them calls the gateway. The others wait for it to fill the cache, and
+    only call the gateway themselves if it doesn't within lock_timeout.
+
+    Entries are stored under the current generation of their customer
+    profile, which invalidate() replaces. A fill that started before an
+    invalidation stores its value under the old generation, where it is
+    never read"""
+
+    def __init__(
+            self,
+            alias,
+            timeout=DEFAULT_TIMEOUT,
+            lock_timeout=DEFAULT_LOCK_TIMEOUT,
+            poll_interval=DEFAULT_POLL_INTERVAL):
+        super().__init__()
+
+        self.alias = alias
+        self.timeout = timeout
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._in_flight = {}
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def key(customer_profile_id):
+        return KEY_PREFIX + str(customer_profile_id)
+
+    @staticmethod
+    def _generation_key(customer_profile_id):
+        return KEY_PREFIX + str(customer_profile_id) + ':generation'
+
+    def _versioned_key(self, customer_profile_id, generation):
+        return '{}:{}'.format(self.key(customer_profile_id), generation)
+
+    def _current_key(self, customer_profile_id):
+        generation_key = self._generation_key(customer_profile_id)
+
+        generation = self.cache.get(generation_key)
+        if generation is None:
+            # first read, or the generation was evicted: start a new one
+            generation = uuid.uuid4().hex
+            if not self.cache.add(generation_key, generation, None):
+                generation = self.cache.get(generation_key) or generation
+
+        return self._versioned_key(customer_profile_id, generation)
+
+    async def _acurrent_key(self, customer_profile_id):
+        generation_key = self._generation_key(customer_profile_id)
+
+        generation = await self.cache.aget(generation_key)
+        if generation is None:
+            generation = uuid.uuid4().hex
+            if not await self.cache.aadd(generation_key, generation, None):
+                generation = await self.cache.aget(generation_key) or \
+                    generation
+
+        return self._versioned_key(customer_profile_id, generation)
+
+    def _local_lock(self, key):
+        """Guards the entry of key in _in_flight. Never held during a
+        load"""
+        return self._locks[hash(key) % LOCK_STRIPES]
+
+    def get_or_load(self, customer_profile_id, load):
+        """Return the cached payment profiles for customer_profile_id.
+        On a miss, load() is called to fetch them from the gateway"""
+
+        key = self._current_key(customer_profile_id)
+
+        # values are wrapped in a tuple so a cached None is still a hit
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached[0]
+
+        # collapse misses within this process on a Future per key
+        with self._local_lock(key):
+            future = self._in_flight.get(key)
+            loading = future is None
+
+            if loading:
+                future = self._in_flight[key] = futures.Future()
+
+        if not loading:
+            try:
+                return future.result(self.lock_timeout)
+            except futures.TimeoutError:
+                return load()
+
+        try:
+            value = self._fill(key, load)
+        except BaseException as err:
+            future.set_exception(err)
+            raise
+        else:
+            future.set_result(value)
+        finally:
+            with self._local_lock(key):
+                del self._in_flight[key]
+
+        return value
+
+    def _fill(self, key, load):
+        """Load key under the fill lock in the cache, which collapses misses
+        across workers"""
+
+        lock_key = key + ':lock'
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached[0]
+
+        deadline = time.monotonic() + self.lock_timeout
+
+        # wait while another worker holds the fill lock
+        while not self.cache.add(lock_key, True, self.lock_timeout):
+            if time.monotonic() > deadline:
+                return load()
+
+            time.sleep(self.poll_interval)
+
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached[0]
+
+        try:
+            value = load()
+            self.cache.set(key, (value,), self.timeout)
+        finally:
+            self.cache.delete(lock_key)
+
+        return value
+
+    async def aget_or_load(self, customer_profile_id, load):
+        """get_or_load() for asyncio code. load is a coroutine function,
+        and waiting on another worker's fill doesn't block the event loop.
+        Misses are collapsed by the fill lock in the cache alone"""
+
+        key = await self._acurrent_key(customer_profile_id)
+        lock_key = key + ':lock'
+
+        cached = await self.cache.aget(key)
+        if cached is not None:
+            return cached[0]
+
+        deadline = time.monotonic() + self.lock_timeout
+
+        while not await self.cache.aadd(lock_key, True, self.lock_timeout):
+            if time.monotonic() > deadline:
+                return await load()
+
+            await asyncio.sleep(self.poll_interval)
+
+            cached = await self.cache.aget(key)
+            if cached is not None:
+                return cached[0]
+
+        try:
+            value = await load()
+            await self.cache.aset(key, (value,), self.timeout)
+        finally:
+            await self.cache.adelete(lock_key)
+
+        return value
+
+    def invalidate(self, customer_profile_id):
+        # fills in flight keep writing to the generation they started in
+        self.cache.set(
+            self._generation_key(customer_profile_id),
+            uuid.uuid4().hex,
+            None)
+
+
+_profile_cache = None
+
+
+def get_profile_cache():
+    """Return the ProfileCache configured by AUTHORIZE_NET_PROFILE_CACHE,
+    or None if caching is not enabled"""
+    global _profile_cache
+
+    alias = getattr(settings, 'AUTHORIZE_NET_PROFILE_CACHE', None)
+
+    if alias is None:
+        return None
+
+    timeout = getattr(
+        settings, 'AUTHORIZE_NET_PROFILE_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+    if (_profile_cache is None or _profile_cache.alias != alias or
+            _profile_cache.timeout != timeout):
+        _profile_cache = ProfileCache(alias, timeout)
+
+    return _profile_cache
+
+
+def invalidate_customer_profile(customer_profile_id):
+    """Drop a customer profile from the cache, if caching is enabled"""
+
+    profile_cache = get_profile_cache()
+
+    if profile_cache is not None and customer_profile_id:
+        profile_cache.invalidate(customer_profile_id)
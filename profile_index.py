@@ -0,0 +1,162 @@
+"""A local index of customer profile ids by the identity of each profile.
+
+Profiles are created with the pk of their model instance as the
+merchantCustomerId, str(instance) as the description, and an email. The
+gateway treats a new profile with the same three values as a duplicate,
+so the index is keyed on all three too: two models can share a pk, but
+not their profiles. Without the index, creating a profile for an instance
+that already has one costs a failed createCustomerProfile call, and its id
+is read back out of the wording of the duplicate record error.
+
+Set AUTHORIZE_NET_PROFILE_INDEX = True and create_customer_profile() looks
+the instance up in the CustomerProfileIndex table first. Creates and
+deletes made through CustomerProfile keep the table current. Build it for
+the profiles already on Authorize.net with
+
+    python manage.py build_profile_index"""
+
+from django.conf import settings
+from django.db import transaction
+from payment_authorizenet.models import CustomerProfileIndex
+
+
+def index_enabled():
+    return getattr(settings, 'AUTHORIZE_NET_PROFILE_INDEX', False)
+
+
+def identity(merchant_customer_id, description, email):
+    """The (merchantCustomerId, description, email) a profile is indexed
+    under, as strings"""
+
+    return tuple(
+        '' if value is None else str(value)
+        for value in (merchant_customer_id, description, email))
+
+
+def instance_identity(instance, email):
+    """The identity of the profile created for a model instance"""
+    return identity(instance.pk, str(instance), email)
+
+
+def lookup(key):
+    """Return the customer profile id of an identity, or None"""
+
+    merchant_customer_id, description, email = identity(*key)
+
+    return CustomerProfileIndex.objects.filter(
+        merchant_customer_id=merchant_customer_id,
+        description=description,
+        email=email).values_list('customer_profile_id', flat=True).first()
+
+
+def lookup_many(keys):
+    """Return a dict of customer profile id by identity for the
+    identities that are indexed, in one query"""
+
+    keys = set(identity(*key) for key in keys)
+
+    rows = CustomerProfileIndex.objects.filter(
+        merchant_customer_id__in=set(key[0] for key in keys)).values_list(
+        'merchant_customer_id', 'description', 'email',
+        'customer_profile_id')
+
+    return {
+        row[:3]: row[3]
+        for row in rows
+        if row[:3] in keys}
+
+
+def record(key, customer_profile_id):
+    """Index a customer profile under its identity"""
+
+    merchant_customer_id, description, email = identity(*key)
+
+    if not merchant_customer_id:
+        return
+
+    customer_profile_id = int(customer_profile_id)
+
+    with transaction.atomic():
+        # a profile id is only ever indexed once
+        CustomerProfileIndex.objects.filter(
+            customer_profile_id=customer_profile_id).delete()
+
+        CustomerProfileIndex.objects.update_or_create(
+            merchant_customer_id=merchant_customer_id,
+            description=description,
+            email=email,
+            defaults={'customer_profile_id': customer_profile_id})
+
+
+def _rows(entries):
+    """A dict of customer profile id by identity from (merchantCustomerId,
+    description, email, customer profile id) entries"""
+
+    return {
+        identity(*entry[:3]): int(entry[3])
+        for entry in entries
+        if entry[0]}
+
+
+def _objects(rows):
+    return [
+        CustomerProfileIndex(
+            merchant_customer_id=merchant_customer_id,
+            description=description,
+            email=email,
+            customer_profile_id=customer_profile_id)
+        for (merchant_customer_id, description, email), customer_profile_id
+        in rows.items()]
+
+
+def record_many(entries):
+    """Index many customer profiles at once. entries is an iterable of
+    (merchantCustomerId, description, email, customer profile id)"""
+
+    rows = _rows(entries)
+
+    if not rows:
+        return
+
+    with transaction.atomic():
+        indexed = lookup_many(rows)
+
+        CustomerProfileIndex.objects.filter(
+            customer_profile_id__in=list(indexed.values()) +
+            list(rows.values())).delete()
+
+        CustomerProfileIndex.objects.bulk_create(
+            _objects(rows), batch_size=500)
+
+
+def forget(customer_profile_id):
+    """Remove a deleted customer profile from the index"""
+
+    CustomerProfileIndex.objects.filter(
+        customer_profile_id=int(customer_profile_id)).delete()
+
+
+def replace(entries, keep=()):
+    """Replace the whole index with entries, an iterable of
+    (merchantCustomerId, description, email, customer profile id), and
+    return the number of rows written. Rows for the customer profile ids
+    in keep are left as they are"""
+
+    kept = set(int(x) for x in keep)
+    rows = {
+        key: customer_profile_id
+        for key, customer_profile_id in _rows(entries).items()
+        if customer_profile_id not in kept}
+
+    with transaction.atomic():
+        CustomerProfileIndex.objects.exclude(
+            customer_profile_id__in=kept).delete()
+
+        # a kept row wins over a new row for the same identity
+        for key in lookup_many(rows):
+            del rows[key]
+
+        created = CustomerProfileIndex.objects.bulk_create(
+            _objects(rows), batch_size=500)
+
+    return len(created)
@@ -0,0 +1,280 @@
+"""Read getCustomerProfile responses without building the SDK's tree.
+
+The SDK parses every response twice, into pyxb bindings and then into
+lxml objectify elements, and CustomerProfile keeps the whole tree. For a
+customer with hundreds of payment profiles and shipping addresses that is
+most of the time and memory get_customer_profile() takes.
+
+CustomerProfileParser reads the response with lxml's pull parser instead,
+and builds a PaymentProfile or ShippingAddress record as each of their
+elements ends. Only the records are kept. Feed it the body in chunks as
+it arrives, or call parse_customer_profile() with the whole body.
+
+Set AUTHORIZE_NET_STREAMING_PROFILES = True and get_customer_profile()
+uses it, with the transports of transport.py feeding it the body as it
+arrives. customer_profile is then a CustomerProfileResponse rather than
+the SDK's response."""
+
+from django.conf import settings
+from payment_authorizenet.enums import PaymentProfileType
+from payment_authorizenet.merchant_auth import AuthorizeNetError
+from payment_authorizenet.payment_profile import (
+    BankAccount,
+    CreditCard,
+    Payment,
+    PaymentProfile)
+from payment_authorizenet.records import Record, boolean, integer, text
+
+NOT_SET = 'Not set'
+
+
+def streaming_enabled():
+    return getattr(settings, 'AUTHORIZE_NET_STREAMING_PROFILES', False)
+
+
+class ShippingAddress(Record):
+    """An address of the shipToList of a customer profile"""
+
+    fields = (
+        ('customerAddressId', 'customer_address_id', integer),
+        ('firstName', 'first_name', text),
+        ('lastName', 'last_name', text),
+        ('company', 'company', text),
+        ('address', 'address', text),
+        ('city', 'city', text),
+        ('state', 'state', text),
+        ('zip', 'zip_code', text),
+        ('country', 'country', text),
+        ('phoneNumber', 'phone_number', text),
+        ('faxNumber', 'fax_number', text),
+        ('email', 'email', text),
+    )
+
+    __slots__ = tuple(name for _, name, _ in fields)
+
+    def __init__(self, address):
+        self._fill(*self.extract(address))
+
+    def __str__(self):
+        return '{}: {}, {}'.format(
+            self.customer_address_id, self.address, self.city)
+
+
+class Message:
+    """A message of a response, shaped like the SDK's"""
+
+    __slots__ = ('code', 'text')
+
+    def __init__(self, code, text):
+        self.code = code
+        self.text = text
+
+
+class Messages:
+    """The messages of a response, shaped like the SDK's, so metrics and
+    retries read it the same way"""
+
+    __slots__ = ('resultCode', 'message')
+
+    def __init__(self, resultCode, message):
+        self.resultCode = resultCode
+        self.message = message
+
+
+class CustomerProfileResponse:
+    """What CustomerProfileParser keeps of a getCustomerProfile response.
+    customer_profile_id is None if the response had no profile"""
+
+    def __init__(self):
+        super().__init__()
+
+        self.messages = None
+        self.customer_profile_id = None
+        self.merchant_customer_id = None
+        self.email = None
+        self.description = None
+        self.default_payment_profile_id = None
+        self.payment_profiles = []
+        self.shipping_addresses = []
+        self.subscription_ids = []
+
+
+def _children(element):
+    """The text of the children of an element, by tag. lxml's find() is
+    slow next to a loop over the children"""
+    return {child.tag: child.text or '' for child in element}
+
+
+def _record(record_class, tags, element):
+    """Build a record from the children of an element. tags is a sequence
+    of (tag, converter) in the order of the fields of record_class"""
+
+    children = _children(element)
+    values = []
+
+    for tag, convert in tags:
+        value = children.get(tag)
+        values.append(None if value is None else convert(value))
+
+    return record_class.from_values(*values)
+
+
+class CustomerProfileParser:
+    """Parses a getCustomerProfile response, or any error response, fed to
+    it in chunks of bytes or text.
+
+    lxml picks out the elements that hold records as they end, and each is
+    dropped from the document once its record is built"""
+
+    TAGS = ('{*}messages', '{*}profile', '{*}paymentProfiles',
+            '{*}shipToList', '{*}subscriptionIds')
+
+    def __init__(self):
+        super().__init__()
+        from lxml import etree
+
+        self.response = CustomerProfileResponse()
+
+        self._errors = etree.LxmlError
+        self._parser = etree.XMLPullParser(events=('end',), tag=self.TAGS)
+
+        # lxml only finds children quickly by their full name, so the
+        # names are qualified with the namespace of the response
+        self._namespace = None
+
+    def _use_namespace(self, namespace):
+        self._namespace = namespace
+        self._tags = {}
+
+        for record_class in (CreditCard, BankAccount, ShippingAddress):
+            self._tags[record_class] = tuple(
+                (namespace + source, convert)
+                for source, _, convert in record_class.fields)
+
+        self._payment_tag = self._tag('payment')
+        self._credit_card_tag = self._tag(PaymentProfileType.creditCard.name)
+        self._bank_account_tag = self._tag(
+            PaymentProfileType.bankAccount.name)
+
+    def _tag(self, name):
+        return self._namespace + name
+
+    def feed(self, data):
+        try:
+            self._parser.feed(data)
+        except self._errors as err:
+            raise AuthorizeNetError(
+                'Unable to parse the gateway response: {}'.format(err))
+
+        self._read()
+
+    def close(self):
+        """Finish parsing and return the CustomerProfileResponse"""
+
+        try:
+            self._parser.close()
+        except self._errors as err:
+            raise AuthorizeNetError(
+                'Unable to parse the gateway response: {}'.format(err))
+
+        self._read()
+
+        if self.response.messages is None:
+            raise AuthorizeNetError('The gateway response has no messages')
+
+        return self.response
+
+    def _read(self):
+        for _, element in self._parser.read_events():
+            parent = element.getparent()
+
+            if parent is None:
+                continue
+
+            namespace, _, name = element.tag.rpartition('}')
+
+            # the subscriptionIds of payment profiles are not read
+            if name == 'subscriptionIds' and parent.getparent() is not None:
+                continue
+
+            if self._namespace is None:
+                self._use_namespace(namespace + '}' if namespace else '')
+
+            getattr(self, '_end_' + name)(element)
+
+            if name != 'profile':
+                # keep only what has not been read yet
+                element.clear()
+                parent.remove(element)
+
+    # ********** Build records as their elements end *********
+
+    def _end_messages(self, element):
+        self.response.messages = Messages(
+            element.findtext(self._tag('resultCode')),
+            [Message(message.findtext(self._tag('code')),
+                     message.findtext(self._tag('text')))
+             for message in element.iterfind(self._tag('message'))])
+
+    def _end_profile(self, element):
+        response = self.response
+        response.customer_profile_id = integer(
+            element.findtext(self._tag('customerProfileId')))
+        response.merchant_customer_id = element.findtext(
+            self._tag('merchantCustomerId'))
+        response.email = element.findtext(self._tag('email'))
+        response.description = element.findtext(self._tag('description'))
+
+    def _end_paymentProfiles(self, element):
+        payment = None
+        children = {}
+
+        for child in element:
+            if child.tag == self._payment_tag:
+                payment = child
+            else:
+                children[child.tag] = child.text
+
+        payment_profile = PaymentProfile.from_values(
+            integer(children.get(self._tag('customerPaymentProfileId'))),
+            self._payment(payment))
+
+        self.response.payment_profiles.append(payment_profile)
+
+        if boolean(children.get(self._tag('defaultPaymentProfile'))):
+            self.response.default_payment_profile_id = \
+                payment_profile.customer_payment_profile_id
+
+    def _payment(self, payment):
+        for child in () if payment is None else payment:
+            if child.tag == self._credit_card_tag:
+                return Payment.from_values(
+                    credit_card=_record(
+                        CreditCard, self._tags[CreditCard], child),
+                    payment_type=PaymentProfileType.creditCard)
+
+            if child.tag == self._bank_account_tag:
+                return Payment.from_values(
+                    bank_account=_record(
+                        BankAccount, self._tags[BankAccount], child),
+                    payment_type=PaymentProfileType.bankAccount)
+
+        return Payment.from_values(payment_type=NOT_SET)
+
+    def _end_shipToList(self, element):
+        self.response.shipping_addresses.append(_record(
+            ShippingAddress, self._tags[ShippingAddress], element))
+
+    def _end_subscriptionIds(self, element):
+        self.response.subscription_ids = [
+            int(value.text)
+            for value in element.iterfind(self._tag('subscriptionId'))
+            if value.text]
+
+
+def parse_customer_profile(body):
+    """Parse the whole body of a getCustomerProfile response"""
+
+    parser = CustomerProfileParser()
+    parser.feed(body)
+    return parser.close()
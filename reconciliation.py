@@ -0,0 +1,290 @@
+"""Reconcile local rows, such as invoices, against settled transactions.
+
+    report = reconcile(
+        Invoice.objects.filter(paid=True), date(2026, 9, 1),
+        date(2026, 9, 30), field='number', amount_field='total')
+
+The local rows are loaded into a dict keyed by invoice number (or by
+transaction id, with key=TRANSACTION_ID) and the settled transactions of
+the date range are streamed past it, so each side is read once. Only
+transactions that settled successfully are joined:
+
+  - matched: a transaction for the amount of its local row
+  - mismatched: a transaction for another amount than its local row
+  - unexpected: a transaction with no local row, or a second one for a
+    row that was already matched
+  - missing: a local row with no transaction
+
+Every transaction of a batch is saved as a SettledTransaction, with the
+outcome of its join, together with a ReconciledBatch checkpoint. The
+checkpoints are kept per source (the rows, key and field reconciled), so
+reconciling invoices doesn't skip the batches for another model. Running
+again over the same range doesn't read the batches already done from the
+gateway. Their matched rows are not reported as missing, and their
+mismatched and unexpected transactions are joined again against the
+local rows as they are now, so a discrepancy is reported on every run
+until it is fixed."""
+
+from collections import namedtuple
+from decimal import Decimal
+from django.db import transaction
+from payment_authorizenet.models import ReconciledBatch, SettledTransaction
+from payment_authorizenet.reporting import (
+    Reporting,
+    TransactionSummary,
+    as_utc)
+import datetime
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+INVOICE_NUMBER = 'invoice_number'
+TRANSACTION_ID = 'transaction_id'
+KEYS = (INVOICE_NUMBER, TRANSACTION_ID)
+
+SETTLED = 'settledSuccessfully'
+
+MATCHED = 'matched'
+MISMATCHED = 'mismatched'
+UNEXPECTED = 'unexpected'
+MISSING = 'missing'
+
+
+Discrepancy = namedtuple('Discrepancy', [
+    'kind',
+    'key',
+    'pk',
+    'amount',
+    'transaction',
+])
+
+
+class ReconciliationReport:
+    """The outcome of a reconcile() run"""
+
+    def __init__(self):
+        super().__init__()
+
+        self.batches = 0
+        self.skipped_batches = 0
+        self.transactions = 0
+        self.matched = 0
+        self.discrepancies = []
+        self.started = time.monotonic()
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    def of_kind(self, kind):
+        return [d for d in self.discrepancies if d.kind == kind]
+
+    @property
+    def mismatched(self):
+        return self.of_kind(MISMATCHED)
+
+    @property
+    def unexpected(self):
+        return self.of_kind(UNEXPECTED)
+
+    @property
+    def missing(self):
+        return self.of_kind(MISSING)
+
+    def __str__(self):
+        msg = '{} transactions in {} batches ({} skipped) in {:.1f}s: ' \
+              '{} matched, {} mismatched, {} unexpected, {} missing'
+        return msg.format(
+            self.transactions, self.batches, self.skipped_batches,
+            self.elapsed, self.matched, len(self.mismatched),
+            len(self.unexpected), len(self.missing))
+
+
+def _amount(value):
+    return None if value is None else Decimal(str(value))
+
+
+def local_rows(queryset, field, amount_field):
+    """Return {key: (pk, amount)} for the rows of queryset"""
+
+    columns = [field, 'pk']
+
+    if amount_field is not None:
+        columns.append(amount_field)
+
+    rows = {}
+
+    for values in queryset.values_list(*columns).iterator():
+        if values[0] is None or values[0] == '':
+            continue
+
+        amount = _amount(values[2]) if amount_field is not None else None
+        rows[str(values[0])] = (values[1], amount)
+
+    return rows
+
+
+def reconcile(
+        queryset, first, last=None, key=INVOICE_NUMBER, field=None,
+        amount_field='amount', reporting=None, rerun=False, source=None):
+    """Reconcile the rows of queryset against the transactions settled
+    from first to last and return a ReconciliationReport.
+
+    key - the transaction attribute rows are joined on, INVOICE_NUMBER or
+        TRANSACTION_ID
+    field - the field of queryset holding that value. Defaults to key
+    amount_field - the field holding the amount charged, or None to not
+        compare amounts
+    rerun - forget the checkpoints from first to last and read every
+        batch again
+    source - the name of the rows the checkpoints are kept for. Defaults
+        to the label of the model of queryset. Pass another one for a
+        filtered queryset, so its checkpoints aren't mixed with those of
+        the whole table"""
+
+    if key not in KEYS:
+        raise ValueError('key must be one of {}'.format(', '.join(KEYS)))
+
+    reporting = reporting or Reporting()
+    report = ReconciliationReport()
+
+    first = as_utc(first)
+    last = as_utc(last, end=True) if last is not None else \
+        datetime.datetime.now(datetime.timezone.utc)
+
+    field = field or key
+    source = checkpoint_source(
+        source or queryset.model._meta.label, key, field)
+
+    checkpoints = ReconciledBatch.objects.filter(
+        source=source, settlement_time__range=(first, last))
+
+    if rerun:
+        checkpoints.delete()
+
+    done = set(checkpoints.values_list('batch_id', flat=True))
+
+    rows = local_rows(queryset, field, amount_field)
+    rejoin_checkpoints(checkpoints, rows, key, report)
+
+    for batch in reporting.settled_batches(first, last):
+        if batch.batch_id in done:
+            report.skipped_batches += 1
+            continue
+
+        settled = []
+
+        for summary in reporting.transactions(batch.batch_id):
+            outcome = ''
+
+            if summary.status == SETTLED:
+                outcome = join(rows, getattr(summary, key), summary, report)
+
+            settled.append((summary, outcome))
+
+        save_batch(source, batch, settled)
+
+        report.batches += 1
+        report.transactions += len(settled)
+
+    for value, (pk, amount) in rows.items():
+        report.discrepancies.append(
+            Discrepancy(MISSING, value, pk, amount, None))
+
+    report.finished = time.monotonic()
+
+    logger.info('Reconciled %s', report, extra={
+        'operation': 'reconcile',
+        'mismatched': len(report.mismatched),
+        'unexpected': len(report.unexpected),
+        'missing': len(report.missing)})
+
+    return report
+
+
+def checkpoint_source(source, key, field):
+    """Return the ReconciledBatch.source of the checkpoints for rows
+    joined on key through field"""
+
+    value = '{}:{}:{}'.format(source, key, field)
+
+    if len(value) > ReconciledBatch.MAX_SOURCE_CHARS:
+        raise ValueError('{} is longer than {} characters'.format(
+            value, ReconciledBatch.MAX_SOURCE_CHARS))
+
+    return value
+
+
+def join(rows, value, summary, report):
+    """Join a settled transaction to its local row, add the outcome to
+    report and return it"""
+
+    row = rows.pop(value, None)
+
+    if row is None:
+        report.discrepancies.append(Discrepancy(
+            UNEXPECTED, value, None, None, summary))
+        return UNEXPECTED
+
+    if row[1] is not None and row[1] != summary.settle_amount:
+        report.discrepancies.append(Discrepancy(
+            MISMATCHED, value, row[0], row[1], summary))
+        return MISMATCHED
+
+    report.matched += 1
+    return MATCHED
+
+
+def rejoin_checkpoints(checkpoints, rows, key, report):
+    """Take the rows matched by the batches of earlier runs out of rows,
+    and join their other settled transactions again"""
+
+    settled = SettledTransaction.objects.filter(
+        batch__in=checkpoints, status=SETTLED)
+
+    for value in settled.filter(outcome=MATCHED).values_list(
+            key, flat=True).iterator():
+        rows.pop(value, None)
+
+    changed = {}
+
+    for stored in settled.exclude(outcome=MATCHED).select_related(
+            'batch').order_by('pk').iterator():
+        summary = TransactionSummary.from_values(
+            transaction_id=stored.transaction_id,
+            status=stored.status,
+            invoice_number=stored.invoice_number or None,
+            settle_amount=stored.settle_amount,
+            batch_id=stored.batch.batch_id)
+
+        outcome = join(rows, getattr(summary, key), summary, report)
+
+        if outcome != stored.outcome:
+            changed.setdefault(outcome, []).append(stored.pk)
+
+    for outcome, pks in changed.items():
+        SettledTransaction.objects.filter(pk__in=pks).update(outcome=outcome)
+
+
+def save_batch(source, batch, transactions):
+    """Save the transactions of a batch, as (TransactionSummary, outcome)
+    pairs, and its checkpoint for source"""
+
+    with transaction.atomic():
+        reconciled = ReconciledBatch.objects.create(
+            source=source,
+            batch_id=batch.batch_id,
+            settlement_time=batch.settlement_time,
+            transactions=len(transactions))
+
+        SettledTransaction.objects.bulk_create([
+            SettledTransaction(
+                batch=reconciled,
+                transaction_id=summary.transaction_id,
+                invoice_number=summary.invoice_number or '',
+                status=summary.status,
+                settle_amount=summary.settle_amount or 0,
+                outcome=outcome)
+            for summary, outcome in transactions], batch_size=1000)
@@ -0,0 +1,140 @@
+"""Immutable, slotted records for the results of gateway calls.
+
+The SDK returns trees of lxml objectify (or pyxb) elements. Every element
+keeps its whole document alive, so records copy plain Python values out of
+the tree and do not hold on to any element. Each record class lists its
+fields once; the extractor for those fields is built when the class is
+defined, not for every object."""
+
+from decimal import Decimal
+from django.utils.dateparse import parse_datetime
+
+
+def text(element):
+    """Read an element as a string. An empty element is ''"""
+    value = getattr(element, 'text', element)
+    return '' if value is None else str(value)
+
+
+def integer(element):
+    """Read an element as an int, such as a profile id"""
+    value = text(element)
+    return None if not value else int(value)
+
+
+def boolean(element):
+    """Read an element as a bool, such as testRequest or
+    defaultPaymentProfile"""
+    return text(element).lower() in ('true', '1')
+
+
+def decimal(element):
+    """Read an element as a Decimal, such as an amount"""
+    value = text(element)
+    return None if not value else Decimal(value)
+
+
+def timestamp(element):
+    """Read an element as a datetime, such as submitTimeUTC"""
+    value = text(element)
+    return None if not value else parse_datetime(value)
+
+
+def compile_extractor(fields):
+    """Return a function that reads fields from an element of a response.
+
+    fields is a sequence of (response attribute, record attribute,
+    converter). The function returns a tuple of values in the order of
+    fields, with None for attributes missing from the response"""
+
+    fields = tuple((source, convert) for source, _, convert in fields)
+
+    def extract(element):
+        values = []
+
+        for source, convert in fields:
+            child = getattr(element, source, None)
+            values.append(None if child is None else convert(child))
+
+        return tuple(values)
+
+    return extract
+
+
+class Record:
+    """Base class of the result records.
+
+    Subclasses set fields to a sequence of (response attribute, record
+    attribute, converter) and may add extra __slots__ of their own.
+    Records can't be changed once they are built"""
+
+    __slots__ = ()
+
+    fields = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        cls.names = tuple(name for _, name, _ in cls.fields) + \
+            tuple(name for name in cls.__dict__.get('__slots__', ())
+                  if name not in (f[1] for f in cls.fields))
+        cls.extract = staticmethod(compile_extractor(cls.fields))
+
+    @classmethod
+    def from_values(cls, *args, **kwargs):
+        """Build a record from values rather than from a response, in the
+        order of names. Missing values are None"""
+
+        record = cls.__new__(cls)
+        record._fill(*args, **kwargs)
+        return record
+
+    def _fill(self, *args, **kwargs):
+        if not kwargs and len(args) == len(self.names):
+            # every value in order, as extract() returns them
+            for name, value in zip(self.names, args):
+                object.__setattr__(self, name, value)
+            return
+
+        if len(args) > len(self.names):
+            msg = '{} takes at most {} values'
+            raise TypeError(msg.format(type(self).__name__, len(self.names)))
+
+        values = dict(zip(self.names, args))
+        values.update(kwargs)
+
+        for name in self.names:
+            object.__setattr__(self, name, values.pop(name, None))
+
+        if values:
+            msg = '{} has no field {}'
+            raise TypeError(msg.format(type(self).__name__, sorted(values)[0]))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('{} is immutable'.format(type(self).__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError('{} is immutable'.format(type(self).__name__))
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.values() == other.values()
+
+    def __hash__(self):
+        return hash(self.values())
+
+    def __reduce__(self):
+        # pickle by value, so records can be kept in Django's cache
+        return (type(self).from_values, self.values())
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, ', '.join(
+            '{}={!r}'.format(name, getattr(self, name))
+            for name in self.names))
+
+    def values(self):
+        return tuple(getattr(self, name) for name in self.names)
+
+    def as_dict(self):
+        return dict(zip(self.names, self.values()))
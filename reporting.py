@@ -0,0 +1,353 @@
+"""Lazy iterators over the Transaction Reporting API.
+
+    reporting = Reporting()
+
+    for batch in reporting.settled_batches(first, last):
+        for transaction in reporting.transactions(batch.batch_id):
+            ...
+
+    for transaction in reporting.settled_transactions(first, last):
+        ...
+
+getSettledBatchList covers at most 31 days per call, and getTransactionList
+and getUnsettledTransactionList return at most 1000 transactions per call.
+The iterators split date ranges into windows and page through the results,
+fetching the next window or page on a background thread while the current
+one is consumed. Only compact records of one page or so are held at a time,
+so memory stays flat however many transactions there are."""
+
+from concurrent.futures import ThreadPoolExecutor
+from payment_authorizenet.merchant_auth import AuthNet, AuthorizeNetError
+from payment_authorizenet.records import (
+    Record,
+    decimal,
+    integer,
+    text,
+    timestamp)
+from payment_authorizenet.sdk import apicontractsv1, apicontrollers
+import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+OK = 'Ok'
+
+PAGE_SIZE = 1000  # the most transactions the API returns per call
+MAX_WINDOW = datetime.timedelta(days=31)
+
+
+def _profile_ids(element):
+    """Return the customer and payment profile ids of an element's profile"""
+
+    profile = getattr(element, 'profile', None)
+
+    if profile is None:
+        return None, None
+
+    return (integer(getattr(profile, 'customerProfileId', None)),
+            integer(getattr(profile, 'customerPaymentProfileId', None)))
+
+
+class Batch(Record):
+    """A settled batch, from getSettledBatchList"""
+
+    fields = (
+        ('batchId', 'batch_id', text),
+        ('settlementTimeUTC', 'settlement_time', timestamp),
+        ('settlementState', 'settlement_state', text),
+        ('paymentMethod', 'payment_method', text),
+    )
+
+    __slots__ = tuple(name for _, name, _ in fields)
+
+    def __init__(self, batch):
+        self._fill(*self.extract(batch))
+
+    def __str__(self):
+        return '{}: {}'.format(self.batch_id, self.settlement_time)
+
+
+class TransactionSummary(Record):
+    """A transaction from getTransactionList or getUnsettledTransactionList.
+    batch_id is None for unsettled transactions"""
+
+    fields = (
+        ('transId', 'transaction_id', text),
+        ('submitTimeUTC', 'submit_time', timestamp),
+        ('transactionStatus', 'status', text),
+        ('invoiceNumber', 'invoice_number', text),
+        ('accountType', 'account_type', text),
+        ('accountNumber', 'account_number', text),
+        ('settleAmount', 'settle_amount', decimal),
+    )
+
+    __slots__ = tuple(name for _, name, _ in fields) + (
+        'customer_profile_id', 'customer_payment_profile_id', 'batch_id')
+
+    def __init__(self, transaction, batch_id=None):
+        customer_profile_id, customer_payment_profile_id = \
+            _profile_ids(transaction)
+
+        self._fill(
+            *self.extract(transaction),
+            customer_profile_id=customer_profile_id,
+            customer_payment_profile_id=customer_payment_profile_id,
+            batch_id=batch_id)
+
+    def __str__(self):
+        return '{}: {} {}'.format(
+            self.transaction_id, self.status, self.settle_amount)
+
+
+class TransactionDetails(Record):
+    """A transaction from getTransactionDetails"""
+
+    fields = (
+        ('transId', 'transaction_id', text),
+        ('submitTimeUTC', 'submit_time', timestamp),
+        ('transactionType', 'transaction_type', text),
+        ('transactionStatus', 'status', text),
+        ('responseCode', 'response_code', integer),
+        ('responseReasonCode', 'response_reason_code', integer),
+        ('responseReasonDescription', 'response_reason_description', text),
+        ('authCode', 'auth_code', text),
+        ('authAmount', 'auth_amount', decimal),
+        ('settleAmount', 'settle_amount', decimal),
+    )
+
+    __slots__ = tuple(name for _, name, _ in fields) + (
+        'invoice_number', 'batch_id',
+        'customer_profile_id', 'customer_payment_profile_id')
+
+    def __init__(self, transaction):
+        order = getattr(transaction, 'order', None)
+        batch = getattr(transaction, 'batch', None)
+        customer_profile_id, customer_payment_profile_id = \
+            _profile_ids(transaction)
+
+        self._fill(
+            *self.extract(transaction),
+            invoice_number=None if order is None else
+            text(getattr(order, 'invoiceNumber', '')),
+            batch_id=None if batch is None else text(batch.batchId),
+            customer_profile_id=customer_profile_id,
+            customer_payment_profile_id=customer_payment_profile_id)
+
+    def __str__(self):
+        return '{}: {} {}'.format(
+            self.transaction_id, self.status, self.settle_amount)
+
+
+def as_utc(value, end=False):
+    """Return a date or datetime as an aware datetime in UTC. A date is
+    the start of that day, or its last second when end is True. A naive
+    datetime is taken to be in UTC"""
+
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime.combine(
+            value, datetime.time(23, 59, 59) if end else datetime.time())
+
+    if value.tzinfo is None:
+        return value.replace(tzinfo=datetime.timezone.utc)
+
+    return value.astimezone(datetime.timezone.utc)
+
+
+def windows(first, last):
+    """Split first to last into (start, end) windows of at most 31 days,
+    the longest range getSettledBatchList accepts. Windows share their
+    boundaries"""
+
+    if first > last:
+        raise ValueError('first must not be after last')
+
+    start = first
+
+    while True:
+        end = min(start + MAX_WINDOW, last)
+        yield start, end
+
+        if end >= last:
+            return
+
+        start = end
+
+
+def prefetch(fetch, key):
+    """Yield the rows of fetch(key), then of fetch(next key), and so on.
+
+    fetch returns (rows, next key), with None as the next key after the
+    last call. The next call runs on a background thread while the rows of
+    the current one are consumed"""
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(fetch, key)
+
+        while future is not None:
+            rows, key = future.result()
+            future = None if key is None else executor.submit(fetch, key)
+            yield from rows
+
+
+class Reporting(AuthNet):
+    """Reads settled batches and transactions from the gateway.
+
+    page_size is the number of transactions requested per call, at most
+    1000"""
+
+    def __init__(self, page_size=PAGE_SIZE, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        if not 1 <= page_size <= PAGE_SIZE:
+            msg = 'page_size must be from 1 to {}'
+            raise ValueError(msg.format(PAGE_SIZE))
+
+        self.page_size = page_size
+
+    def report(self, controller):
+        """Execute a reporting controller and return the response, or raise
+        AuthorizeNetError if the call failed"""
+
+        response = self.execute(controller)
+
+        if response is None:
+            raise AuthorizeNetError('Null response from Authorize.net')
+
+        if response.messages.resultCode != OK:
+            raise AuthorizeNetError(response.messages.message[0]['text'].text)
+
+        return response
+
+    # ********** Settled batches *********
+
+    def settled_batches(self, first, last=None):
+        """Yield a Batch for every batch settled from first to last, which
+        are dates or datetimes. last defaults to now"""
+
+        first = as_utc(first)
+        last = as_utc(last, end=True) if last is not None else \
+            datetime.datetime.now(datetime.timezone.utc)
+
+        ranges = list(windows(first, last))
+
+        # a batch settled on the boundary of two windows is in both
+        seen = set()
+
+        for batch in prefetch(
+                lambda index: self._batch_window(ranges, index), 0):
+            if batch.batch_id not in seen:
+                seen.add(batch.batch_id)
+                yield batch
+
+    def _batch_window(self, ranges, index):
+        start, end = ranges[index]
+
+        request = apicontractsv1.getSettledBatchListRequest()
+        request.merchantAuthentication = self.merchantAuth
+        request.includeStatistics = False
+        request.firstSettlementDate = start
+        request.lastSettlementDate = end
+
+        response = self.report(
+            apicontrollers.getSettledBatchListController(request))
+
+        batchList = getattr(response, 'batchList', None)
+        batches = [] if batchList is None else [
+            Batch(batch) for batch in getattr(batchList, 'batch', [])]
+
+        logger.debug(
+            'Read %s batches settled from %s to %s', len(batches), start, end,
+            extra={'operation': 'getSettledBatchList'})
+
+        return batches, index + 1 if index + 1 < len(ranges) else None
+
+    # ********** Transactions *********
+
+    def transactions(self, batch_id):
+        """Yield a TransactionSummary for every transaction in a batch"""
+        return prefetch(
+            lambda offset: self._transaction_page(batch_id, offset), 1)
+
+    def unsettled_transactions(self):
+        """Yield a TransactionSummary for every transaction that has not
+        been settled yet"""
+        return prefetch(self._unsettled_transaction_page, 1)
+
+    def settled_transactions(self, first, last=None):
+        """Yield a TransactionSummary for every transaction in the batches
+        settled from first to last"""
+
+        for batch in self.settled_batches(first, last):
+            yield from self.transactions(batch.batch_id)
+
+    def transaction_details(self, transaction_id):
+        """Return the TransactionDetails of one transaction"""
+
+        request = apicontractsv1.getTransactionDetailsRequest()
+        request.merchantAuthentication = self.merchantAuth
+        request.transId = str(transaction_id)
+
+        response = self.report(
+            apicontrollers.getTransactionDetailsController(request))
+
+        return TransactionDetails(response.transaction)
+
+    def _sorting(self):
+        # oldest first, so transactions added while paging land on the
+        # last page instead of shifting the others
+        sorting = apicontractsv1.TransactionListSorting()
+        sorting.orderBy = apicontractsv1.TransactionListOrderFieldEnum \
+            .submitTimeUTC
+        sorting.orderDescending = False
+        return sorting
+
+    def _paging(self, offset):
+        paging = apicontractsv1.Paging()
+        paging.limit = self.page_size
+        paging.offset = offset
+        return paging
+
+    def _transaction_page(self, batch_id, offset):
+        request = apicontractsv1.getTransactionListRequest()
+        request.merchantAuthentication = self.merchantAuth
+        request.batchId = str(batch_id)
+        request.sorting = self._sorting()
+        request.paging = self._paging(offset)
+
+        response = self.report(
+            apicontrollers.getTransactionListController(request))
+
+        return self._page(
+            response, offset, 'getTransactionList', str(batch_id))
+
+    def _unsettled_transaction_page(self, offset):
+        request = apicontractsv1.getUnsettledTransactionListRequest()
+        request.merchantAuthentication = self.merchantAuth
+        request.sorting = self._sorting()
+        request.paging = self._paging(offset)
+
+        response = self.report(
+            apicontrollers.getUnsettledTransactionListController(request))
+
+        return self._page(response, offset, 'getUnsettledTransactionList')
+
+    def _page(self, response, offset, operation, batch_id=None):
+        """Return the TransactionSummary records of a page and the offset
+        of the next page, or None if this is the last"""
+
+        transactions = getattr(response, 'transactions', None)
+        rows = [] if transactions is None else [
+            TransactionSummary(transaction, batch_id)
+            for transaction in getattr(transactions, 'transaction', [])]
+
+        total = integer(getattr(response, 'totalNumInResultSet', None))
+
+        logger.debug(
+            'Read page %s of %s', offset, operation,
+            extra={'operation': operation, 'batch_id': batch_id})
+
+        if len(rows) < self.page_size or \
+                (total is not None and offset * self.page_size >= total):
+            return rows, None
+
+        return rows, offset + 1
@@ -0,0 +1,363 @@
+"""Retries and circuit breakers for calls to the gateway.
+
+Every call made through AuthNet.execute() goes through call() here:
+
+  - A call is retried, with exponential backoff and full jitter, when it
+    failed in a way that is safe to repeat: the gateway could not be
+    reached or answered with one of RETRYABLE_ERROR_CODES, and the
+    operation is in IDEMPOTENT_OPERATIONS. Codes in NOT_PROCESSED_ERROR_CODES
+    mean the gateway did nothing, so they are retried for any operation.
+
+  - All attempts of a call, and the backoff between them, share a
+    deadline of AUTHORIZE_NET_TIMEOUT seconds. No retry is made once the
+    backoff and MIN_REQUEST_TIMEOUT would run past it, and the transports
+    cut the timeout of each request to what is left of it, but no shorter
+    than MIN_REQUEST_TIMEOUT.
+
+  - Each endpoint has a circuit breaker. After AUTHORIZE_NET_CIRCUIT_FAILURES
+    failures in a row it opens, and calls raise CircuitOpenError at once
+    instead of waiting on the gateway. After AUTHORIZE_NET_CIRCUIT_RESET
+    seconds one call is let through; if it succeeds the circuit closes."""
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from payment_authorizenet import metrics
+import asyncio
+import contextvars
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETRY_ATTEMPTS = 3  # including the first call
+DEFAULT_RETRY_BASE_DELAY = 0.25  # seconds
+DEFAULT_RETRY_MAX_DELAY = 2  # seconds
+DEFAULT_CIRCUIT_FAILURES = 5
+DEFAULT_CIRCUIT_RESET = 30  # seconds
+
+# the shortest timeout a request is given, however little is left of the
+# deadline. requests and aiohttp refuse a timeout of 0 or less
+MIN_REQUEST_TIMEOUT = 0.5  # seconds
+
+RESILIENCE_SETTINGS = (
+    'AUTHORIZE_NET_RETRY_ATTEMPTS',
+    'AUTHORIZE_NET_RETRY_BASE_DELAY',
+    'AUTHORIZE_NET_RETRY_MAX_DELAY',
+    'AUTHORIZE_NET_CIRCUIT_FAILURES',
+    'AUTHORIZE_NET_CIRCUIT_RESET',
+    'AUTHORIZE_NET_TIMEOUT',
+)
+
+# reads, and writes that leave the same state however often they are sent
+IDEMPOTENT_OPERATIONS = frozenset([
+    'getCustomerProfile',
+    'getCustomerProfileIds',
+    'getCustomerPaymentProfile',
+    'getSettledBatchList',
+    'getTransactionList',
+    'getUnsettledTransactionList',
+    'getTransactionDetails',
+    'getTransactionListForCustomer',
+    'updateCustomerPaymentProfile',
+])
+
+# An error occurred during processing. Please try again.
+# Server too busy. Server in maintenance.
+RETRYABLE_ERROR_CODES = frozenset(['E00001', 'E00053', 'E00104'])
+
+# the request was turned away before it was processed
+NOT_PROCESSED_ERROR_CODES = frozenset(['E00053', 'E00104'])
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+def is_gateway_failure(response):
+    """Did the gateway fail, as opposed to reject the request?"""
+
+    result_code, error_code = metrics.response_codes(response)
+
+    return result_code == metrics.NO_RESPONSE or \
+        error_code in RETRYABLE_ERROR_CODES
+
+
+def is_retryable(operation, response):
+    result_code, error_code = metrics.response_codes(response)
+
+    if error_code in NOT_PROCESSED_ERROR_CODES:
+        return True
+
+    return operation in IDEMPOTENT_OPERATIONS and (
+        result_code == metrics.NO_RESPONSE or
+        error_code in RETRYABLE_ERROR_CODES)
+
+
+class RetryPolicy:
+
+    def __init__(
+            self,
+            attempts=DEFAULT_RETRY_ATTEMPTS,
+            base_delay=DEFAULT_RETRY_BASE_DELAY,
+            max_delay=DEFAULT_RETRY_MAX_DELAY,
+            deadline=None):
+        super().__init__()
+
+        if attempts < 1:
+            raise ValueError('attempts must be at least 1')
+
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # seconds for every attempt and the backoff between them, or None
+        self.deadline = deadline
+
+    def delay(self, retry):
+        """Seconds to wait before retry number retry, counting from 0.
+        Full jitter: a random time up to the exponential backoff"""
+        return random.uniform(
+            0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+
+class CircuitBreaker:
+    """Counts failures in a row for one endpoint. Thread safe"""
+
+    def __init__(
+            self,
+            failure_threshold=DEFAULT_CIRCUIT_FAILURES,
+            reset_timeout=DEFAULT_CIRCUIT_RESET):
+        super().__init__()
+
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened = None
+        self.probing = False
+
+    @property
+    def state(self):
+        if self.opened is None:
+            return CLOSED
+
+        if time.monotonic() - self.opened < self.reset_timeout:
+            return OPEN
+
+        return HALF_OPEN
+
+    def allow(self):
+        """May a call go through? While half open, only one call at a time
+        is let through to probe the gateway"""
+
+        with self.lock:
+            state = self.state
+
+            if state == CLOSED:
+                return True
+
+            if state == HALF_OPEN and not self.probing:
+                self.probing = True
+                return True
+
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened = None
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.probing = False
+
+            if self.opened is not None or \
+                    self.failures >= self.failure_threshold:
+                # (re)open, including after a failed probe
+                self.opened = time.monotonic()
+
+    def record(self, response):
+        if is_gateway_failure(response):
+            self.record_failure()
+        else:
+            self.record_success()
+
+
+_retry_policy = None
+_circuit_breakers = {}
+_lock = threading.Lock()
+
+# time.monotonic() by which the call() running in this context must end
+_deadline = contextvars.ContextVar('authorizenet_deadline', default=None)
+
+
+def get_retry_policy():
+    global _retry_policy
+    from payment_authorizenet.transport import DEFAULT_TIMEOUT
+
+    if _retry_policy is None:
+        _retry_policy = RetryPolicy(
+            getattr(settings, 'AUTHORIZE_NET_RETRY_ATTEMPTS',
+                    DEFAULT_RETRY_ATTEMPTS),
+            getattr(settings, 'AUTHORIZE_NET_RETRY_BASE_DELAY',
+                    DEFAULT_RETRY_BASE_DELAY),
+            getattr(settings, 'AUTHORIZE_NET_RETRY_MAX_DELAY',
+                    DEFAULT_RETRY_MAX_DELAY),
+            getattr(settings, 'AUTHORIZE_NET_TIMEOUT', DEFAULT_TIMEOUT))
+
+    return _retry_policy
+
+
+def time_left(timeout):
+    """The timeout of a request to the gateway: timeout, cut short to what
+    is left of the deadline of the call() the request is part of"""
+
+    deadline = _deadline.get()
+
+    if deadline is None:
+        return timeout
+
+    left = max(deadline - time.monotonic(), MIN_REQUEST_TIMEOUT)
+
+    return left if timeout is None else min(timeout, left)
+
+
+def get_circuit_breaker(post_url):
+    """Return the circuit breaker of an endpoint, shared by this process"""
+
+    with _lock:
+        breaker = _circuit_breakers.get(post_url)
+
+        if breaker is None:
+            breaker = CircuitBreaker(
+                getattr(settings, 'AUTHORIZE_NET_CIRCUIT_FAILURES',
+                        DEFAULT_CIRCUIT_FAILURES),
+                getattr(settings, 'AUTHORIZE_NET_CIRCUIT_RESET',
+                        DEFAULT_CIRCUIT_RESET))
+            _circuit_breakers[post_url] = breaker
+
+        return breaker
+
+
+def reset():
+    """Forget the retry policy and close every circuit"""
+    global _retry_policy
+
+    with _lock:
+        _retry_policy = None
+        _circuit_breakers.clear()
+
+
+@receiver(setting_changed)
+def resilience_setting_changed(setting, **kwargs):
+    if setting in RESILIENCE_SETTINGS:
+        reset()
+
+
+def _circuit_open(operation, post_url):
+    from payment_authorizenet.merchant_auth import CircuitOpenError
+
+    logger.debug('Circuit open, not calling %s', operation,
+                 extra={'operation': operation, 'post_url': post_url})
+
+    return CircuitOpenError(
+        'Authorize.net at {} is failing. Try again later'.format(post_url))
+
+
+def _attempts(operation, post_url):
+    """Yield (breaker, retry policy, attempt number) for each attempt"""
+
+    breaker = get_circuit_breaker(post_url)
+    policy = get_retry_policy()
+
+    for attempt in range(policy.attempts):
+        if not breaker.allow():
+            raise _circuit_open(operation, post_url)
+
+        yield breaker, policy, attempt
+
+
+def _start_deadline():
+    policy = get_retry_policy()
+
+    if policy.deadline is None:
+        return _deadline.set(None)
+
+    return _deadline.set(time.monotonic() + policy.deadline)
+
+
+def _should_retry(operation, response, policy, attempt, delay):
+    if attempt + 1 >= policy.attempts or \
+            not is_retryable(operation, response):
+        return False
+
+    deadline = _deadline.get()
+
+    # a retry needs time for the request as well as the backoff
+    if deadline is not None and \
+            time.monotonic() + delay + MIN_REQUEST_TIMEOUT >= deadline:
+        logger.info(
+            'Not retrying %s: the deadline of %ss would pass',
+            operation, policy.deadline, extra={'operation': operation})
+        return False
+
+    logger.info(
+        'Retrying %s after a gateway failure (attempt %s of %s)',
+        operation, attempt + 2, policy.attempts,
+        extra={'operation': operation})
+
+    return True
+
+
+def call(operation, post_url, execute):
+    """Run execute(), which calls the gateway once and returns the
+    response, with retries and the circuit breaker of post_url"""
+
+    token = _start_deadline()
+
+    try:
+        for breaker, policy, attempt in _attempts(operation, post_url):
+            try:
+                response = execute()
+            except Exception:
+                breaker.record_failure()
+                raise
+
+            breaker.record(response)
+            delay = policy.delay(attempt)
+
+            if not _should_retry(operation, response, policy, attempt, delay):
+                return response
+
+            time.sleep(delay)
+    finally:
+        _deadline.reset(token)
+
+
+async def async_call(operation, post_url, execute):
+    """call() for a coroutine function execute"""
+
+    token = _start_deadline()
+
+    try:
+        for breaker, policy, attempt in _attempts(operation, post_url):
+            try:
+                response = await execute()
+            except Exception:
+                breaker.record_failure()
+                raise
+
+            breaker.record(response)
+            delay = policy.delay(attempt)
+
+            if not _should_retry(operation, response, policy, attempt, delay):
+                return response
+
+            await asyncio.sleep(delay)
+    finally:
+        _deadline.reset(token)
@@ -0,0 +1,85 @@
+from collections import namedtuple
+import json
+import os
+
+# The bundled copy of Authorize.net's responseCodes.json. It only holds the
+# codes this app has met so far and is marked partial; replace it with the
+# full table with python manage.py refresh_response_codes
+BUNDLED_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'data', 'response_codes.json')
+
+SOURCE_URL = 'https://developer.authorize.net/api/'\
+             'reference/dist/json/responseCodes.json'
+
+APPROVAL_CODE = '1'
+
+
+ResponseCode = namedtuple('ResponseCode', ['code', 'text', 'approved'])
+
+
+class ResponseCodeTable:
+    """An indexed view of the response code table.
+    Lookups are plain dict lookups keyed on the code as a string, so
+    response codes from the SDK (ints or objectify elements) work too"""
+
+    def __init__(self, codes, version=None, partial=False):
+        super().__init__()
+
+        self.version = version
+        self.partial = partial
+        self.codes = {
+            str(x['code']): ResponseCode(
+                str(x['code']), x.get('text'), str(x['code']) == APPROVAL_CODE)
+            for x in codes}
+        self.approval_code = int(APPROVAL_CODE)
+
+    @classmethod
+    def from_file(cls, path=BUNDLED_PATH):
+        """Load a table saved in the bundled format. The plain list format
+        published by Authorize.net is accepted as well"""
+
+        with open(path) as f:
+            data = json.load(f)
+
+        if isinstance(data, list):
+            return cls(data)
+
+        return cls(
+            data['codes'], data.get('version'), data.get('partial', False))
+
+    def get(self, code, default=None):
+        return self.codes.get(str(code), default)
+
+    def text(self, code):
+        """The reason text for code, or None if the code is unknown"""
+        response_code = self.codes.get(str(code))
+        return response_code.text if response_code is not None else None
+
+    def is_approved(self, code):
+        response_code = self.codes.get(str(code))
+        return response_code is not None and response_code.approved
+
+    def __contains__(self, code):
+        return str(code) in self.codes
+
+    def __len__(self):
+        return len(self.codes)
+
+
+_table = None
+
+
+def get_response_codes():
+    """Return the process wide ResponseCodeTable, loading it on first use"""
+    global _table
+
+    if _table is None:
+        _table = ResponseCodeTable.from_file()
+
+    return _table
+
+
+def clear_response_codes():
+    """Forget the loaded table so the next lookup reloads the bundled file"""
+    global _table
+    _table = None
@@ -0,0 +1,310 @@
+"""Look routing numbers up in the Federal Reserve's FedACH directory.
+
+The ABA checksum only catches typos. The directory also knows whether a
+routing number was ever issued, the name of its bank, and whether it has
+been replaced by a new routing number. Build it from the directory file
+downloaded from the Fed's E-Payments Routing Directory, either the fixed
+width FedACHdir.txt or its JSON form, with
+
+    python manage.py load_routing_directory FedACHdir.txt
+
+which writes the binary file named by AUTHORIZE_NET_ROUTING_DIRECTORY,
+such as '/var/lib/myproject/routing_directory.bin'. There is no default,
+as the app's own directory may not be writable. When that file exists,
+ECheckForm refuses routing numbers that aren't in it and fills in
+bank_name.
+
+The file holds the sorted routing numbers as one array, followed by
+parallel arrays of the rest of each entry and a table of bank names, so a
+lookup is a binary search over a memory map. Nothing is read into memory
+up front, and every process maps the same read-only pages."""
+
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from django.conf import settings
+from payment_authorizenet import constants
+import json
+import mmap
+import os
+import struct
+import tempfile
+
+MAGIC = b'ABADIR\x00\x01'
+BYTE_ORDER_MARK = 0x01020304
+
+# magic, byte order mark, number of entries. The arrays are written in
+# the byte order of the machine that builds the file
+HEADER = struct.Struct('=8sII')
+NUMBER_SIZE = array('I').itemsize
+
+# recordTypeCode of the FedACH directory
+FEDERAL_RESERVE = 'federal_reserve'
+ACTIVE = 'active'
+CHANGED = 'changed'
+STATUSES = {0: FEDERAL_RESERVE, 1: ACTIVE, 2: CHANGED}
+CHANGED_RECORD_TYPE = 2
+
+RoutingEntry = namedtuple('RoutingEntry', [
+    'routing_number',
+    'bank_name',
+    'status',
+    'new_routing_number',
+])
+
+
+def _is_routing_number(routing_number):
+    return len(routing_number) == constants.ABA_DIGITS and \
+        routing_number.isascii() and routing_number.isdigit()
+
+
+def directory_path():
+    """Return AUTHORIZE_NET_ROUTING_DIRECTORY, or None if it isn't set"""
+    return getattr(settings, 'AUTHORIZE_NET_ROUTING_DIRECTORY', None)
+
+
+# ****************** Reading the Fed's files
+
+def parse_fedach(lines):
+    """Yield (routing number, record type, new routing number, bank name)
+    from the lines of the fixed width FedACHdir.txt"""
+
+    for line in lines:
+        routing_number = line[0:9]
+
+        if not _is_routing_number(routing_number):
+            continue
+
+        record_type = line[19:20]
+        new_routing_number = line[26:35].strip()
+
+        yield (
+            int(routing_number),
+            int(record_type) if record_type.isdigit() else 1,
+            int(new_routing_number) if new_routing_number.isdigit() else 0,
+            line[35:71].strip())
+
+
+def parse_json(data):
+    """Yield the entries of the JSON form of the directory, as
+    parse_fedach() does"""
+
+    # {"fedACHParticipants": {"fedACHParticipants": [...]}}
+    while isinstance(data, dict):
+        data = data['fedACHParticipants']
+
+    for participant in data:
+        routing_number = str(participant.get('routingNumber', ''))
+
+        if not _is_routing_number(routing_number):
+            continue
+
+        yield (
+            int(routing_number),
+            int(participant.get('recordTypeCode') or 1),
+            int(participant.get('newRoutingNumber') or 0),
+            (participant.get('customerName') or '').strip())
+
+
+def read_source(text):
+    """Parse the text of either form of the directory"""
+
+    if text.lstrip().startswith(('{', '[')):
+        return list(parse_json(json.loads(text)))
+
+    return list(parse_fedach(text.splitlines()))
+
+
+# ****************** The binary directory
+
+def write_directory(entries, path):
+    """Write entries, as parse_fedach() yields them, to a binary directory
+    at path and return the number written. The file is replaced
+    atomically, so processes reading the old one are not disturbed"""
+
+    rows = {}
+
+    for routing_number, record_type, new_routing_number, name in entries:
+        rows.setdefault(
+            routing_number, (record_type, new_routing_number, name))
+
+    routing_numbers = array('I', sorted(rows))
+    new_routing_numbers = array('I')
+    name_offsets = array('I')
+    record_types = array('B')
+
+    names = bytearray()
+    offsets = {}
+
+    for routing_number in routing_numbers:
+        record_type, new_routing_number, name = rows[routing_number]
+        # names are stored after a length byte
+        name = name.encode('utf-8')[:255].decode('utf-8', 'ignore') \
+            .encode('utf-8')
+
+        if name not in offsets:
+            offsets[name] = len(names)
+            names.append(len(name))
+            names.extend(name)
+
+        new_routing_numbers.append(new_routing_number)
+        name_offsets.append(offsets[name])
+        record_types.append(record_type)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            f.write(HEADER.pack(
+                MAGIC, BYTE_ORDER_MARK, len(routing_numbers)))
+            for column in (routing_numbers, new_routing_numbers,
+                           name_offsets, record_types):
+                column.tofile(f)
+            f.write(names)
+
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+    return len(routing_numbers)
+
+
+class RoutingDirectory:
+    """A read-only, memory mapped binary directory written by
+    write_directory()"""
+
+    def __init__(self, path):
+        super().__init__()
+
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            stat = os.fstat(f.fileno())
+
+        magic, byte_order_mark, count = HEADER.unpack_from(self._map)
+
+        if magic != MAGIC:
+            raise ValueError('{} is not a routing directory'.format(path))
+
+        if byte_order_mark != BYTE_ORDER_MARK:
+            msg = '{} was built on a machine of another byte order. ' \
+                  'Build it again with load_routing_directory'
+            raise ValueError(msg.format(path))
+
+        self.path = path
+        self.count = count
+        self.version = (stat.st_ino, stat.st_mtime_ns)
+
+        view = memoryview(self._map)
+        start = HEADER.size
+        size = NUMBER_SIZE * count
+
+        self.routing_numbers = view[start:start + size].cast('I')
+        self.new_routing_numbers = \
+            view[start + size:start + 2 * size].cast('I')
+        self.name_offsets = \
+            view[start + 2 * size:start + 3 * size].cast('I')
+        self.record_types = view[start + 3 * size:start + 3 * size + count]
+        self.names_start = start + 3 * size + count
+
+    def _index(self, routing_number):
+        if not _is_routing_number(routing_number):
+            return None
+
+        number = int(routing_number)
+        index = bisect_left(self.routing_numbers, number)
+
+        if index < self.count and self.routing_numbers[index] == number:
+            return index
+
+        return None
+
+    def _name(self, index):
+        offset = self.names_start + self.name_offsets[index]
+        length = self._map[offset]
+        return self._map[offset + 1:offset + 1 + length].decode('utf-8')
+
+    def get(self, routing_number):
+        """Return the RoutingEntry of a routing number, or None if the
+        directory doesn't have it"""
+
+        routing_number = str(routing_number)
+        index = self._index(routing_number)
+
+        if index is None:
+            return None
+
+        new_routing_number = self.new_routing_numbers[index]
+
+        return RoutingEntry(
+            routing_number,
+            self._name(index),
+            STATUSES.get(self.record_types[index], ACTIVE),
+            '{:09}'.format(new_routing_number) if new_routing_number
+            else None)
+
+    def usable_many(self, numbers):
+        """For a numpy array of routing numbers as integers, whether each
+        is in the directory and hasn't been replaced, as a bool array"""
+        import numpy
+
+        if not self.count:
+            return numpy.zeros(len(numbers), dtype=bool)
+
+        routing_numbers = numpy.frombuffer(
+            self.routing_numbers, dtype=numpy.uintc)
+        record_types = numpy.frombuffer(self.record_types, dtype=numpy.uint8)
+
+        found = numpy.minimum(
+            numpy.searchsorted(routing_numbers, numbers), self.count - 1)
+
+        return (routing_numbers[found] == numbers) & \
+            (record_types[found] != CHANGED_RECORD_TYPE)
+
+    def __contains__(self, routing_number):
+        return self._index(str(routing_number)) is not None
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        for view in (self.routing_numbers, self.new_routing_numbers,
+                     self.name_offsets, self.record_types):
+            view.release()
+
+        self._map.close()
+
+
+_directory = None
+
+
+def get_routing_directory():
+    """Return the process wide RoutingDirectory, or None if
+    AUTHORIZE_NET_ROUTING_DIRECTORY isn't set or its file doesn't exist.
+    The file is mapped on first use, and again once load_routing_directory
+    has replaced it"""
+    global _directory
+
+    path = directory_path()
+
+    if not path:
+        return None
+
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    if _directory is None or _directory.path != path or \
+            _directory.version != (stat.st_ino, stat.st_mtime_ns):
+        _directory = RoutingDirectory(path)
+
+    return _directory
+
+
+def clear_routing_directory():
+    """Forget the mapped directory so the next lookup maps the file again"""
+    global _directory
+    _directory = None
@@ -0,0 +1,70 @@
+# The SDK's pyxb bindings in apicontractsv1 are slow to import and large in
+# memory. Import apicontractsv1 and apicontrollers from this module instead
+# of from authorizenet, and the SDK is only loaded when it is first used.
+#
+# AUTHORIZE_NET_STARTUP_MODE controls when that happens:
+#   - 'lazy' (default) - on the first gateway call
+#   - 'prefork' - in PaymentAuthorizenetConfig.ready(), where the bindings
+#     are also warmed up. With gunicorn --preload, workers then share those
+#     pages with the master process copy-on-write
+
+from importlib import import_module
+
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+LAZY = 'lazy'
+PREFORK = 'prefork'
+STARTUP_MODES = (LAZY, PREFORK)
+
+apicontractsv1 = SimpleLazyObject(
+    lambda: import_module('authorizenet.apicontractsv1'))
+apicontrollers = SimpleLazyObject(
+    lambda: import_module('authorizenet.apicontrollers'))
+
+
+def startup_mode():
+    return getattr(settings, 'AUTHORIZE_NET_STARTUP_MODE', LAZY)
+
+
+def load():
+    """Import the SDK now"""
+    import_module('authorizenet.apicontractsv1')
+    import_module('authorizenet.apicontrollers')
+
+
+def warm_up():
+    """Import the SDK and run one request and one response through the
+    bindings, so the work pyxb defers to first use is done up front"""
+
+    from payment_authorizenet.transport import parse_response
+
+    load()
+
+    request = apicontractsv1.getCustomerProfileRequest()
+    request.merchantAuthentication = \
+        apicontractsv1.merchantAuthenticationType()
+    request.merchantAuthentication.name = 'warm-up'
+    request.merchantAuthentication.transactionKey = 'warm-up'
+    request.customerProfileId = '1'
+
+    controller = apicontrollers.getCustomerProfileController(request)
+    controller.setClientId()
+    controller.buildrequest()
+
+    parse_response(controller, WARM_UP_RESPONSE)
+
+
+WARM_UP_RESPONSE = (
+    '<?xml version="1.0" encoding="utf-8"?>'
+    '<getCustomerProfileResponse '
+    'xmlns="AnetApi/xml/v1/schema/AnetApiSchema.xsd">'
+    '<messages><resultCode>Ok</resultCode><message><code>I00001</code>'
+    '<text>Successful.</text></message></messages>'
+    '<profile><merchantCustomerId>1</merchantCustomerId>'
+    '<customerProfileId>1</customerProfileId>'
+    '<paymentProfiles><customerPaymentProfileId>1</customerPaymentProfileId>'
+    '<payment><creditCard><cardNumber>XXXX1111</cardNumber>'
+    '<expirationDate>XXXX</expirationDate><cardType>Visa</cardType>'
+    '</creditCard></payment></paymentProfiles></profile>'
+    '</getCustomerProfileResponse>')
@@ -0,0 +1,16 @@
+from django.dispatch import Signal
+
+# Sent before every call to the gateway, with sender=the AuthNet subclass
+# and the arguments instance, operation (such as 'createTransaction') and
+# server_mode
+gateway_call_started = Signal()
+
+# Sent after every call to the gateway, with the arguments of
+# gateway_call_started and result_code ('Ok', 'Error', 'NoResponse' or
+# 'Exception'), error_code (such as 'E00027', or ''), duration in seconds
+# and response (None unless the gateway answered)
+gateway_call_finished = Signal()
+
+# Sent when a queued charge finishes, with sender=ChargeJob and the
+# argument job. See charge_queue.py
+charge_job_finished = Signal()
@@ -0,0 +1,86 @@
+"""Models and base classes shared by the tests that run against a
+FakeGateway"""
+
+from django.db import connection, models
+from django.test import TestCase, TransactionTestCase
+from payment_authorizenet.enums import AccountType, CustomerType
+from payment_authorizenet.fake_gateway import FakeGateway
+
+
+class Practice(models.Model):
+    """A model to attach customer profiles to in tests"""
+
+    name = models.CharField(max_length=50)
+    authorizenet_customer_profile_id = models.BigIntegerField(null=True)
+    authorizenet_default_payment_profile_id = models.BigIntegerField(
+        null=True)
+
+    class Meta:
+        app_label = 'payment_authorizenet'
+        managed = False
+
+    def __str__(self):
+        return self.name
+
+
+CONTACT = {
+    'address': '123 Sesame St',
+    'city': 'New York',
+    'state': 'NY',
+    'zip_code': '10005',
+    'phone': '123456789',
+}
+
+
+class FakeGatewayMixin:
+    """Run CustomerProfile against a FakeGateway of its own"""
+
+    gateway_options = {}
+
+    @classmethod
+    def setUpClass(cls):
+        with connection.schema_editor() as editor:
+            editor.create_model(Practice)
+
+        cls.gateway = FakeGateway(seed=1, **cls.gateway_options)
+        cls.gateway_settings = cls.gateway.settings()
+        cls.gateway_settings.enable()
+
+        # class cleanups run last to first, after the settings overridden
+        # by subclasses are restored
+        cls.addClassCleanup(cls.drop_table)
+        cls.addClassCleanup(cls.gateway.stop)
+        cls.addClassCleanup(cls.gateway_settings.disable)
+
+        super().setUpClass()
+
+    @classmethod
+    def drop_table(cls):
+        with connection.schema_editor() as editor:
+            editor.delete_model(Practice)
+
+    def setUp(self):
+        self.gateway.reset()
+        self.practice = Practice.objects.create(name='Acme Brick Co')
+
+    def create_profiles(self, cp):
+        cp.create_customer_profile('test@test.com')
+
+        card = cp.create_customer_payment_profile_credit_card(
+            '4111111111111111', '2030-12', '123', CustomerType.business,
+            'Shaun', 'Overton', CONTACT, 'Acme Brick Co', False)
+
+        bank = cp.create_customer_payment_profile_echeck(
+            AccountType.businessChecking, '114000093', '123456789',
+            'Acme Brick Co', 'Frost Bank', CustomerType.business,
+            'Shaun', 'Overton', CONTACT, 'Acme Brick Co', False, False)
+
+        return card, bank
+
+
+class FakeGatewayTestCase(FakeGatewayMixin, TestCase):
+    pass
+
+
+class FakeGatewayTransactionTestCase(FakeGatewayMixin, TransactionTestCase):
+    """For tests whose rows must be seen by other threads"""
@@ -0,0 +1,162 @@
+from asgiref.sync import async_to_sync
+from django.db import models
+from django.test import (
+    SimpleTestCase,
+    TransactionTestCase,
+    override_settings)
+from payment_authorizenet.async_customer_profile import AsyncCustomerProfile
+from payment_authorizenet.customer_profile import CustomerProfile
+from payment_authorizenet.merchant_auth import AuthorizeNetError
+from payment_authorizenet.models import IdempotentCharge
+from payment_authorizenet.profile_cache import get_profile_cache
+from payment_authorizenet.transaction import Transaction
+from payment_authorizenet.transport import AsyncTransport, PooledTransport
+from unittest import mock
+
+NAMESPACE = 'AnetApi/xml/v1/schema/AnetApiSchema.xsd'
+
+OK = '<messages><resultCode>Ok</resultCode><message><code>I00001</code>' \
+     '<text>Successful.</text></message></messages>'
+
+GET_CUSTOMER_PROFILE = (
+    '<?xml version="1.0" encoding="utf-8"?>'
+    '<getCustomerProfileResponse xmlns="{}">{}<profile>'
+    '<merchantCustomerId>1</merchantCustomerId>'
+    '<customerProfileId>1500000001</customerProfileId>'
+    '<paymentProfiles><customerPaymentProfileId>1600000001'
+    '</customerPaymentProfileId><payment><creditCard>'
+    '<cardNumber>XXXX1111</cardNumber><expirationDate>XXXX</expirationDate>'
+    '<cardType>Visa</cardType></creditCard></payment></paymentProfiles>'
+    '</profile></getCustomerProfileResponse>').format(NAMESPACE, OK)
+
+CREATE_TRANSACTION = (
+    '<?xml version="1.0" encoding="utf-8"?>'
+    '<createTransactionResponse xmlns="{}"><refId>A1</refId>{}'
+    '<transactionResponse><responseCode>1</responseCode>'
+    '<authCode>ABC123</authCode><avsResultCode>Y</avsResultCode>'
+    '<cvvResultCode>P</cvvResultCode><transId>2000000001</transId>'
+    '<accountNumber>XXXX1111</accountNumber><accountType>Visa</accountType>'
+    '<messages><message><code>1</code><description>This transaction has '
+    'been approved.</description></message></messages>'
+    '</transactionResponse></createTransactionResponse>').format(
+        NAMESPACE, OK)
+
+
+class Customer(models.Model):
+    authorizenet_customer_profile_id = models.IntegerField(null=True)
+
+    class Meta:
+        app_label = 'payment_authorizenet'
+        managed = False
+
+
+class TestAsyncCustomerProfile(SimpleTestCase):
+    """Test AsyncCustomerProfile against canned gateway responses"""
+
+    def setUp(self):
+        self.customer = Customer(authorizenet_customer_profile_id=1500000001)
+        self.posted = []
+
+    def run_async(self, method, *args, response=None):
+        """Await a method of a new AsyncCustomerProfile, with the gateway
+        answering response, and return it along with the result"""
+
+        async def post(transport, post_url, data):
+            self.posted.append(data)
+            return response
+
+        async def call():
+            cp = AsyncCustomerProfile(self.customer)
+            return cp, await getattr(cp, method)(*args)
+
+        with mock.patch.object(AsyncTransport, 'post', post):
+            return async_to_sync(call)()
+
+    def test_get_customer_profile(self):
+        cp, _ = self.run_async(
+            'get_customer_profile', response=GET_CUSTOMER_PROFILE)
+
+        self.assertEqual(
+            [int(pp) for pp in cp.payment_profiles_dict], [1600000001])
+        self.assertIsNotNone(cp.customer_profile)
+        self.assertEqual(len(self.posted), 1)
+        self.assertIn(b'<customerProfileId>1500000001', self.posted[0])
+
+    @override_settings(AUTHORIZE_NET_PROFILE_CACHE='default')
+    def test_profile_cache(self):
+        """Reads go through the profile cache, like CustomerProfile's"""
+
+        get_profile_cache().invalidate(1500000001)
+
+        for _ in range(3):
+            cp, _ = self.run_async(
+                'get_customer_profile', response=GET_CUSTOMER_PROFILE)
+
+            self.assertEqual(
+                [int(pp) for pp in cp.payment_profiles_dict], [1600000001])
+
+        # read from the cache, not the gateway
+        self.assertIsNone(cp.customer_profile)
+        self.assertEqual(len(self.posted), 1)
+
+        # the sync and async paths share entries
+        with mock.patch.object(PooledTransport, 'post') as post:
+            CustomerProfile(self.customer).get_customer_profile()
+            post.assert_not_called()
+
+        get_profile_cache().invalidate(1500000001)
+        self.run_async('get_customer_profile', response=GET_CUSTOMER_PROFILE)
+        self.assertEqual(len(self.posted), 2)
+
+    def test_no_profile_id(self):
+        self.customer.authorizenet_customer_profile_id = None
+
+        with self.assertRaises(AuthorizeNetError):
+            self.run_async('get_customer_profile')
+
+        with self.settings(AUTHORIZE_NET_PROFILE_CACHE='default'):
+            with self.assertRaises(AuthorizeNetError):
+                self.run_async('get_customer_profile')
+
+        self.assertEqual(self.posted, [])
+
+    def test_charge(self):
+        _, transaction = self.run_async(
+            'charge_customer_profile', '1600000001', '12.34', 'A1', 'A1',
+            response=CREATE_TRANSACTION)
+
+        self.assertEqual(transaction.result, Transaction.APPROVED)
+        self.assertIn(b'<amount>12.34</amount>', self.posted[0])
+
+
+@override_settings(AUTHORIZE_NET_IDEMPOTENT_CHARGES='invoice_number')
+class TestAsyncIdempotentCharges(TransactionTestCase):
+    """The async charge is claimed like CustomerProfile's"""
+
+    run_async = TestAsyncCustomerProfile.run_async
+
+    def setUp(self):
+        self.customer = Customer(authorizenet_customer_profile_id=1500000001)
+        self.posted = []
+
+    def test_charge_once(self):
+        for ref_id in ('A1', 'A2'):
+            _, transaction = self.run_async(
+                'charge_customer_profile', '1600000001', '12.34', ref_id,
+                'Invoice #1', response=CREATE_TRANSACTION)
+
+            self.assertEqual(transaction.result, Transaction.APPROVED)
+
+        self.assertEqual(len(self.posted), 1)
+        self.assertEqual(
+            IdempotentCharge.objects.get().status, IdempotentCharge.COMPLETE)
+
+    def test_unknown(self):
+        """A charge that got no response keeps its claim"""
+
+        self.run_async(
+            'charge_customer_profile', '1600000001', '12.34', 'A1',
+            'Invoice #1')
+
+        self.assertEqual(
+            IdempotentCharge.objects.get().status, IdempotentCharge.UNKNOWN)
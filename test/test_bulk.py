@@ -0,0 +1,224 @@
+from decimal import Decimal
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase
+from payment_authorizenet.bulk import BulkCharge, BulkCreateProfiles
+from payment_authorizenet.customer_profile import CustomerProfile
+from payment_authorizenet.merchant_auth import AuthorizeNetError
+from payment_authorizenet.test.helpers import FakeGatewayTestCase, Practice
+from payment_authorizenet.transaction import Transaction
+from types import SimpleNamespace
+from unittest import mock
+
+
+
+class FakeCustomerProfile:
+    """Stands in for CustomerProfile, approving every charge but those of
+    9.99, which raise"""
+
+    charges = []
+
+    def __init__(self, instance):
+        self.instance = instance
+
+    def charge_customer_profile(
+            self, paymentProfileId, amount, ref_id, invoice_number):
+        if Decimal(amount) == Decimal('9.99'):
+            raise RuntimeError('connection reset')
+
+        self.charges.append((self.instance, paymentProfileId, amount))
+        return SimpleNamespace(result=Transaction.APPROVED)
+
+
+@mock.patch('payment_authorizenet.bulk.CustomerProfile', FakeCustomerProfile)
+class TestBulkCharge(TestCase):
+
+    def setUp(self):
+        FakeCustomerProfile.charges = []
+
+    def test_charge(self):
+        rows = [
+            ('customer', '1600000001', '1.{:02}'.format(number), str(number))
+            for number in range(5)]
+
+        run = BulkCharge(rows, workers=2)
+        results = list(run)
+
+        self.assertEqual(
+            sorted(result.invoice_number for result in results),
+            ['0', '1', '2', '3', '4'])
+        self.assertEqual(
+            set(result.transaction.result for result in results),
+            {Transaction.APPROVED})
+        self.assertEqual(run.summary.count, 5)
+        self.assertEqual(run.summary.approved, 5)
+        self.assertEqual(len(FakeCustomerProfile.charges), 5)
+
+    def test_close_connections(self):
+        """Each worker closes its database connections after its row"""
+
+        rows = [
+            ('customer', '1600000001', '1.00', str(number))
+            for number in range(3)]
+
+        with mock.patch('payment_authorizenet.bulk.connections') as conns:
+            list(BulkCharge(rows, workers=2))
+
+        self.assertEqual(conns.close_all.call_count, 3)
+
+    def test_values(self):
+        """Model instances are charged through values"""
+
+        content_type = ContentType.objects.get_for_model(ContentType)
+
+        def values(instance):
+            return '1600000001', '2.00', 'INV{}'.format(instance.pk)
+
+        run = BulkCharge(
+            ContentType.objects.filter(pk=content_type.pk), values=values)
+        [result] = list(run)
+
+        self.assertEqual(result.instance, content_type)
+        self.assertEqual(result.amount, '2.00')
+        self.assertEqual(result.transaction.result, Transaction.APPROVED)
+
+    def test_queryset_without_values(self):
+        with self.assertRaises(ValueError):
+            BulkCharge(ContentType.objects.all())
+
+    def test_errors(self):
+        """Rows that raise or aren't (instance, paymentProfileId, amount,
+        invoice_number) are reported and the run goes on"""
+
+        rows = [
+            ('customer', '1600000001', Decimal('1.00'), 'ok'),
+            ('customer', '1600000001', Decimal('9.99'), 'boom'),
+            'customer',
+        ]
+
+        run = BulkCharge(rows, workers=2)
+        results = list(run)
+
+        errors = dict(
+            (result.invoice_number, type(result.error))
+            for result in results if result.error is not None)
+
+        self.assertEqual(errors, {'boom': RuntimeError, None: ValueError})
+        self.assertEqual(run.summary.count, 3)
+        self.assertEqual(run.summary.approved, 1)
+        self.assertEqual(run.summary.errors, 2)
+
+
+
+def email(practice):
+    return 'practice{}@test.com'.format(practice.pk)
+
+
+class TestBulkCreateProfiles(FakeGatewayTestCase):
+
+    def setUp(self):
+        super().setUp()
+        ContentType.objects.clear_cache()
+
+        for number in range(6):
+            Practice.objects.create(name='Practice {}'.format(number))
+
+    def profile_ids(self):
+        return list(Practice.objects.order_by('pk').values_list(
+            'authorizenet_customer_profile_id', flat=True))
+
+    def test_create(self):
+        run = BulkCreateProfiles(
+            Practice.objects.all(), email, workers=2, batch_size=2)
+        results = list(run)
+
+        self.assertEqual(len(results), 7)
+        self.assertEqual(run.summary.created, 7)
+        self.assertEqual(run.summary.saved, 7)
+        self.assertNotIn(None, self.profile_ids())
+        self.assertEqual(len(set(self.profile_ids())), 7)
+        self.assertEqual(self.gateway.requests['createCustomerProfile'], 7)
+
+        # every row has a profile now, so a second run has nothing to do
+        self.assertEqual(list(BulkCreateProfiles(
+            Practice.objects.all(), email)), [])
+
+    def test_existing(self):
+        """A profile created without being written back is found again"""
+
+        cp = CustomerProfile(self.practice)
+        response = cp.execute(cp._create_customer_profile_controller(
+            email(self.practice)))
+        profile_id = int(response.customerProfileId)
+
+        run = BulkCreateProfiles(Practice.objects.all(), email, workers=2)
+        list(run)
+
+        self.practice.refresh_from_db()
+        self.assertEqual(
+            self.practice.authorizenet_customer_profile_id, profile_id)
+        self.assertEqual(run.summary.existing, 1)
+        self.assertEqual(run.summary.created, 6)
+
+    def test_errors(self):
+        execute = CustomerProfile.execute
+
+        def fail_first(cp, controller):
+            if cp.instance.pk == self.practice.pk:
+                raise AuthorizeNetError('E00001')
+            return execute(cp, controller)
+
+        with mock.patch.object(CustomerProfile, 'execute', fail_first):
+            run = BulkCreateProfiles(Practice.objects.all(), email)
+            errors = [result for result in run if result.error is not None]
+
+        self.assertEqual([result.instance for result in errors],
+                         [self.practice])
+        self.assertEqual(run.summary.errors, 1)
+        self.assertEqual(self.profile_ids().count(None), 1)
+
+        # running again retries the row that failed
+        run = BulkCreateProfiles(Practice.objects.all(), email)
+        list(run)
+
+        self.assertEqual(run.summary.created, 1)
+        self.assertNotIn(None, self.profile_ids())
+
+    def test_bad_email(self):
+        """A row the SDK can't build a request for fails on its own"""
+
+        def long_email(practice):
+            if practice.pk == self.practice.pk:
+                return 'x' * 250 + '@test.com'
+            return email(practice)
+
+        run = BulkCreateProfiles(Practice.objects.all(), long_email)
+        errors = [result for result in run if result.error is not None]
+
+        self.assertEqual([result.instance for result in errors],
+                         [self.practice])
+        self.assertEqual(run.summary.created, 6)
+        self.assertEqual(self.profile_ids().count(None), 1)
+
+    def test_interrupted(self):
+        """Ids of the rows that finished are kept when iteration stops"""
+
+        run = BulkCreateProfiles(
+            Practice.objects.all(), email, workers=1, batch_size=100)
+
+        for result in run:
+            break
+
+        saved = run.summary.saved
+        self.assertGreaterEqual(saved, 1)
+        self.assertEqual(self.profile_ids().count(None), 7 - saved)
+
+        run = BulkCreateProfiles(Practice.objects.all(), email, workers=1)
+        list(run)
+
+        self.assertEqual(run.summary.count, 7 - saved)
+        self.assertEqual(run.summary.existing, 0)
+        self.assertNotIn(None, self.profile_ids())
+
+    def test_model_without_profile_id(self):
+        with self.assertRaises(ValueError):
+            BulkCreateProfiles(ContentType.objects.all(), email)
@@ -0,0 +1,138 @@
+from django.core.management import call_command
+from io import StringIO
+from payment_authorizenet import charge_queue
+from payment_authorizenet.customer_profile import CustomerProfile
+from payment_authorizenet.models import ChargeJob
+from payment_authorizenet.signals import charge_job_finished
+from payment_authorizenet.test.helpers import (
+    FakeGatewayTestCase,
+    FakeGatewayTransactionTestCase)
+from unittest import mock
+import threading
+
+
+class TestChargeQueue(FakeGatewayTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.card, _ = self.create_profiles(CustomerProfile(self.practice))
+
+    def enqueue(self, number, payment_profile_id=None):
+        return charge_queue.enqueue(
+            self.practice, payment_profile_id or self.card, '2.99', number,
+            number)
+
+    def test_claim(self):
+        """A claimed job is not handed to another worker"""
+
+        first = self.enqueue('1')
+        second = self.enqueue('2')
+
+        self.assertEqual(charge_queue.claim(1), [first])
+        self.assertEqual(charge_queue.claim(5), [second])
+        self.assertEqual(charge_queue.claim(5), [])
+        self.assertEqual(
+            ChargeJob.objects.filter(status=ChargeJob.RUNNING).count(), 2)
+
+    def test_worker(self):
+        finished = []
+
+        def receiver(job, **kwargs):
+            finished.append(job.pk)
+
+        charge_job_finished.connect(receiver)
+        self.addCleanup(charge_job_finished.disconnect, receiver)
+
+        approved = self.enqueue('1')
+        failed = self.enqueue('2', payment_profile_id='1')
+
+        out = StringIO()
+        call_command(
+            'run_charge_worker', '--once', '--concurrency', '1', stdout=out)
+        self.assertIn('Ran 2 charges', out.getvalue())
+
+        approved.refresh_from_db()
+        self.assertEqual(approved.status, ChargeJob.COMPLETE)
+        self.assertEqual(approved.transaction.result,
+                         approved.transaction.APPROVED)
+        self.assertEqual(
+            self.gateway.transactions[
+                approved.transaction.transaction_response.transaction_id][
+                'invoiceNumber'], '1')
+
+        failed.refresh_from_db()
+        self.assertEqual(failed.status, ChargeJob.FAILED)
+        self.assertTrue(failed.error)
+        self.assertIsNone(failed.transaction)
+
+        self.assertEqual(finished, [approved.pk, failed.pk])
+
+    def test_bad_amount(self):
+        """A job the SDK can't build a request for fails, and the worker
+        goes on to the next job"""
+
+        with self.assertRaises(ValueError):
+            charge_queue.enqueue(self.practice, self.card, 'abc', '1', '1')
+
+        bad = ChargeJob.objects.create(
+            instance=self.practice,
+            payment_profile_id=str(self.card), amount='abc')
+        good = self.enqueue('2')
+
+        with self.assertLogs('payment_authorizenet.charge_queue', 'ERROR'):
+            charge_queue.Worker(1).run(once=True)
+
+        bad.refresh_from_db()
+        good.refresh_from_db()
+
+        self.assertEqual(bad.status, ChargeJob.FAILED)
+        self.assertTrue(bad.error)
+        self.assertEqual(good.status, ChargeJob.COMPLETE)
+        self.assertEqual(self.gateway.requests['createTransaction'], 1)
+
+
+class TestThreadedWorker(FakeGatewayTransactionTestCase):
+    """The default worker runs jobs on a pool of threads, each with a
+    database connection of its own"""
+
+    def setUp(self):
+        super().setUp()
+        self.card, _ = self.create_profiles(CustomerProfile(self.practice))
+
+    def test_worker(self):
+        jobs = [
+            charge_queue.enqueue(
+                self.practice, self.card, '2.99', str(number), str(number))
+            for number in range(6)]
+        bad = ChargeJob.objects.create(
+            instance=self.practice,
+            payment_profile_id=str(self.card), amount='abc')
+
+        out = StringIO()
+
+        # the in-memory SQLite test database locks whole tables, so the
+        # worker's database calls take turns here
+        lock = threading.RLock()
+
+        def serialized(function):
+            def call(*args):
+                with lock:
+                    return function(*args)
+            return call
+
+        with mock.patch.object(
+                charge_queue, 'claim', serialized(charge_queue.claim)), \
+                mock.patch.object(
+                    charge_queue, 'run', serialized(charge_queue.run)), \
+                self.assertLogs('payment_authorizenet.charge_queue', 'ERROR'):
+            call_command('run_charge_worker', '--once', stdout=out)
+
+        self.assertIn('Ran 7 charges', out.getvalue())
+
+        for job in jobs:
+            job.refresh_from_db()
+            self.assertEqual(job.status, ChargeJob.COMPLETE)
+
+        bad.refresh_from_db()
+        self.assertEqual(bad.status, ChargeJob.FAILED)
+        self.assertEqual(self.gateway.requests['createTransaction'], 6)
@@ -6,6 +6,7 @@ from payment_authorizenet.enums import (
     AccountType,
     CustomerType,
     ValidationMode)
+from payment_authorizenet.fake_gateway import FakeGateway
 
 
 class TestAuthorizeNetCustomerProfile(TestCase):
@@ -16,6 +17,22 @@ class TestAuthorizeNetCustomerProfile(TestCase):
     FOUND = 302
     NOT_FOUND = 404
 
+    @classmethod
+    def setUpClass(cls):
+        # run against an in-memory gateway instead of the sandbox
+        cls.gateway = FakeGateway()
+        cls.gateway_settings = cls.gateway.settings()
+        cls.gateway_settings.enable()
+
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+
+        cls.gateway_settings.disable()
+        cls.gateway.stop()
+
     @classmethod
     def setUpTestData(cls):
         cls.ps = PracticeAndRelatedInstances()
@@ -0,0 +1,295 @@
+from django.test import override_settings
+from django.utils import timezone
+from payment_authorizenet import idempotency
+from payment_authorizenet.customer_profile import (
+    CustomerProfile,
+    get_customer_profile_ids)
+from payment_authorizenet.enums import PaymentProfileType
+from payment_authorizenet.merchant_auth import AuthNet, AuthorizeNetError
+from payment_authorizenet.models import IdempotentCharge
+from payment_authorizenet.test.helpers import FakeGatewayTestCase, Practice
+from unittest import mock
+
+
+class TestFakeGateway(FakeGatewayTestCase):
+
+    def test_post_url(self):
+        """AUTHORIZE_NET_POST_URL points AuthNet at the fake gateway"""
+        self.assertEqual(AuthNet().post_url, self.gateway.url)
+
+    def test_customer_profile(self):
+        """Profiles are kept by the gateway between calls"""
+
+        cp = CustomerProfile(self.practice)
+        card, bank = self.create_profiles(cp)
+
+        self.practice.refresh_from_db()
+        self.assertEqual(
+            self.practice.authorizenet_customer_profile_id, 1500000001)
+        self.assertEqual(card, 1600000001)
+        self.assertEqual(
+            self.practice.authorizenet_default_payment_profile_id, card)
+
+        cp.get_customer_profile()
+        card_profile, bank_profile = cp.payment_profiles
+
+        self.assertEqual(str(card_profile), '1600000001: Visa XXXX1111')
+        self.assertEqual(bank_profile.payment.payment_type,
+                         PaymentProfileType.bankAccount)
+        self.assertEqual(bank_profile.payment.entity, 'Frost Bank')
+
+        transaction = cp.charge_customer_profile(
+            str(card), '2.99', 'ref-1', 'Invoice #1')
+        self.assertEqual(transaction.result, transaction.APPROVED)
+        self.assertEqual(
+            self.gateway.transactions['60000001']['invoiceNumber'],
+            'Invoice #1')
+
+        self.assertTrue(cp.delete_customer_payment_profile('1600000002'))
+        cp.get_customer_profile()
+        self.assertEqual(len(cp.payment_profiles), 1)
+
+        self.assertTrue(cp.delete_customer_profile())
+        self.assertEqual(self.gateway.customer_profiles, {})
+
+    def test_duplicate_customer_profile(self):
+        """A second profile for the same model reuses the first one"""
+
+        CustomerProfile(self.practice).create_customer_profile('a@test.com')
+
+        other = Practice(pk=self.practice.pk, name=self.practice.name)
+        CustomerProfile(other).create_customer_profile('a@test.com')
+
+        self.assertEqual(other.authorizenet_customer_profile_id, 1500000001)
+        self.assertEqual(len(self.gateway.customer_profiles), 1)
+
+    def test_logging(self):
+        """Operations are logged with ids only, never contact details"""
+
+        cp = CustomerProfile(self.practice)
+
+        with self.assertLogs('payment_authorizenet', 'DEBUG') as logs:
+            self.create_profiles(cp)
+
+        output = '\n'.join(logs.output)
+        self.assertIn('Created payment profile 1600000001', output)
+        self.assertNotIn('Overton', output)
+        self.assertNotIn('Sesame', output)
+        self.assertEqual(logs.records[0].operation, 'create_customer_profile')
+        self.assertEqual(logs.records[0].customer_profile_id, 1500000001)
+
+    def test_customer_profile_ids(self):
+        self.assertEqual(get_customer_profile_ids(), [])
+
+        cp = CustomerProfile(self.practice)
+        cp.create_customer_profile('test@test.com')
+
+        self.assertEqual(
+            get_customer_profile_ids(),
+            [self.practice.authorizenet_customer_profile_id])
+
+    def test_missing_profile(self):
+        self.practice.authorizenet_customer_profile_id = 1
+        with self.assertRaises(AuthorizeNetError):
+            CustomerProfile(self.practice).get_customer_profile()
+
+
+class TestFakeGatewayDeclines(FakeGatewayTestCase):
+
+    gateway_options = {'decline_rate': 1, 'decline_codes': ['27']}
+
+    def test_decline(self):
+        cp = CustomerProfile(self.practice)
+        card, _ = self.create_profiles(cp)
+
+        transaction = cp.charge_customer_profile(
+            str(card), '2.99', 'ref-1', 'Invoice #1')
+
+        self.assertEqual(transaction.result, transaction.FAILURE)
+        self.assertEqual(
+            transaction.transaction_response.errors[0].error_code, '27')
+
+
+@override_settings(AUTHORIZE_NET_IDEMPOTENT_CHARGES='invoice_number')
+class TestIdempotentCharges(FakeGatewayTestCase):
+
+    def test_repeat(self):
+        """Repeating a charge returns the first Transaction"""
+
+        cp = CustomerProfile(self.practice)
+        card, _ = self.create_profiles(cp)
+
+        first = cp.charge_customer_profile(
+            str(card), '2.99', 'ref-1', 'Invoice #1')
+        repeat = cp.charge_customer_profile(
+            str(card), '2.99', 'ref-2', 'Invoice #1')
+
+        self.assertEqual(self.gateway.requests['createTransaction'], 1)
+        self.assertEqual(repeat.result, first.result)
+        self.assertEqual(repeat.transaction_response,
+                         first.transaction_response)
+
+        # the same amount, written another way
+        cp.charge_customer_profile(str(card), '2.990', 'ref-3', 'Invoice #1')
+        self.assertEqual(self.gateway.requests['createTransaction'], 1)
+
+        with self.assertRaises(ValueError):
+            cp.charge_customer_profile(
+                str(card), '3.99', 'ref-3', 'Invoice #1')
+
+        cp.charge_customer_profile(str(card), '2.99', 'ref-4', 'Invoice #2')
+        self.assertEqual(self.gateway.requests['createTransaction'], 2)
+
+    def test_in_flight(self):
+        """A charge that is still in flight is not charged again"""
+
+        cp = CustomerProfile(self.practice)
+        card, _ = self.create_profiles(cp)
+
+        key = idempotency.charge_key(
+            self.practice.authorizenet_customer_profile_id, 'ref-1',
+            'Invoice #1')
+        idempotency.claim(key, card, '2.99')
+
+        with self.assertRaises(AuthorizeNetError):
+            idempotency.claim(key, card, '2.99', wait=0)
+
+        self.assertEqual(self.gateway.requests['createTransaction'], 0)
+
+    def test_wait(self):
+        """A charge made while the first is in flight gets its result"""
+
+        cp = CustomerProfile(self.practice)
+        card, _ = self.create_profiles(cp)
+
+        key = idempotency.charge_key(
+            self.practice.authorizenet_customer_profile_id, 'ref-1',
+            'Invoice #1')
+        idempotency.claim(key, card, '2.99')
+
+        first = cp._charge_customer_profile(
+            str(card), '2.99', 'ref-1', 'Invoice #1')
+
+        # the first call finishes while the second is waiting
+        with mock.patch.object(
+                idempotency.time, 'sleep',
+                lambda seconds: idempotency.finish(key, first)):
+            repeat = cp.charge_customer_profile(
+                str(card), '2.99', 'ref-2', 'Invoice #1')
+
+        self.assertEqual(self.gateway.requests['createTransaction'], 1)
+        self.assertEqual(repeat.transaction_response,
+                         first.transaction_response)
+
+    def test_decline(self):
+        """A declined invoice can be charged again"""
+
+        cp = CustomerProfile(self.practice)
+        card, bank = self.create_profiles(cp)
+
+        self.gateway.decline_rate = 1
+        self.addCleanup(setattr, self.gateway, 'decline_rate', 0)
+
+        declined = cp.charge_customer_profile(
+            str(card), '2.99', 'ref-1', 'Invoice #1')
+        self.assertEqual(declined.result, declined.FAILURE)
+
+        self.gateway.decline_rate = 0
+
+        approved = cp.charge_customer_profile(
+            str(bank), '2.99', 'ref-2', 'Invoice #1')
+        self.assertEqual(approved.result, approved.APPROVED)
+        self.assertEqual(self.gateway.requests['createTransaction'], 2)
+
+    def test_wait_capped(self):
+        """A long AUTHORIZE_NET_IDEMPOTENCY_WAIT is cut to MAX_WAIT"""
+
+        cp = CustomerProfile(self.practice)
+        card, _ = self.create_profiles(cp)
+
+        key = idempotency.charge_key(
+            self.practice.authorizenet_customer_profile_id, 'ref-1',
+            'Invoice #1')
+        idempotency.claim(key, card, '2.99')
+
+        clock = [0]
+
+        def sleep(seconds):
+            clock[0] += 1
+
+        with override_settings(AUTHORIZE_NET_IDEMPOTENCY_WAIT=600), \
+                mock.patch.object(
+                    idempotency.time, 'monotonic', lambda: clock[0]), \
+                mock.patch.object(idempotency.time, 'sleep', sleep):
+            with self.assertRaises(AuthorizeNetError):
+                idempotency.claim(key, card, '2.99')
+
+        self.assertEqual(clock[0], idempotency.MAX_WAIT)
+
+    def test_unknown(self):
+        """A charge that raised after reaching the gateway is looked up
+        instead of being charged again"""
+
+        cp = CustomerProfile(self.practice)
+        card, _ = self.create_profiles(cp)
+        execute = CustomerProfile.execute
+
+        def timeout(self, controller):
+            execute(self, controller)
+            raise AuthorizeNetError('Read timed out')
+
+        with mock.patch.object(CustomerProfile, 'execute', timeout):
+            with self.assertRaises(AuthorizeNetError):
+                cp.charge_customer_profile(
+                    str(card), '2.99', 'ref-1', 'Invoice #1')
+
+        self.assertEqual(
+            IdempotentCharge.objects.get().status, IdempotentCharge.UNKNOWN)
+
+        repeat = cp.charge_customer_profile(
+            str(card), '2.99', 'ref-2', 'Invoice #1')
+
+        self.assertEqual(self.gateway.requests['createTransaction'], 1)
+        self.assertEqual(repeat.result, repeat.APPROVED)
+        self.assertEqual(
+            repeat.transaction_response.transaction_id, '60000001')
+        self.assertEqual(
+            IdempotentCharge.objects.get().status, IdempotentCharge.COMPLETE)
+
+    def test_unknown_not_charged(self):
+        """A charge that raised before reaching the gateway is charged"""
+
+        cp = CustomerProfile(self.practice)
+        card, _ = self.create_profiles(cp)
+
+        with mock.patch.object(
+                CustomerProfile, 'execute',
+                side_effect=AuthorizeNetError('Connection refused')):
+            with self.assertRaises(AuthorizeNetError):
+                cp.charge_customer_profile(
+                    str(card), '2.99', 'ref-1', 'Invoice #1')
+
+        cp.charge_customer_profile(str(card), '2.99', 'ref-2', 'Invoice #1')
+
+        self.assertEqual(self.gateway.requests['createTransaction'], 1)
+        self.assertEqual(
+            IdempotentCharge.objects.get().status, IdempotentCharge.COMPLETE)
+
+    def test_expired_lease(self):
+        """A claim left behind by a process that died expires"""
+
+        cp = CustomerProfile(self.practice)
+        card, _ = self.create_profiles(cp)
+
+        key = idempotency.charge_key(
+            self.practice.authorizenet_customer_profile_id, 'ref-1',
+            'Invoice #1')
+        idempotency.claim(key, card, '2.99')
+        IdempotentCharge.objects.update(lease_expires=timezone.now())
+
+        with mock.patch.object(idempotency.time, 'sleep') as sleep:
+            cp.charge_customer_profile(
+                str(card), '2.99', 'ref-2', 'Invoice #1')
+
+        sleep.assert_not_called()
+        self.assertEqual(self.gateway.requests['createTransaction'], 1)
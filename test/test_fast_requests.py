@@ -0,0 +1,89 @@
+from decimal import Decimal
+from django.test import SimpleTestCase, override_settings
+from payment_authorizenet import fast_requests
+from payment_authorizenet.customer_profile import CustomerProfile
+from payment_authorizenet.test.helpers import FakeGatewayTestCase, Practice
+
+
+def serialize(controller):
+    controller.setClientId()
+    return controller.buildrequest()
+
+
+class TestFastRequests(SimpleTestCase):
+    """The templates render the same bytes as pyxb"""
+
+    def setUp(self):
+        self.cp = CustomerProfile(
+            Practice(pk=1, authorizenet_customer_profile_id=1500000001))
+
+    def pyxb_charge(self, *args):
+        with self.settings(AUTHORIZE_NET_FAST_REQUESTS=False):
+            return serialize(
+                self.cp._charge_customer_profile_controller(*args))
+
+    def fast_charge(self, *args):
+        return fast_requests.charge_customer_profile_controller(
+            self.cp.merchantAuth,
+            self.cp.instance.authorizenet_customer_profile_id, *args)
+
+    def test_charge(self):
+        for args in [
+            ('1600000001', '2.99', 'ref-1', 'Invoice #1'),
+            ('1600000001', '2.90', 1, 2),
+            ('1600000001', 10, 'a&b<c>"d\'', 'R&D <"x">'),
+            ('1600000001', Decimal('0.50'), 'ref', 'café'),
+            ('1600000001', 1.5, '', ' padded '),
+            ('1600000001', ' 4.00', 'ref', '12345678901234567890'),
+            ('1600000001', '1e3', 'ref', 'Invoice #1'),
+        ]:
+            with self.subTest(args=args):
+                controller = self.fast_charge(*args)
+
+                self.assertIsNotNone(controller)
+                self.assertEqual(
+                    serialize(controller), self.pyxb_charge(*args))
+
+    def test_charge_fallback(self):
+        """Values the templates can't render exactly are left to pyxb"""
+
+        for args in [
+            ('1600000001', 'NaN', 'ref', 'Invoice #1'),
+            ('1600000001', 'two', 'ref', 'Invoice #1'),
+            ('1600000001', '2.99', 'ref', '123456789012345678901'),
+            ('1600000001', '2.99', 'ref', 'tab\tinvoice'),
+            ('pp-1', '2.99', 'ref', 'Invoice #1'),
+            (1600000001, '2.99', 'ref', 'Invoice #1'),
+        ]:
+            with self.subTest(args=args):
+                self.assertIsNone(self.fast_charge(*args))
+
+    def test_get_customer_profile(self):
+        controller = fast_requests.get_customer_profile_controller(
+            self.cp.merchantAuth, 1500000001)
+
+        self.assertEqual(
+            serialize(controller),
+            serialize(self.cp._get_customer_profile_controller()))
+        self.assertEqual(type(controller).__name__,
+                         'getCustomerProfileController')
+
+
+@override_settings(AUTHORIZE_NET_FAST_REQUESTS=True)
+class TestFastRequestsGateway(FakeGatewayTestCase):
+
+    def test_charge(self):
+        cp = CustomerProfile(self.practice)
+        card, _ = self.create_profiles(cp)
+
+        transaction = cp.charge_customer_profile(
+            str(card), '2.99', 'ref-1', 'R&D <1>')
+        cp.get_customer_profile()
+
+        self.assertEqual(transaction.result, transaction.APPROVED)
+        self.assertEqual(
+            self.gateway.transactions['60000001']['invoiceNumber'],
+            'R&D <1>')
+        self.assertEqual(len(cp.payment_profiles), 2)
+        self.assertEqual(self.gateway.requests['createTransaction'], 1)
+        self.assertEqual(self.gateway.requests['getCustomerProfile'], 1)
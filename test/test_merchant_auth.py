@@ -0,0 +1,43 @@
+from django.test import TestCase, override_settings
+from payment_authorizenet.checks import check_gateway_settings
+from payment_authorizenet.enums import ServerMode
+from payment_authorizenet.merchant_auth import (
+    PRODUCTION,
+    SANDBOX,
+    AuthNet,
+    AuthorizeNetError,
+    GatewayConfig,
+    get_gateway_config)
+
+
+class TestGatewayConfig(TestCase):
+    """Test the process-wide gateway configuration in merchant_auth.py"""
+
+    def test_shared(self):
+        """Every AuthNet shares one GatewayConfig"""
+
+        self.assertIs(AuthNet().gateway_config, AuthNet().gateway_config)
+        self.assertIs(AuthNet().merchantAuth, get_gateway_config().merchantAuth)
+
+    def test_setting_changed(self):
+        """The config is rebuilt when its settings change"""
+
+        with override_settings(SERVER_MODE=ServerMode.production.value):
+            self.assertEqual(AuthNet().post_url, PRODUCTION)
+
+        with override_settings(SERVER_MODE=ServerMode.development.value):
+            self.assertEqual(AuthNet().post_url, SANDBOX)
+
+    def test_missing_settings(self):
+        """Missing credentials fail the system check and GatewayConfig"""
+
+        with self.settings():
+            from django.conf import settings
+            del settings.AUTHORIZE_NET_TRANSACTION_KEY
+
+            errors = check_gateway_settings(None)
+            self.assertEqual(
+                [e.id for e in errors], ['payment_authorizenet.E001'])
+
+            with self.assertRaises(AuthorizeNetError):
+                GatewayConfig()
@@ -0,0 +1,121 @@
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from payment_authorizenet import metrics, metrics_urls, urls, views
+from payment_authorizenet.customer_profile import (
+    fetch_customer_profile,
+    get_customer_profile_ids)
+from payment_authorizenet.fake_gateway import FakeGateway
+from payment_authorizenet.merchant_auth import AuthorizeNetError
+from payment_authorizenet.signals import (
+    gateway_call_finished,
+    gateway_call_started)
+from unittest import mock
+
+
+class TestInMemorySink(SimpleTestCase):
+    """Test the default metrics sink"""
+
+    def test_observe(self):
+        sink = metrics.InMemorySink(buckets=(0.1, 1))
+
+        sink.observe('createTransaction', 'Development', 'Ok', '', 0.05)
+        sink.observe('createTransaction', 'Development', 'Ok', '', 0.5)
+        sink.observe('createTransaction', 'Development', 'Error', 'E00027',
+                     2)
+
+        self.assertEqual(sink.count('createTransaction'), 3)
+        self.assertEqual(sink.count(error_code='E00027'), 1)
+        self.assertEqual(sink.quantile(0.5, 'createTransaction'), 0.55)
+        self.assertEqual(sink.quantile(0.99), 1)
+        self.assertIsNone(sink.quantile(0.99, 'getCustomerProfile'))
+
+        text = sink.render()
+        self.assertIn(
+            'authorizenet_calls_total{error_code="E00027",'
+            'operation="createTransaction",result_code="Error",'
+            'server_mode="Development"} 1', text)
+        self.assertIn(
+            'authorizenet_call_duration_seconds_bucket{'
+            'operation="createTransaction",result_code="Ok",'
+            'server_mode="Development",le="+Inf"} 2', text)
+
+
+@override_settings(
+    AUTHORIZE_NET_METRICS_SINK='payment_authorizenet.metrics.InMemorySink')
+class TestGatewayMetrics(SimpleTestCase):
+    """Every call through AuthNet.execute() is measured"""
+
+    def test_execute(self):
+        started = []
+        finished = []
+
+        def on_started(**kwargs):
+            started.append(kwargs['operation'])
+
+        def on_finished(**kwargs):
+            finished.append((kwargs['operation'], kwargs['result_code'],
+                             kwargs['error_code']))
+
+        gateway_call_started.connect(on_started)
+        gateway_call_finished.connect(on_finished)
+        self.addCleanup(gateway_call_started.disconnect, on_started)
+        self.addCleanup(gateway_call_finished.disconnect, on_finished)
+
+        with FakeGateway() as gateway, gateway.settings():
+            self.assertEqual(get_customer_profile_ids(), [])
+
+            with self.assertRaises(AuthorizeNetError):
+                fetch_customer_profile(1)
+
+        self.assertEqual(
+            started, ['getCustomerProfileIds', 'getCustomerProfile'])
+        self.assertEqual(finished, [
+            ('getCustomerProfileIds', 'Ok', ''),
+            ('getCustomerProfile', 'Error', 'E00040')])
+
+        sink = metrics.get_metrics_sink()
+        self.assertEqual(sink.count(), 2)
+
+        with self.settings(AUTHORIZE_NET_METRICS_TOKEN='secret'):
+            response = views.metrics(RequestFactory().get(
+                '/metrics/', HTTP_AUTHORIZATION='Bearer secret'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'error_code="E00040"', response.content)
+
+
+class TestMetricsView(SimpleTestCase):
+    """Only staff users and the metrics token can read the metrics"""
+
+    def get(self, user=None, **headers):
+        request = RequestFactory().get('/metrics/', **headers)
+
+        if user is not None:
+            request.user = user
+
+        return views.metrics(request).status_code
+
+    @override_settings(AUTHORIZE_NET_METRICS_TOKEN='secret')
+    def test_token(self):
+        self.assertEqual(self.get(HTTP_AUTHORIZATION='Bearer secret'), 200)
+        self.assertEqual(self.get(HTTP_AUTHORIZATION='Bearer wrong'), 403)
+        self.assertEqual(self.get(HTTP_AUTHORIZATION='Basic secret'), 403)
+        self.assertEqual(self.get(), 403)
+
+    def test_no_token(self):
+        self.assertEqual(self.get(HTTP_AUTHORIZATION='Bearer '), 403)
+
+    def test_staff(self):
+        staff = mock.Mock(is_active=True, is_staff=True)
+        customer = mock.Mock(is_active=True, is_staff=False)
+
+        self.assertEqual(self.get(staff), 200)
+        self.assertEqual(self.get(customer), 403)
+
+    def test_public_urls(self):
+        """The public urlconf doesn't serve the metrics"""
+
+        self.assertEqual(
+            [pattern.name for pattern in urls.urlpatterns], ['webhook'])
+        self.assertEqual(
+            [pattern.name for pattern in metrics_urls.urlpatterns],
+            ['metrics'])
@@ -0,0 +1,128 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from lxml import objectify
+from payment_authorizenet import mirror
+from payment_authorizenet.customer_profile import CustomerProfile
+from payment_authorizenet.models import (
+    CustomerProfileMirror,
+    PaymentProfileMirror)
+
+PROFILE_XML = b'''
+<profile>
+  <merchantCustomerId>42</merchantCustomerId>
+  <email>test@test.com</email>
+  <customerProfileId>1500000001</customerProfileId>
+  <paymentProfiles>
+    <customerPaymentProfileId>1600000001</customerPaymentProfileId>
+    <payment>
+      <creditCard>
+        <cardNumber>XXXX1111</cardNumber>
+        <expirationDate>XXXX</expirationDate>
+        <cardType>Visa</cardType>
+      </creditCard>
+    </payment>
+  </paymentProfiles>
+  <paymentProfiles>
+    <defaultPaymentProfile>true</defaultPaymentProfile>
+    <customerPaymentProfileId>1600000002</customerPaymentProfileId>
+    <payment>
+      <bankAccount>
+        <accountType>businessChecking</accountType>
+        <routingNumber>XXXX0093</routingNumber>
+        <accountNumber>XXXX6789</accountNumber>
+        <nameOnAccount>Acme Brick Co</nameOnAccount>
+        <bankName>Frost Bank</bankName>
+      </bankAccount>
+    </payment>
+  </paymentProfiles>
+</profile>'''
+
+
+class TestMirror(TestCase):
+    """Test the mirror tables kept by mirror.py"""
+
+    def test_record_profile_response(self):
+        """A getCustomerProfile response replaces the mirrored rows"""
+
+        profile = objectify.fromstring(PROFILE_XML)
+
+        # a stale row that is no longer on Authorize.net
+        customer = mirror.record_customer_profile(1500000001)
+        PaymentProfileMirror.objects.create(
+            customer_profile=customer,
+            customer_payment_profile_id=1600000009,
+            payment_type='creditCard')
+
+        mirror.record_profile_response(profile)
+
+        customer = CustomerProfileMirror.objects.get(
+            customer_profile_id=1500000001)
+        self.assertEqual(customer.merchant_customer_id, '42')
+        self.assertEqual(customer.email, 'test@test.com')
+
+        card, bank = customer.payment_profiles.order_by(
+            'customer_payment_profile_id')
+        self.assertEqual(card.card_type, 'Visa')
+        self.assertEqual(card.last_4, '1111')
+        self.assertFalse(card.is_default)
+        self.assertEqual(bank.bank_name, 'Frost Bank')
+        self.assertEqual(bank.last_4, '6789')
+        self.assertTrue(bank.is_default)
+
+        self.assertFalse(PaymentProfileMirror.objects.filter(
+            customer_payment_profile_id=1600000009).exists())
+
+    def test_unchanged_profile(self):
+        """Reading a profile again only writes the rows that changed"""
+
+        mirror.record_profile_response(objectify.fromstring(PROFILE_XML))
+
+        with CaptureQueriesContext(connection) as queries:
+            mirror.record_profile_response(objectify.fromstring(PROFILE_XML))
+
+        writes = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].split()[0] in ('INSERT', 'UPDATE', 'DELETE')]
+        self.assertEqual(writes, [])
+
+        changed = PROFILE_XML.replace(b'Frost Bank', b'Chase')
+
+        with CaptureQueriesContext(connection) as queries:
+            mirror.record_profile_response(objectify.fromstring(changed))
+
+        writes = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].split()[0] in ('INSERT', 'UPDATE', 'DELETE')]
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(
+            PaymentProfileMirror.objects.get(
+                customer_payment_profile_id=1600000002).bank_name,
+            'Chase')
+
+    def test_record_payment_profile(self):
+        """Only the last 4 digits of a card that was sent are kept"""
+
+        payment = CustomerProfile.make_creditCard(
+            '4111111111111111', '2030-12', '123')
+
+        mirror.record_payment_profile(1500000001, 1600000001, payment, True)
+
+        row = PaymentProfileMirror.objects.get(
+            customer_payment_profile_id=1600000001)
+        self.assertEqual(row.last_4, '1111')
+        self.assertEqual(row.card_type, 'Visa')
+        self.assertEqual(row.expiration_date, '2030-12')
+        self.assertTrue(row.is_default)
+
+        # an update sent with the masked number keeps the card type
+        payment = CustomerProfile.make_creditCard(
+            'XXXX1111', '2031-01', None)
+        mirror.record_payment_profile(1500000001, 1600000001, payment, True)
+
+        row.refresh_from_db()
+        self.assertEqual(row.card_type, 'Visa')
+        self.assertEqual(row.expiration_date, '2031-01')
+
+        mirror.forget_payment_profile(1600000001)
+        self.assertFalse(PaymentProfileMirror.objects.exists())
@@ -0,0 +1,142 @@
+import threading
+import time
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+from payment_authorizenet.profile_cache import ProfileCache
+
+
+class TestProfileCache(TestCase):
+    """Test the read-through cache in profile_cache.py"""
+
+    def setUp(self):
+        self.profile_cache = ProfileCache('default', timeout=60)
+        self.profile_cache.invalidate(1234567890)
+        self.calls = 0
+
+    def load(self):
+        self.calls += 1
+        time.sleep(0.05)
+        return ['payment profile']
+
+    def test_get_or_load(self):
+        """A miss loads the value once, and later calls are hits"""
+
+        for _ in range(3):
+            value = self.profile_cache.get_or_load(1234567890, self.load)
+            self.assertEqual(value, ['payment profile'])
+
+        self.assertEqual(self.calls, 1)
+
+        # invalidating forces the next call to load again
+        self.profile_cache.invalidate(1234567890)
+        self.profile_cache.get_or_load(1234567890, self.load)
+        self.assertEqual(self.calls, 2)
+
+    def test_aget_or_load(self):
+        """The asyncio read shares entries with get_or_load()"""
+
+        async def load():
+            return self.load()
+
+        aget_or_load = async_to_sync(self.profile_cache.aget_or_load)
+
+        for _ in range(3):
+            value = aget_or_load(1234567890, load)
+            self.assertEqual(value, ['payment profile'])
+
+        self.assertEqual(
+            self.profile_cache.get_or_load(1234567890, self.load),
+            ['payment profile'])
+        self.assertEqual(self.calls, 1)
+
+    def test_invalidate_during_load(self):
+        """A fill that started before an invalidation is not read back"""
+
+        def load():
+            self.profile_cache.invalidate(1234567890)
+            return ['stale']
+
+        async def aload():
+            return load()
+
+        self.assertEqual(
+            self.profile_cache.get_or_load(1234567890, load), ['stale'])
+        self.assertEqual(
+            async_to_sync(self.profile_cache.aget_or_load)(1234567890, aload),
+            ['stale'])
+
+        self.assertEqual(
+            self.profile_cache.get_or_load(1234567890, self.load),
+            ['payment profile'])
+        self.assertEqual(self.calls, 1)
+
+    def test_cached_none(self):
+        """A customer without payment profiles is cached too"""
+
+        self.profile_cache.get_or_load(1234567890, lambda: None)
+        self.assertIsNone(
+            self.profile_cache.get_or_load(1234567890, self.load))
+        self.assertEqual(self.calls, 0)
+
+    def test_concurrent_misses(self):
+        """Concurrent misses for the same key make a single load"""
+
+        threads = [
+            threading.Thread(
+                target=self.profile_cache.get_or_load,
+                args=(1234567890, self.load))
+            for _ in range(10)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.calls, 1)
+
+    def test_no_lock_during_load(self):
+        """Loads don't hold the lock shared with other keys"""
+
+        key = self.profile_cache._current_key(1234567890)
+        lock = self.profile_cache._local_lock(key)
+
+        def load():
+            self.assertFalse(lock.locked())
+            return self.load()
+
+        self.profile_cache.get_or_load(1234567890, load)
+        self.assertEqual(self.calls, 1)
+
+    def test_failed_load(self):
+        """Misses waiting on a load that raised get its error, and the next
+        miss loads again"""
+
+        started = threading.Event()
+        errors = []
+
+        def fail():
+            started.set()
+            time.sleep(0.2)
+            raise RuntimeError('gateway down')
+
+        def wait():
+            started.wait()
+            try:
+                self.profile_cache.get_or_load(1234567890, self.load)
+            except RuntimeError as err:
+                errors.append(err)
+
+        thread = threading.Thread(target=wait)
+        thread.start()
+
+        with self.assertRaises(RuntimeError):
+            self.profile_cache.get_or_load(1234567890, fail)
+
+        thread.join()
+
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(
+            self.profile_cache.get_or_load(1234567890, self.load),
+            ['payment profile'])
+        self.assertEqual(self.calls, 1)
@@ -0,0 +1,179 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.db import connection, models
+from django.test import override_settings
+from io import StringIO
+from payment_authorizenet import profile_index, webhooks
+from payment_authorizenet.bulk import BulkCreateProfiles
+from payment_authorizenet.customer_profile import CustomerProfile
+from payment_authorizenet.models import CustomerProfileIndex
+from payment_authorizenet.test.helpers import FakeGatewayTestCase, Practice
+
+
+class Clinic(models.Model):
+    """A second model whose pks overlap Practice's"""
+
+    name = models.CharField(max_length=50)
+    authorizenet_customer_profile_id = models.BigIntegerField(null=True)
+
+    class Meta:
+        app_label = 'payment_authorizenet'
+        managed = False
+
+    def __str__(self):
+        return self.name
+
+
+def indexed():
+    return {
+        row[:3]: row[3]
+        for row in CustomerProfileIndex.objects.values_list(
+            'merchant_customer_id', 'description', 'email',
+            'customer_profile_id')}
+
+
+@override_settings(AUTHORIZE_NET_PROFILE_INDEX=True)
+class TestProfileIndex(FakeGatewayTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with connection.schema_editor() as editor:
+            editor.create_model(Clinic)
+
+        cls.addClassCleanup(cls.drop_clinic_table)
+
+        super().setUpClass()
+
+    @classmethod
+    def drop_clinic_table(cls):
+        with connection.schema_editor() as editor:
+            editor.delete_model(Clinic)
+
+    def setUp(self):
+        super().setUp()
+        ContentType.objects.clear_cache()
+        self.key = (str(self.practice.pk), 'Acme Brick Co', 'test@test.com')
+
+    def test_create(self):
+        """A profile in the index is used without calling the gateway"""
+
+        cp = CustomerProfile(self.practice)
+        self.assertTrue(cp.create_customer_profile('test@test.com'))
+
+        profile_id = self.practice.authorizenet_customer_profile_id
+        self.assertEqual(indexed(), {self.key: profile_id})
+
+        self.practice.authorizenet_customer_profile_id = None
+        self.practice.save()
+
+        self.assertIsNone(cp.create_customer_profile('test@test.com'))
+        self.practice.refresh_from_db()
+        self.assertEqual(
+            self.practice.authorizenet_customer_profile_id, profile_id)
+        self.assertEqual(self.gateway.requests['createCustomerProfile'], 1)
+
+        cp.delete_customer_profile()
+        self.assertEqual(indexed(), {})
+
+    def test_duplicate(self):
+        """A duplicate found by the gateway is indexed"""
+
+        cp = CustomerProfile(self.practice)
+
+        with self.settings(AUTHORIZE_NET_PROFILE_INDEX=False):
+            cp.create_customer_profile('test@test.com')
+
+        profile_id = self.practice.authorizenet_customer_profile_id
+        self.assertIsNone(cp.create_customer_profile('test@test.com'))
+        self.assertEqual(indexed(), {self.key: profile_id})
+
+    def test_shared_pk(self):
+        """Instances of two models with the same pk get profiles of their
+        own"""
+
+        clinic = Clinic.objects.create(
+            pk=self.practice.pk, name='Acme Clinic')
+
+        CustomerProfile(self.practice).create_customer_profile(
+            'test@test.com')
+        CustomerProfile(clinic).create_customer_profile('test@test.com')
+
+        self.assertNotEqual(
+            clinic.authorizenet_customer_profile_id,
+            self.practice.authorizenet_customer_profile_id)
+        self.assertEqual(self.gateway.requests['createCustomerProfile'], 2)
+        self.assertEqual(indexed(), {
+            self.key: self.practice.authorizenet_customer_profile_id,
+            (str(clinic.pk), 'Acme Clinic', 'test@test.com'):
+                clinic.authorizenet_customer_profile_id,
+        })
+
+        # each is found in the index again
+        for instance in (self.practice, clinic):
+            profile_id = instance.authorizenet_customer_profile_id
+            instance.authorizenet_customer_profile_id = None
+
+            CustomerProfile(instance).create_customer_profile(
+                'test@test.com')
+            self.assertEqual(
+                instance.authorizenet_customer_profile_id, profile_id)
+
+        self.assertEqual(self.gateway.requests['createCustomerProfile'], 2)
+
+    def test_build_profile_index(self):
+        with self.settings(AUTHORIZE_NET_PROFILE_INDEX=False):
+            for name in ('Acme', 'Initech'):
+                CustomerProfile(Practice.objects.create(name=name)) \
+                    .create_customer_profile('test@test.com')
+
+        profile_index.record(('999', 'Gone', ''), 1599999999)
+
+        out = StringIO()
+        call_command('build_profile_index', '--workers', '2', stdout=out)
+
+        self.assertIn('Indexed 2 of 2 customer profiles', out.getvalue())
+        self.assertEqual(indexed(), dict(
+            ((str(pk), name, 'test@test.com'), profile_id)
+            for pk, name, profile_id in Practice.objects.filter(
+                authorizenet_customer_profile_id__isnull=False).values_list(
+                'pk', 'name', 'authorizenet_customer_profile_id')))
+
+    def test_bulk(self):
+        profile_index.record(self.key, 1500000099)
+        Practice.objects.create(name='Initech')
+
+        run = BulkCreateProfiles(
+            Practice.objects.all(), lambda practice: 'test@test.com')
+        list(run)
+
+        self.practice.refresh_from_db()
+        self.assertEqual(
+            self.practice.authorizenet_customer_profile_id, 1500000099)
+        self.assertEqual(run.summary.existing, 1)
+        self.assertEqual(run.summary.created, 1)
+        self.assertEqual(self.gateway.requests['createCustomerProfile'], 1)
+        self.assertEqual(len(indexed()), 2)
+
+    def test_webhook(self):
+        def event(event_type, payload):
+            return webhooks.WebhookEvent({
+                'notificationId': event_type,
+                'eventType': event_type,
+                'payload': dict(payload, entityName='customerProfile'),
+            })
+
+        with self.settings(AUTHORIZE_NET_PROFILE_INDEX=False):
+            CustomerProfile(self.practice).create_customer_profile(
+                'test@test.com')
+
+        profile_id = self.practice.authorizenet_customer_profile_id
+
+        webhooks.update_profile_index(event(
+            'net.authorize.customer.created',
+            {'id': str(profile_id),
+             'merchantCustomerId': str(self.practice.pk)}))
+        self.assertEqual(indexed(), {self.key: profile_id})
+
+        webhooks.update_profile_index(event(
+            'net.authorize.customer.deleted', {'id': str(profile_id)}))
+        self.assertEqual(indexed(), {})
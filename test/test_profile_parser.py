@@ -0,0 +1,227 @@
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, override_settings
+from payment_authorizenet import profile_parser, transport
+from payment_authorizenet.async_customer_profile import AsyncCustomerProfile
+from payment_authorizenet.customer_profile import CustomerProfile
+from payment_authorizenet.merchant_auth import AuthorizeNetError
+from payment_authorizenet.models import PaymentProfileMirror
+from payment_authorizenet.payment_profile import PaymentProfile
+from payment_authorizenet.sdk import apicontractsv1, apicontrollers
+from payment_authorizenet.test.helpers import FakeGatewayTestCase
+from payment_authorizenet.transport import BodyFeed, parse_response
+from unittest import mock
+import codecs
+
+BILL_TO = (
+    '<billTo><firstName>Shaun</firstName><lastName>Overton</lastName>'
+    '<address>123 Sesame St</address><city>Hurst</city><state>TX</state>'
+    '<zip>76054</zip><country>US</country></billTo>')
+
+
+def payment_profile(number):
+    if number % 3 == 0:
+        payment = (
+            '<bankAccount><accountType>businessChecking</accountType>'
+            '<routingNumber>XXXX0093</routingNumber>'
+            '<accountNumber>XXXX{:04}</accountNumber>'
+            '<nameOnAccount>Acme &amp; Sons</nameOnAccount>'
+            '<echeckType>WEB</echeckType><bankName>Frost Bank</bankName>'
+            '</bankAccount>').format(number)
+    else:
+        payment = (
+            '<creditCard><cardNumber>XXXX{:04}</cardNumber>'
+            '<expirationDate>XXXX</expirationDate><cardType>Visa</cardType>'
+            '<issuerNumber>411111</issuerNumber></creditCard>').format(number)
+
+    return (
+        '<paymentProfiles><customerType>business</customerType>{}'
+        '<customerProfileId>1500000001</customerProfileId>'
+        '<customerPaymentProfileId>{}</customerPaymentProfileId>'
+        '<defaultPaymentProfile>{}</defaultPaymentProfile>'
+        '<payment>{}</payment></paymentProfiles>').format(
+            BILL_TO, 1600000000 + number, 'true' if number == 2 else 'false',
+            payment)
+
+
+def ship_to(number):
+    return (
+        '<shipToList><firstName>Ship</firstName><lastName>{}</lastName>'
+        '<company>Acme</company><address>{} Main St</address>'
+        '<city>Hurst</city><state>TX</state><zip>76054</zip>'
+        '<country>US</country><phoneNumber>8171234567</phoneNumber>'
+        '<customerAddressId>{}</customerAddressId></shipToList>').format(
+            number, number, 1700000000 + number)
+
+
+def profile_response(payment_profiles=5, addresses=3):
+    payment_profiles = ''.join(
+        payment_profile(n) for n in range(1, payment_profiles + 1))
+    addresses = ''.join(ship_to(n) for n in range(1, addresses + 1))
+
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<getCustomerProfileResponse '
+        'xmlns="AnetApi/xml/v1/schema/AnetApiSchema.xsd">'
+        '<messages><resultCode>Ok</resultCode><message><code>I00001</code>'
+        '<text>Successful.</text></message></messages>'
+        '<profile><merchantCustomerId>42</merchantCustomerId>'
+        '<description>Acme Brick Co</description>'
+        '<email>test@test.com</email>'
+        '<customerProfileId>1500000001</customerProfileId>{}{}</profile>'
+        '<subscriptionIds><subscriptionId>7</subscriptionId>'
+        '<subscriptionId>8</subscriptionId></subscriptionIds>'
+        '</getCustomerProfileResponse>').format(payment_profiles, addresses)
+
+
+class TestCustomerProfileParser(SimpleTestCase):
+
+    def sdk_response(self, text):
+        request = apicontractsv1.getCustomerProfileRequest()
+        request.merchantAuthentication = \
+            apicontractsv1.merchantAuthenticationType()
+        request.customerProfileId = '1'
+        controller = apicontrollers.getCustomerProfileController(request)
+
+        return parse_response(controller, text)
+
+    def test_parse(self):
+        """The records match those built from the SDK's response"""
+
+        text = profile_response()
+        response = profile_parser.parse_customer_profile(text)
+        sdk = self.sdk_response(text)
+
+        self.assertEqual(response.messages.resultCode, 'Ok')
+        self.assertEqual(response.customer_profile_id, 1500000001)
+        self.assertEqual(response.merchant_customer_id, '42')
+        self.assertEqual(response.email, 'test@test.com')
+        self.assertEqual(response.default_payment_profile_id, 1600000002)
+        self.assertEqual(response.subscription_ids, [7, 8])
+
+        self.assertEqual(
+            response.payment_profiles,
+            [PaymentProfile(pp) for pp in sdk.profile.paymentProfiles])
+        self.assertEqual(
+            response.shipping_addresses,
+            [profile_parser.ShippingAddress(address)
+             for address in sdk.profile.shipToList])
+        self.assertEqual(
+            response.payment_profiles[2].payment.bank_account.name_on_account,
+            'Acme & Sons')
+
+    def test_chunks(self):
+        body = profile_response().encode()
+        parser = profile_parser.CustomerProfileParser()
+
+        for start in range(0, len(body), 7):
+            parser.feed(body[start:start + 7])
+
+        response = parser.close()
+
+        self.assertEqual(len(response.payment_profiles), 5)
+        self.assertEqual(response.shipping_addresses[2].last_name, '3')
+
+    def test_body_feed(self):
+        """The byte order mark is dropped however the body is cut up"""
+
+        body = profile_response().encode()
+        parser = profile_parser.CustomerProfileParser()
+        feed = BodyFeed(parser.feed)
+
+        for byte in codecs.BOM_UTF8 + body:
+            feed(bytes([byte]))
+
+        feed.close()
+        self.assertEqual(len(parser.close().payment_profiles), 5)
+
+    def test_errors(self):
+        response = profile_parser.parse_customer_profile(
+            '<ErrorResponse><messages><resultCode>Error</resultCode>'
+            '<message><code>E00007</code><text>User authentication failed'
+            '</text></message></messages></ErrorResponse>')
+
+        self.assertEqual(response.messages.message[0].code, 'E00007')
+
+        with self.assertRaises(AuthorizeNetError):
+            profile_parser.parse_customer_profile('<getCustomerProfile')
+
+        with self.assertRaises(AuthorizeNetError):
+            profile_parser.parse_customer_profile('<a><b>1</b></a>')
+
+
+@override_settings(AUTHORIZE_NET_STREAMING_PROFILES=True,
+                   AUTHORIZE_NET_MIRROR_PROFILES=True)
+class TestStreamingProfiles(FakeGatewayTestCase):
+
+    def test_get_customer_profile(self):
+        cp = CustomerProfile(self.practice)
+        self.create_profiles(cp)
+        cp.get_customer_profile()
+
+        self.assertIsInstance(
+            cp.customer_profile, profile_parser.CustomerProfileResponse)
+        self.assertEqual(
+            [str(pp.payment) for pp in cp.payment_profiles],
+            ['Visa XXXX1111', 'Frost Bank XXXX6789'])
+        self.assertEqual(cp.shipping_addresses, [])
+        self.assertEqual(
+            sorted(PaymentProfileMirror.objects.values_list(
+                'last_4', flat=True)),
+            ['1111', '6789'])
+
+        with override_settings(AUTHORIZE_NET_STREAMING_PROFILES=False):
+            streamed = cp.payment_profiles
+            cp.get_customer_profile()
+
+        self.assertEqual(cp.payment_profiles, streamed)
+
+    def fed(self, read):
+        """Call read() and return the sizes of the chunks fed to the
+        parser"""
+
+        chunks = []
+        feed = profile_parser.CustomerProfileParser.feed
+
+        def record(parser, data):
+            chunks.append(len(data))
+            return feed(parser, data)
+
+        with mock.patch.object(transport, 'CHUNK_SIZE', 64), \
+                mock.patch.object(
+                    profile_parser.CustomerProfileParser, 'feed', record):
+            read()
+
+        return chunks
+
+    def test_streamed(self):
+        """The transport feeds the parser the body as it arrives rather
+        than the whole of it"""
+
+        cp = CustomerProfile(self.practice)
+        self.create_profiles(cp)
+
+        chunks = self.fed(cp.get_customer_profile)
+
+        self.assertGreater(len(chunks), 1)
+        self.assertLessEqual(max(chunks), 64)
+        self.assertEqual(len(cp.payment_profiles), 2)
+
+    def test_streamed_async(self):
+        self.create_profiles(CustomerProfile(self.practice))
+
+        async def read():
+            cp = AsyncCustomerProfile(self.practice)
+
+            try:
+                await cp.get_customer_profile()
+            finally:
+                await cp.async_transport.close()
+
+            return cp
+
+        results = []
+        chunks = self.fed(lambda: results.append(async_to_sync(read)()))
+
+        self.assertGreater(len(chunks), 1)
+        self.assertLessEqual(max(chunks), 64)
+        self.assertEqual(len(results[0].payment_profiles), 2)
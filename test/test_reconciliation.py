@@ -0,0 +1,166 @@
+from decimal import Decimal
+from django.core.management import call_command
+from django.db import connection, models
+from io import StringIO
+from payment_authorizenet import reconciliation
+from payment_authorizenet.customer_profile import CustomerProfile
+from payment_authorizenet.models import ReconciledBatch, SettledTransaction
+from payment_authorizenet.test.helpers import FakeGatewayTestCase
+import datetime
+
+
+class Invoice(models.Model):
+    """Local rows to reconcile in tests"""
+
+    number = models.CharField(max_length=20)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        app_label = 'payment_authorizenet'
+        managed = False
+
+
+class TestReconciliation(FakeGatewayTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with connection.schema_editor() as editor:
+            editor.create_model(Invoice)
+
+        cls.addClassCleanup(cls.drop_invoices)
+
+        super().setUpClass()
+
+    @classmethod
+    def drop_invoices(cls):
+        with connection.schema_editor() as editor:
+            editor.delete_model(Invoice)
+
+    def setUp(self):
+        super().setUp()
+
+        self.cp = CustomerProfile(self.practice)
+        self.card, _ = self.create_profiles(self.cp)
+
+        for number, amount in (('1', '1.00'), ('2', '2.00'), ('3', '3.00'),
+                               ('4', '4.00')):
+            self.charge(number, amount)
+
+        Invoice.objects.bulk_create([
+            Invoice(number='1', amount=Decimal('1.00')),
+            Invoice(number='2', amount=Decimal('2.50')),
+            Invoice(number='3', amount=Decimal('3.00')),
+            Invoice(number='5', amount=Decimal('5.00')),
+        ])
+
+        self.first = datetime.datetime.now(datetime.timezone.utc).date() - \
+            datetime.timedelta(days=1)
+        self.batch = self.gateway.settle()
+
+    def charge(self, number, amount):
+        self.cp.charge_customer_profile(str(self.card), amount, number, number)
+
+    def reconcile(self, **kwargs):
+        return reconciliation.reconcile(
+            Invoice.objects.all(), self.first, field='number', **kwargs)
+
+    def test_reconcile(self):
+        report = self.reconcile()
+
+        self.assertEqual(report.matched, 2)
+        self.assertEqual(
+            [(d.key, d.amount, d.transaction.settle_amount)
+             for d in report.mismatched],
+            [('2', Decimal('2.50'), Decimal('2.00'))])
+        self.assertEqual([d.key for d in report.unexpected], ['4'])
+        self.assertEqual([d.key for d in report.missing], ['5'])
+
+        self.assertEqual(
+            ReconciledBatch.objects.get().batch_id, self.batch)
+        self.assertEqual(SettledTransaction.objects.count(), 4)
+
+    def test_incremental(self):
+        """A second run only reads new batches, does not report rows
+        matched by the first run as missing, and reports the open
+        discrepancies of the first run again"""
+
+        self.reconcile()
+        self.charge('5', '5.00')
+        self.gateway.settle()
+        self.gateway.requests.clear()
+
+        report = self.reconcile()
+
+        self.assertEqual(report.skipped_batches, 1)
+        self.assertEqual(report.batches, 1)
+        self.assertEqual(report.matched, 1)
+        self.assertEqual(
+            [(d.kind, d.key, d.amount, d.transaction.settle_amount)
+             for d in report.discrepancies],
+            [(reconciliation.MISMATCHED, '2', Decimal('2.50'),
+              Decimal('2.00')),
+             (reconciliation.UNEXPECTED, '4', None, Decimal('4.00'))])
+        self.assertEqual(self.gateway.requests['getTransactionList'], 1)
+
+        # fixing the local rows closes the discrepancies
+        Invoice.objects.filter(number='2').update(amount=Decimal('2.00'))
+        Invoice.objects.create(number='4', amount=Decimal('4.00'))
+
+        report = self.reconcile()
+        self.assertEqual(report.matched, 2)
+        self.assertEqual(report.discrepancies, [])
+        self.assertEqual(
+            set(SettledTransaction.objects.values_list('outcome', flat=True)),
+            {reconciliation.MATCHED})
+
+        report = self.reconcile()
+        self.assertEqual(report.matched, 0)
+        self.assertEqual(report.discrepancies, [])
+
+        report = self.reconcile(rerun=True)
+        self.assertEqual(report.batches, 2)
+        self.assertEqual(report.matched, 5)
+
+    def test_sources(self):
+        """Each source has its own checkpoints"""
+
+        self.reconcile()
+
+        report = self.reconcile(source='paid invoices')
+        self.assertEqual(report.skipped_batches, 0)
+        self.assertEqual(report.batches, 1)
+        self.assertEqual(report.matched, 2)
+
+        report = self.reconcile(key=reconciliation.TRANSACTION_ID)
+        self.assertEqual(report.batches, 1)
+        self.assertEqual(report.matched, 0)
+
+        self.assertEqual(ReconciledBatch.objects.count(), 3)
+        self.assertEqual(SettledTransaction.objects.count(), 12)
+
+        # rerunning one source keeps the checkpoints of the others
+        self.reconcile(rerun=True)
+        self.assertEqual(ReconciledBatch.objects.count(), 3)
+
+        report = self.reconcile(source='paid invoices')
+        self.assertEqual(report.skipped_batches, 1)
+
+    def test_transaction_id(self):
+        Invoice.objects.filter(number='1').update(number='60000001')
+
+        report = self.reconcile(
+            key=reconciliation.TRANSACTION_ID, amount_field=None)
+
+        self.assertEqual(report.matched, 1)
+
+    def test_command(self):
+        out = StringIO()
+        call_command(
+            'reconcile_settlements', 'payment_authorizenet.Invoice',
+            '--first', self.first.isoformat(), '--field', 'number',
+            stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('missing: 5 (row', output)
+        self.assertIn('2 matched, 1 mismatched, 1 unexpected, 1 missing',
+                      output)
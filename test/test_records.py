@@ -0,0 +1,101 @@
+import pickle
+
+from django.test import SimpleTestCase
+from lxml import objectify
+from payment_authorizenet.enums import PaymentProfileType
+from payment_authorizenet.payment_profile import PaymentProfile
+from payment_authorizenet.test.test_mirror import PROFILE_XML
+from payment_authorizenet.transaction import Transaction, TransactionResponse
+
+TRANSACTION_XML = b'''
+<createTransactionResponse>
+  <messages><resultCode>Error</resultCode></messages>
+  <transactionResponse>
+    <responseCode>3</responseCode>
+    <authCode />
+    <avsResultCode>P</avsResultCode>
+    <transId>0</transId>
+    <testRequest>0</testRequest>
+    <accountNumber>XXXX1111</accountNumber>
+    <accountType>Visa</accountType>
+    <errors>
+      <error>
+        <errorCode>11</errorCode>
+        <errorText>A duplicate transaction has been submitted.</errorText>
+      </error>
+    </errors>
+    <profile>
+      <customerProfileId>1500000001</customerProfileId>
+      <customerPaymentProfileId>1600000001</customerPaymentProfileId>
+    </profile>
+  </transactionResponse>
+</createTransactionResponse>'''
+
+
+class TestRecords(SimpleTestCase):
+    """Test the records built from gateway responses"""
+
+    def test_transaction_response(self):
+        """Fields, errors and the profile are copied out of the response"""
+
+        transaction = Transaction(objectify.fromstring(TRANSACTION_XML))
+        tr = transaction.transaction_response
+
+        self.assertEqual(transaction.result, Transaction.FAILURE)
+        self.assertEqual(tr.response_code, 3)
+        self.assertEqual(tr.auth_code, '')
+        self.assertIsNone(tr.cvv_result_code)
+        self.assertIs(tr.test_request, False)
+        self.assertEqual(tr.errors[0].error_code, '11')
+        self.assertEqual(tr.profile.customer_profile_id, 1500000001)
+        self.assertEqual(tr.profile.customer_payment_profile_id, 1600000001)
+
+        with self.assertRaises(AttributeError):
+            tr.response_code = '1'
+
+    def test_payment_profiles(self):
+        """Payment profiles keep plain values, not the response tree"""
+
+        profile = objectify.fromstring(PROFILE_XML)
+        card, bank = [PaymentProfile(pp) for pp in profile.paymentProfiles]
+
+        self.assertEqual(card.customer_payment_profile_id, 1600000001)
+        self.assertEqual(card.payment.payment_type,
+                         PaymentProfileType.creditCard)
+        self.assertEqual(str(card), '1600000001: Visa XXXX1111')
+        self.assertIsNone(card.payment.credit_card.issuer_number)
+        self.assertIsInstance(card.payment.account_number, str)
+
+        self.assertEqual(bank.payment.entity, 'Frost Bank')
+        self.assertIsNone(bank.payment.bank_account.echeck_type)
+        self.assertFalse(hasattr(card, '__dict__'))
+
+        self.assertEqual(pickle.loads(pickle.dumps(bank)), bank)
+
+    def test_from_values(self):
+        """Records can be built without a response"""
+
+        tr = TransactionResponse.from_values(1, auth_code='ABC123')
+
+        self.assertEqual(tr.response_code, 1)
+        self.assertEqual(tr.auth_code, 'ABC123')
+        self.assertIsNone(tr.errors)
+
+        with self.assertRaises(TypeError):
+            TransactionResponse.from_values(bad_field=1)
+
+    def test_stored_transaction(self):
+        """response_code is an int after a round trip, even when stored
+        as a string"""
+
+        transaction = Transaction(objectify.fromstring(TRANSACTION_XML))
+        data = transaction.as_dict()
+
+        self.assertEqual(
+            Transaction.from_dict(data).transaction_response.response_code,
+            3)
+
+        data['transaction_response']['response_code'] = '3'
+        self.assertEqual(
+            Transaction.from_dict(data).transaction_response.response_code,
+            3)
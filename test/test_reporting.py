@@ -0,0 +1,102 @@
+from decimal import Decimal
+from django.test import SimpleTestCase
+from payment_authorizenet.customer_profile import CustomerProfile
+from payment_authorizenet.merchant_auth import AuthorizeNetError
+from payment_authorizenet.reporting import Reporting, as_utc, windows
+from payment_authorizenet.test.helpers import FakeGatewayTestCase
+import datetime
+
+NOW = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+
+
+class TestWindows(SimpleTestCase):
+
+    def test_windows(self):
+        """Date ranges are split into windows of at most 31 days"""
+
+        first = as_utc(datetime.date(2026, 1, 1))
+        last = as_utc(datetime.date(2026, 3, 11), end=True)
+        ranges = list(windows(first, last))
+
+        self.assertEqual(len(ranges), 3)
+        self.assertEqual(ranges[0][0], first)
+        self.assertEqual(ranges[-1][1], last)
+
+        for (start, end), (next_start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, next_start)
+
+        for start, end in ranges:
+            self.assertLessEqual(end - start, datetime.timedelta(days=31))
+
+    def test_first_after_last(self):
+        with self.assertRaises(ValueError):
+            list(windows(NOW, NOW - datetime.timedelta(seconds=1)))
+
+
+class TestReporting(FakeGatewayTestCase):
+
+    gateway_options = {'decline_rate': 0.3}
+
+    def setUp(self):
+        super().setUp()
+
+        cp = CustomerProfile(self.practice)
+        self.card, _ = self.create_profiles(cp)
+
+        for i in range(5):
+            cp.charge_customer_profile(
+                str(self.card), '1.0{}'.format(i), 'ref-{}'.format(i),
+                'Invoice #{}'.format(i))
+
+        self.reporting = Reporting(page_size=2)
+
+    def test_unsettled_transactions(self):
+        transactions = list(self.reporting.unsettled_transactions())
+
+        self.assertEqual(
+            [t.transaction_id for t in transactions],
+            sorted(self.gateway.transactions))
+        self.assertEqual(transactions[0].invoice_number, 'Invoice #0')
+        self.assertEqual(transactions[0].customer_payment_profile_id,
+                         self.card)
+        self.assertIsNone(transactions[0].batch_id)
+        self.assertEqual(self.gateway.requests['getUnsettledTransactionList'],
+                         3)
+
+    def test_settled_transactions(self):
+        """Transactions are read a page at a time across batches and
+        31 day windows"""
+
+        old_batch = self.gateway.settle(NOW - datetime.timedelta(days=40))
+
+        CustomerProfile(self.practice).charge_customer_profile(
+            str(self.card), '2.00', 'ref-5', 'Invoice #5')
+        batch = self.gateway.settle(NOW)
+
+        batches = list(self.reporting.settled_batches(
+            NOW.date() - datetime.timedelta(days=60)))
+        self.assertEqual([b.batch_id for b in batches], [old_batch, batch])
+        self.assertEqual(self.gateway.requests['getSettledBatchList'], 2)
+
+        transactions = list(self.reporting.settled_transactions(
+            NOW - datetime.timedelta(days=60), NOW))
+        self.assertEqual(len(transactions), 6)
+        self.assertEqual(transactions[-1].batch_id, batch)
+        self.assertEqual(transactions[-1].settle_amount, Decimal('2.00'))
+        self.assertEqual(self.gateway.requests['getTransactionList'], 4)
+
+        self.assertEqual(list(self.reporting.unsettled_transactions()), [])
+
+    def test_transaction_details(self):
+        batch = self.gateway.settle()
+        details = self.reporting.transaction_details('60000002')
+
+        self.assertEqual(details.batch_id, batch)
+        self.assertEqual(details.invoice_number, 'Invoice #1')
+        self.assertEqual(details.auth_amount, Decimal('1.01'))
+        self.assertEqual(details.customer_profile_id,
+                         self.practice.authorizenet_customer_profile_id)
+
+    def test_missing_batch(self):
+        with self.assertRaises(AuthorizeNetError):
+            list(self.reporting.transactions('1'))
@@ -0,0 +1,123 @@
+from django.test import SimpleTestCase, override_settings
+from payment_authorizenet import resilience
+from payment_authorizenet.customer_profile import get_customer_profile_ids
+from payment_authorizenet.fake_gateway import FakeGateway
+from payment_authorizenet.merchant_auth import (
+    AuthNet,
+    AuthorizeNetError,
+    CircuitOpenError)
+from payment_authorizenet.sdk import apicontractsv1, apicontrollers
+import time
+
+
+@override_settings(
+    AUTHORIZE_NET_RETRY_ATTEMPTS=3,
+    AUTHORIZE_NET_RETRY_BASE_DELAY=0,
+    AUTHORIZE_NET_CIRCUIT_FAILURES=5)
+class TestResilience(SimpleTestCase):
+    """Test retries and circuit breakers around AuthNet.execute()"""
+
+    def setUp(self):
+        self.gateway = FakeGateway(error_rate=1)
+        self.gateway_settings = self.gateway.settings()
+        self.gateway_settings.enable()
+
+    def tearDown(self):
+        self.gateway_settings.disable()
+        self.gateway.stop()
+
+    def test_retry_idempotent(self):
+        """Reads are retried after E00001"""
+
+        with self.assertRaises(AuthorizeNetError):
+            get_customer_profile_ids()
+
+        self.assertEqual(self.gateway.requests['getCustomerProfileIds'], 3)
+
+    @override_settings(
+        AUTHORIZE_NET_RETRY_ATTEMPTS=10,
+        AUTHORIZE_NET_RETRY_BASE_DELAY=0.2,
+        AUTHORIZE_NET_RETRY_MAX_DELAY=0.2,
+        AUTHORIZE_NET_TIMEOUT=0.5)
+    def test_deadline(self):
+        """Retries and backoff stop at AUTHORIZE_NET_TIMEOUT"""
+
+        self.gateway.latency = 0.1
+        start = time.monotonic()
+
+        with self.assertRaises(AuthorizeNetError):
+            get_customer_profile_ids()
+
+        self.assertLess(time.monotonic() - start, 0.75)
+        self.assertLess(self.gateway.requests['getCustomerProfileIds'], 10)
+
+    def test_time_left(self):
+        self.assertEqual(resilience.time_left(60), 60)
+
+        token = resilience._deadline.set(time.monotonic() + 5)
+
+        try:
+            self.assertLessEqual(resilience.time_left(60), 5)
+            self.assertEqual(resilience.time_left(1), 1)
+        finally:
+            resilience._deadline.reset(token)
+
+        # a deadline that has passed still leaves a usable timeout
+        token = resilience._deadline.set(time.monotonic() - 1)
+
+        try:
+            self.assertEqual(
+                resilience.time_left(60), resilience.MIN_REQUEST_TIMEOUT)
+            self.assertEqual(
+                resilience.time_left(None), resilience.MIN_REQUEST_TIMEOUT)
+        finally:
+            resilience._deadline.reset(token)
+
+    def test_no_retry(self):
+        """Writes that may have been processed are not retried"""
+
+        auth = AuthNet()
+        request = apicontractsv1.deleteCustomerProfileRequest()
+        request.merchantAuthentication = auth.merchantAuth
+        request.customerProfileId = '1500000001'
+
+        response = auth.execute(
+            apicontrollers.deleteCustomerProfileController(request))
+
+        self.assertEqual(response.messages.message[0].code, 'E00001')
+        self.assertEqual(self.gateway.requests['deleteCustomerProfile'], 1)
+
+    @override_settings(AUTHORIZE_NET_CIRCUIT_FAILURES=2)
+    def test_circuit_breaker(self):
+        """Once the circuit opens, calls fail without reaching the gateway"""
+
+        with self.assertRaises(CircuitOpenError):
+            get_customer_profile_ids()
+
+        self.assertEqual(self.gateway.requests['getCustomerProfileIds'], 2)
+
+        breaker = resilience.get_circuit_breaker(self.gateway.url)
+        self.assertEqual(breaker.state, resilience.OPEN)
+
+        # half open: one probe goes through, and success closes it
+        breaker.opened -= resilience.DEFAULT_CIRCUIT_RESET
+        self.gateway.error_rate = 0
+
+        self.assertEqual(get_customer_profile_ids(), [])
+        self.assertEqual(breaker.state, resilience.CLOSED)
+
+
+class TestCircuitBreaker(SimpleTestCase):
+
+    def test_half_open(self):
+        breaker = resilience.CircuitBreaker(
+            failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, resilience.HALF_OPEN)
+        self.assertTrue(breaker.allow())
+        # only one probe at a time
+        self.assertFalse(breaker.allow())
+
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
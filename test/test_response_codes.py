@@ -0,0 +1,35 @@
+from django.test import TestCase
+from payment_authorizenet.response_codes import (
+    ResponseCodeTable,
+    get_response_codes)
+
+
+class TestResponseCodeTable(TestCase):
+    """Test the bundled response code table in response_codes.py"""
+
+    def test_bundled_table(self):
+        """The bundled table loads and knows the approval code"""
+
+        table = get_response_codes()
+
+        self.assertTrue(len(table) > 0)
+        self.assertTrue(table.is_approved(1))
+        self.assertTrue(table.is_approved('1'))
+        self.assertFalse(table.is_approved(2))
+        self.assertEqual(table.approval_code, 1)
+
+        # the table is loaded once per process
+        self.assertIs(table, get_response_codes())
+
+    def test_lookup(self):
+        """Codes are looked up as strings and unknown codes are handled"""
+
+        table = ResponseCodeTable([
+            {'code': '1', 'text': 'This transaction has been approved.'},
+            {'code': 'E00040', 'text': 'The record cannot be found.'}])
+
+        self.assertEqual(table.text(1), 'This transaction has been approved.')
+        self.assertEqual(table.text('E00040'), 'The record cannot be found.')
+        self.assertIsNone(table.text('does not exist'))
+        self.assertFalse(table.is_approved('does not exist'))
+        self.assertIn('E00040', table)
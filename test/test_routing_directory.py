@@ -0,0 +1,189 @@
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+from io import StringIO
+from payment_authorizenet import routing_directory, validators
+from payment_authorizenet.forms import ECheckForm
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def fedach_line(routing_number, name, record_type='1',
+                new_routing_number='000000000'):
+    """A line of FedACHdir.txt"""
+
+    return (
+        routing_number + 'O' + '011000015' + record_type + '072518' +
+        new_routing_number + name.ljust(36) + '100 MAIN ST'.ljust(36) +
+        'SAN ANTONIO'.ljust(20) + 'TX' + '78205' + '0000' + '2105551234' +
+        '1' + '1' + ' ' * 5)
+
+
+FEDACH = '\n'.join([
+    fedach_line('011000015', 'FEDERAL RESERVE BANK', record_type='0'),
+    fedach_line('121042882', 'WELLS FARGO BANK NA'),
+    fedach_line('114000093', 'FROST BANK'),
+    fedach_line('021000089', 'CITIBANK NA', record_type='2',
+                new_routing_number='021000021'),
+    fedach_line('021000021', 'JPMORGAN CHASE BANK, NA'),
+]) + '\n'
+
+
+class RoutingDirectoryTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        self.source = os.path.join(self.directory, 'FedACHdir.txt')
+        with open(self.source, 'w') as f:
+            f.write(FEDACH)
+
+        self.path = os.path.join(self.directory, 'routing_directory.bin')
+
+        settings = self.settings(AUTHORIZE_NET_ROUTING_DIRECTORY=self.path)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        routing_directory.clear_routing_directory()
+        self.addCleanup(routing_directory.clear_routing_directory)
+
+    def load(self):
+        out = StringIO()
+        call_command('load_routing_directory', self.source, stdout=out)
+        return out.getvalue()
+
+
+class TestRoutingDirectory(RoutingDirectoryTestCase):
+
+    def test_load(self):
+        self.assertIsNone(routing_directory.get_routing_directory())
+        self.assertIn('Saved 5 routing numbers', self.load())
+
+        directory = routing_directory.get_routing_directory()
+
+        self.assertEqual(len(directory), 5)
+        self.assertEqual(
+            directory.get('114000093'),
+            routing_directory.RoutingEntry(
+                '114000093', 'FROST BANK', routing_directory.ACTIVE, None))
+        self.assertEqual(
+            directory.get('011000015').status,
+            routing_directory.FEDERAL_RESERVE)
+        self.assertEqual(
+            directory.get('021000089'),
+            routing_directory.RoutingEntry(
+                '021000089', 'CITIBANK NA', routing_directory.CHANGED,
+                '021000021'))
+
+        for routing_number in ('122000247', '000000000', '999999999',
+                               '11400009', '11400009x'):
+            with self.subTest(routing_number=routing_number):
+                self.assertIsNone(directory.get(routing_number))
+                self.assertNotIn(routing_number, directory)
+
+    def test_json(self):
+        participants = [
+            {'routingNumber': '114000093', 'recordTypeCode': '1',
+             'newRoutingNumber': '000000000', 'customerName': 'FROST BANK'},
+            {'routingNumber': '021000089', 'recordTypeCode': '2',
+             'newRoutingNumber': '021000021', 'customerName': 'CITIBANK NA'},
+        ]
+
+        with open(self.source, 'w') as f:
+            json.dump({'fedACHParticipants': {
+                'fedACHParticipants': participants}}, f)
+
+        self.load()
+        directory = routing_directory.get_routing_directory()
+
+        self.assertEqual(
+            [directory.get(x['routingNumber']) for x in participants],
+            list(map(routing_directory.RoutingEntry._make, [
+                ('114000093', 'FROST BANK', routing_directory.ACTIVE, None),
+                ('021000089', 'CITIBANK NA', routing_directory.CHANGED,
+                 '021000021')])))
+
+    def test_reload(self):
+        """A directory that is loaded again is mapped again"""
+
+        self.load()
+        self.assertIn(
+            '114000093', routing_directory.get_routing_directory())
+
+        routing_directory.write_directory(
+            routing_directory.read_source(fedach_line('122000247', 'B')),
+            self.path)
+
+        directory = routing_directory.get_routing_directory()
+        self.assertEqual(len(directory), 1)
+        self.assertEqual(directory.get('122000247').bank_name, 'B')
+
+    def test_bad_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'\0' * 64)
+
+        with self.assertRaises(ValueError):
+            routing_directory.get_routing_directory()
+
+    def test_no_path(self):
+        """There is no default path to write the directory to"""
+
+        with self.settings(AUTHORIZE_NET_ROUTING_DIRECTORY=None):
+            with self.assertRaisesMessage(
+                    CommandError, 'AUTHORIZE_NET_ROUTING_DIRECTORY'):
+                self.load()
+
+            self.assertIsNone(routing_directory.get_routing_directory())
+
+        self.assertFalse(os.path.exists(self.path))
+
+
+class TestECheckForm(RoutingDirectoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.load()
+
+    def test_validate_routing_number(self):
+        validators.validate_routing_number('114000093')
+
+        with self.assertRaisesMessage(ValidationError, 'routing number'):
+            validators.validate_routing_number('122000247')
+
+        with self.assertRaisesMessage(ValidationError, '021000021'):
+            validators.validate_routing_number('021000089')
+
+    def test_bank_name(self):
+        data = {'routing_number': '114000093', 'bank_name': ''}
+
+        form = ECheckForm(data)
+        form.is_valid()
+        self.assertEqual(form.cleaned_data['bank_name'], 'FROST BANK')
+
+        form = ECheckForm(dict(data, bank_name='Frost'))
+        form.is_valid()
+        self.assertEqual(form.cleaned_data['bank_name'], 'Frost')
+
+        routing_directory.clear_routing_directory()
+
+        with self.settings(AUTHORIZE_NET_ROUTING_DIRECTORY=self.source + 'x'):
+            form = ECheckForm(data)
+            form.is_valid()
+            self.assertIn('bank_name', form.errors)
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_routing_numbers_valid(self):
+        self.assertEqual(
+            list(validators.routing_numbers_valid([
+                '114000093', '011000015', '021000089', '122000247',
+                '114000094'])),
+            [True, True, False, False, False])
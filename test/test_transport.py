@@ -0,0 +1,51 @@
+import os
+from unittest import mock
+from django.test import SimpleTestCase
+from payment_authorizenet.transport import PooledTransport, sdk_proxies
+
+
+class TestPooledTransport(SimpleTestCase):
+
+    def test_evict_idle(self):
+        transport = PooledTransport(idle_timeout=0)
+
+        with transport.checkout() as session:
+            pass
+
+        with mock.patch.object(session, 'close') as close:
+            with transport.checkout() as replacement:
+                close.assert_called_once_with()
+
+        self.assertIsNot(replacement, session)
+        transport.close()
+
+    def test_no_evict_in_flight(self):
+        """A session in use by another request is neither evicted nor
+        closed under it"""
+
+        transport = PooledTransport(idle_timeout=0)
+
+        with mock.patch('requests.Session.close') as close:
+            with transport.checkout() as session:
+                with transport.checkout() as other:
+                    self.assertIs(other, session)
+
+                transport.close()
+                close.assert_not_called()
+
+            # closed once the last request returns
+            close.assert_called_once_with()
+
+    def test_proxies(self):
+        with mock.patch.dict(
+                os.environ, {'https_proxy': 'http://proxy:3128'}):
+            self.assertEqual(
+                sdk_proxies().get('https'), 'http://proxy:3128')
+
+            transport = PooledTransport()
+
+            with transport.checkout() as session:
+                self.assertEqual(
+                    session.proxies['https'], 'http://proxy:3128')
+
+        transport.close()
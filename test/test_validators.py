@@ -0,0 +1,166 @@
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase, override_settings
+from payment_authorizenet import validators
+from payment_authorizenet.enums import CardBrand
+from payment_authorizenet.forms import CreditCardForm, ECheckForm
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# test numbers published by the card networks and Authorize.net
+CARDS = {
+    '4111111111111111': CardBrand.Visa,
+    '4007000000027': CardBrand.Visa,
+    '5424000000000015': CardBrand.MasterCard,
+    '2223000010309703': CardBrand.MasterCard,
+    '370000000000002': CardBrand.AmericanExpress,
+    '6011000000000012': CardBrand.Discover,
+    '6221260000000000': CardBrand.Discover,
+    '3088000000000017': None,
+    '3566111111111113': CardBrand.JCB,
+    '38000000000006': CardBrand.DinersClub,
+}
+
+ROUTING_NUMBERS = {
+    '114000093': True,
+    '011000015': True,
+    '121042882': True,
+    '114000094': False,
+    '123456789': False,
+    '991000015': False,
+    '11400009': False,
+    '11400009x': False,
+}
+
+
+class TestValidators(SimpleTestCase):
+
+    def test_luhn(self):
+        for number in CARDS:
+            with self.subTest(number=number):
+                self.assertTrue(validators.luhn_valid(number))
+
+        self.assertFalse(validators.luhn_valid('4111111111111112'))
+        self.assertFalse(validators.luhn_valid('4111 1111 1111 1111'))
+        self.assertFalse(validators.luhn_valid(''))
+
+    def test_card_brand(self):
+        for number, brand in CARDS.items():
+            if brand is not None:
+                with self.subTest(number=number):
+                    self.assertEqual(validators.card_brand(number), brand)
+
+        self.assertEqual(
+            validators.card_brand('2720990000000000'), CardBrand.MasterCard)
+        self.assertIsNone(validators.card_brand('2721000000000000'))
+        self.assertIsNone(validators.card_brand('3088000000000017'))
+
+    def test_bin_prefixes(self):
+        self.assertEqual(
+            validators.bin_prefixes('644', '649'),
+            ['644', '645', '646', '647', '648', '649'])
+        self.assertEqual(
+            validators.bin_prefixes('2221', '2720')[-4:],
+            ['26', '270', '271', '2720'])
+
+    def test_routing_number(self):
+        for number, valid in ROUTING_NUMBERS.items():
+            with self.subTest(number=number):
+                self.assertEqual(
+                    validators.routing_number_valid(number), valid)
+
+    def test_validate_card_number(self):
+        validators.validate_card_number('4111111111111111')
+
+        for number in ('4111111111111112', '3088000000000017',
+                       '41111111111111111'):
+            with self.subTest(number=number):
+                with self.assertRaises(ValidationError):
+                    validators.validate_card_number(number)
+
+    @override_settings(AUTHORIZE_NET_CARD_BRANDS=['Visa', 'MasterCard'])
+    def test_allowed_card_brands(self):
+        validators.validate_card_number('5424000000000015')
+
+        with self.assertRaisesMessage(
+                ValidationError, 'American Express cards are not accepted'):
+            validators.validate_card_number('370000000000002')
+
+    def test_form_fields(self):
+        card_number = CreditCardForm.base_fields['credit_card_number']
+        routing_number = ECheckForm.base_fields['routing_number']
+
+        self.assertEqual(
+            card_number.clean('4111111111111111'), '4111111111111111')
+        self.assertEqual(
+            card_number.clean('4111111111111111110'), '4111111111111111110')
+        self.assertEqual(routing_number.clean('114000093'), '114000093')
+
+        with self.assertRaises(ValidationError):
+            card_number.clean('4111111111111112')
+
+        with self.assertRaises(ValidationError):
+            routing_number.clean('114000094')
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class TestBatches(SimpleTestCase):
+    """The batches agree with the checks of single numbers"""
+
+    NUMBERS = list(CARDS) + [
+        '4111111111111112', '41111111111111111', '4111 1111', '', '12',
+        '2721000000000000', '4111111111111111110', '6011000000000000001',
+        '41111111111111111100']
+
+    def test_luhn_valid_many(self):
+        self.assertEqual(
+            list(validators.luhn_valid_many(self.NUMBERS)),
+            [validators.luhn_valid(number) and
+             len(number) <= validators.MAX_CARD_DIGITS
+             for number in self.NUMBERS])
+
+    def test_card_brands(self):
+        expected = []
+
+        for number in self.NUMBERS:
+            brand = validators.card_brand(number)
+            valid = number.isdigit() and \
+                len(number) <= validators.MAX_CARD_DIGITS
+            expected.append(brand.name if brand and valid else '')
+
+        self.assertEqual(
+            list(validators.card_brands(self.NUMBERS)), expected)
+
+    @override_settings(AUTHORIZE_NET_CARD_BRANDS=['Visa', 'Discover'])
+    def test_card_numbers_valid(self):
+        expected = []
+
+        for number in self.NUMBERS:
+            try:
+                validators.validate_card_number(number)
+            except ValidationError:
+                expected.append(False)
+            else:
+                expected.append(True)
+
+        self.assertEqual(
+            list(validators.card_numbers_valid(self.NUMBERS)), expected)
+        self.assertEqual(
+            list(validators.card_numbers_valid(
+                numpy.array([4111111111111111, 5424000000000015,
+                             4111111111111111110]))),
+            [True, False, True])
+
+    def test_routing_numbers_valid(self):
+        self.assertEqual(
+            list(validators.routing_numbers_valid(list(ROUTING_NUMBERS))),
+            list(ROUTING_NUMBERS.values()))
+
+        # integers have lost their leading zeros
+        self.assertEqual(
+            list(validators.routing_numbers_valid(
+                numpy.array([11000015, 114000094]))),
+            [True, False])
@@ -0,0 +1,172 @@
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from io import StringIO
+from payment_authorizenet import views, webhooks
+from payment_authorizenet.models import WebhookNotification
+from unittest import mock
+import datetime
+import json
+
+KEY = 'ABCDEF0123456789'
+
+
+def fail(event):
+    raise RuntimeError('handler failed')
+
+
+def notification(notification_id='d0e8e7fe-c3e7-4add-a480-27bc5ce28e6c',
+                 event_type='net.authorize.customer.paymentProfile.updated'):
+    return json.dumps({
+        'notificationId': notification_id,
+        'eventType': event_type,
+        'eventDate': '2026-10-01T12:00:00.000Z',
+        'webhookId': '3f7c5c9e-2cf4-4c2b-9bbe-0b7d0f9d9e24',
+        'payload': {
+            'customerProfileId': 1500000001,
+            'entityName': 'customerPaymentProfile',
+            'id': '1600000001',
+            'customerType': 'business',
+        },
+    }).encode()
+
+
+@override_settings(AUTHORIZE_NET_KEY=KEY, AUTHORIZE_NET_WEBHOOK_WORKERS=0)
+class TestWebhook(TestCase):
+
+    def setUp(self):
+        self.events = []
+        self.handlers = [self.events.append]
+
+        patcher = mock.patch.object(
+            webhooks, 'get_handlers', return_value=self.handlers)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, body, signature=None):
+        if signature is None:
+            signature = webhooks.sign(body, KEY)
+
+        request = RequestFactory().post(
+            '/webhook/', body, content_type='application/json',
+            HTTP_X_ANET_SIGNATURE=signature)
+        return views.webhook(request)
+
+    def test_webhook(self):
+        """A signed notification is handled once, however often it is
+        sent"""
+
+        body = notification()
+
+        self.assertEqual(self.post(body).status_code, 200)
+        self.assertEqual(self.post(body).status_code, 200)
+
+        self.assertEqual(len(self.events), 1)
+        self.assertEqual(self.events[0].customer_profile_id, 1500000001)
+        self.assertIsNotNone(WebhookNotification.objects.get().handled)
+
+    def test_failed_handler(self):
+        """A failing handler does not stop the others, and leaves the
+        notification to be handled again"""
+
+        self.handlers.insert(0, fail)
+        body = notification()
+
+        with self.assertLogs('payment_authorizenet.webhooks', 'ERROR'):
+            self.assertEqual(self.post(body).status_code, 200)
+
+        self.assertEqual(len(self.events), 1)
+        self.assertIsNone(WebhookNotification.objects.get().handled)
+
+        # not before AUTHORIZE_NET_WEBHOOK_RETRY_AFTER
+        self.post(body)
+        self.assertEqual(len(self.events), 1)
+
+        self.age()
+        self.handlers.remove(fail)
+        self.post(body)
+
+        self.assertEqual(len(self.events), 2)
+        self.assertIsNotNone(WebhookNotification.objects.get().handled)
+
+    def lost(self, body):
+        """Receive a notification in a process that dies before its
+        handlers run"""
+
+        with mock.patch.object(webhooks, 'submit'):
+            self.assertEqual(self.post(body).status_code, 200)
+
+        self.assertIsNone(WebhookNotification.objects.get().handled)
+
+    def age(self):
+        WebhookNotification.objects.update(
+            claimed=timezone.now() - datetime.timedelta(
+                seconds=webhooks.DEFAULT_RETRY_AFTER + 1))
+
+    def test_retry_unhandled(self):
+        """A retry of a notification that was received but never handled
+        is handled"""
+
+        body = notification()
+        self.lost(body)
+
+        # the handlers may still be running
+        self.post(body)
+        self.assertEqual(self.events, [])
+
+        self.age()
+        self.post(body)
+
+        self.assertEqual(len(self.events), 1)
+        self.assertIsNotNone(WebhookNotification.objects.get().handled)
+
+    def test_handle_pending(self):
+        self.lost(notification())
+        self.assertEqual(webhooks.handle_pending(), 0)
+
+        self.age()
+        out = StringIO()
+        call_command('handle_webhooks', stdout=out)
+
+        self.assertIn('Handled 1 webhook notifications', out.getvalue())
+        self.assertEqual(self.events[0].customer_profile_id, 1500000001)
+        self.assertIsNotNone(WebhookNotification.objects.get().handled)
+
+        self.age()
+        self.assertEqual(webhooks.handle_pending(), 0)
+
+    def test_bad_signature(self):
+        body = notification()
+        signature = webhooks.sign(body + b' ', KEY)
+
+        with self.assertLogs('payment_authorizenet.views', 'WARNING'):
+            self.assertEqual(self.post(body, signature).status_code, 403)
+            self.assertEqual(self.post(body, '').status_code, 403)
+
+        self.assertEqual(self.events, [])
+        self.assertFalse(WebhookNotification.objects.exists())
+
+    def test_signature_case(self):
+        """Signatures are compared without regard to case"""
+
+        body = notification()
+        signature = webhooks.sign(body, KEY).lower()
+
+        self.assertTrue(webhooks.verify_signature(body, signature))
+
+    def test_not_a_notification(self):
+        body = b'{"eventType": "net.authorize.customer.created"}'
+        self.assertEqual(self.post(body).status_code, 400)
+
+
+class TestHandlers(TestCase):
+
+    @override_settings(AUTHORIZE_NET_WEBHOOK_HANDLERS=[
+        'payment_authorizenet.webhooks.update_mirror'])
+    def test_handlers_setting(self):
+        self.assertEqual(webhooks.get_handlers(), [webhooks.update_mirror])
+
+    def test_default_handlers(self):
+        self.assertEqual(webhooks.get_handlers(), [
+            webhooks.invalidate_profile_cache, webhooks.update_mirror,
+            webhooks.update_profile_index])
@@ -1,6 +1,8 @@
-import json
-import ssl
-import urllib.request
+from payment_authorizenet.records import Record, boolean, integer, text
+from payment_authorizenet.response_codes import get_response_codes
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class Transaction:
@@ -11,142 +13,167 @@ class Transaction:
     APPROVED = 'Approved'
     CODE = 'code'
 
-    code_ref_url = 'https://developer.authorize.net/api/'\
-                   'reference/dist/json/responseCodes.json'
-
     def __init__(self, response):
         """Pass the response to initialize the Transaction object"""
         super().__init__()
 
-        # default SSL used b/c the certificate is only 128 bit, which throws
-        # this exception if relying on the Authorize.net certificate
-        # urllib.error.URLError: <urlopen error [SSL: CERTIFICATE_VERIFY
-        # _FAILED] certificate verify failed (_ssl.c:748)>
-        # with Python 3.6.5
-
-        ssl._create_default_https_context = ssl._create_unverified_context
-
-        with urllib.request.urlopen(self.code_ref_url) as url:
-            data = json.loads(url.read().decode())
-            approval_dict = list(filter(
-                lambda x: x['code'] == '1', data))
+        # the response code table is bundled with the app and loaded once
+        # per process. See response_codes.py
+        response_codes = get_response_codes()
 
         if response is not None:
 
             self.transaction_response = TransactionResponse(response)
 
             response_code = self.transaction_response.response_code
-            self.approval_code = int(approval_dict[0][self.CODE])
+            self.approval_code = response_codes.approval_code
 
-            if response_code == self.approval_code:
+            if response_codes.is_approved(response_code):
                 self.result = self.APPROVED
             else:
                 self.result = self.FAILURE
-                print('Declined with response code ' + str(response_code))
-
-            print('result is', self.result)
+                logger.info(
+                    'Transaction %s failed with response code %s',
+                    self.transaction_response.transaction_id, response_code,
+                    extra={
+                        'operation': 'createTransaction',
+                        'transaction_id':
+                            self.transaction_response.transaction_id,
+                        'response_code': response_code,
+                        'ref_id': text(getattr(response, 'refId', ''))})
 
         else:
             self.error_code = None
             self.error_text = 'Null response from Authorize.net'
 
+    def as_dict(self):
+        """A copy of this transaction that can be stored as JSON.
+        Transaction.from_dict() turns it back into a Transaction"""
+
+        if not hasattr(self, 'transaction_response'):
+            return {'error_code': self.error_code,
+                    'error_text': self.error_text}
+
+        tr = self.transaction_response
+        transaction_response = tr.as_dict()
+
+        if tr.errors is not None:
+            transaction_response['errors'] = [e.as_dict() for e in tr.errors]
+
+        if tr.profile is not None:
+            transaction_response['profile'] = tr.profile.as_dict()
+
+        return {
+            'result': self.result,
+            'approval_code': self.approval_code,
+            'transaction_response': transaction_response,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        transaction = cls.__new__(cls)
+
+        if 'transaction_response' not in data:
+            transaction.error_code = data['error_code']
+            transaction.error_text = data['error_text']
+            return transaction
+
+        values = dict(data['transaction_response'])
+
+        # stored before response_code was read as an int
+        if values.get('response_code') is not None:
+            values['response_code'] = integer(values['response_code'])
+
+        if values.get('errors') is not None:
+            values['errors'] = tuple(
+                Error.from_values(**e) for e in values['errors'])
+
+        if values.get('profile') is not None:
+            values['profile'] = Profile.from_values(**values['profile'])
+
+        transaction.transaction_response = \
+            TransactionResponse.from_values(**values)
+        transaction.result = data['result']
+        transaction.approval_code = data['approval_code']
+
+        return transaction
 
-class TransactionResponse:
+
+class TransactionResponse(Record):
     """TransactionResponse is a more details view of a Transaction.
     Although the details are related to a Transaction, a design decision
     was made to follow the organization of the Authorize.net API,
     even though it could be improved"""
 
-    # fields are the expected attributes on the response object passed
-    # to __init__
-
-    fields = {
-        'responseCode': 'response_code',
-        'authCode': 'auth_code',
-        'avsResultCode': 'avs_result_code',
-        'cvvResultCode': 'cvv_result_code',
-        'cavv_result_code': 'cavv_result_code',
-        'transId': 'transaction_id',
-        'refTransID': 'reference_transaction_id',
-        'transHash': 'transaction_hash',
-        'testRequest': 'test_request',
-        'accountNumber': 'account_number',
-        'accountType': 'account_type',
-        'transHashSha2': 'transaction_hash_sha2',
-
-    }
+    # fields are the expected attributes on the transactionResponse of
+    # the response passed to __init__
+
+    fields = (
+        ('responseCode', 'response_code', integer),
+        ('authCode', 'auth_code', text),
+        ('avsResultCode', 'avs_result_code', text),
+        ('cvvResultCode', 'cvv_result_code', text),
+        ('cavvResultCode', 'cavv_result_code', text),
+        ('transId', 'transaction_id', text),
+        ('refTransID', 'reference_transaction_id', text),
+        ('transHash', 'transaction_hash', text),
+        ('testRequest', 'test_request', boolean),
+        ('accountNumber', 'account_number', text),
+        ('accountType', 'account_type', text),
+        ('transHashSha2', 'transaction_hash_sha2', text),
+    )
+
+    __slots__ = tuple(name for _, name, _ in fields) + ('errors', 'profile')
 
     def __init__(self, response):
         """Pass the response to initialize the TransactionResponse object"""
-        super().__init__()
 
         tr = response.transactionResponse
+        errors = getattr(tr, 'errors', None)
+        profile = getattr(tr, 'profile', None)
 
-        for k, v in self.fields.items():
-
-            if hasattr(tr, k):
-                setattr(self, v, getattr(tr, k))
-
-        if hasattr(tr, 'errors'):
-            self.errors = [Error(an_error) for an_error in tr.errors]
-        else:
-            self.errors = None
-
-        if hasattr(tr, 'profile'):
-            self.profile = Profile(response)
-        else:
-            self.profile = None
+        self._fill(
+            *self.extract(tr),
+            errors=None if errors is None else tuple(
+                Error(an_error) for an_error in errors.error),
+            profile=None if profile is None else Profile(response))
 
 
-class Error:
+class Error(Record):
     """The organization of the HTML response for errors is messy. The Error
     class organizes the information to make it easier to manipulate"""
 
     # fields are the expected attributes on the response object passed
     # to __init__
 
-    fields = {
-        'errorCode': 'error_code',
-        'errorText': 'error_text'
-    }
+    fields = (
+        ('errorCode', 'error_code', text),
+        ('errorText', 'error_text', text),
+    )
+
+    __slots__ = tuple(name for _, name, _ in fields)
 
     def __init__(self, an_error):
         """Convert the response into a defined object"""
-        for k, v in self.fields.items():
-
-            if hasattr(an_error, k):
-                setattr(self, v, getattr(an_error, k))
+        self._fill(*self.extract(an_error))
 
 
-class Profile:
+class Profile(Record):
     """Pass a resonse variable to pre-load the
     customer and payment profile info related to a Transaction"""
 
-    # fields are the expected attributes on the response object passed
-    # to __init__
+    # fields are the expected attributes on the profile of the response
+    # passed to __init__
 
-    fields = {
-        'customerProfileId': 'customer_profile_id',
-        'customer_payment_profile_id': 'customer_payment_profile_id',
-        'avsResultCode': 'avs_result_code',
-        'cvvResultCode': 'cvv_result_code',
-        'cavv_result_code': 'cavv_result_code',
-        'transId': 'transaction_id',
-        'refTransID': 'reference_transaction_id',
-        'transHash': 'transaction_hash',
-        'testRequest': 'test_request',
-        'accountNumber': 'account_number',
-        'accountType': 'account_type',
-        'transHashSha2': 'transaction_hash_sha2',
-
-    }
+    fields = (
+        ('customerProfileId', 'customer_profile_id', integer),
+        ('customerPaymentProfileId', 'customer_payment_profile_id', integer),
+        ('customerShippingAddressId', 'customer_shipping_address_id',
+         integer),
+    )
+
+    __slots__ = tuple(name for _, name, _ in fields)
 
     def __init__(self, response):
         """Convert response properties into properties on this object"""
-
-        profile = response.transactionResponse.profile
-
-        for k, v in self.fields.items():
-
-            if hasattr(profile, k):
-                setattr(self, v, getattr(profile, k))
+        self._fill(*self.extract(response.transactionResponse.profile))
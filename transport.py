@@ -0,0 +1,555 @@
+import asyncio
+import codecs
+import collections
+import contextlib
+import logging
+import os
+import threading
+import time
+import weakref
+
+from authorizenet import utility
+from authorizenet.constants import constants
+from django.conf import settings
+from django.utils.module_loading import import_string
+from payment_authorizenet import resilience
+from payment_authorizenet.sdk import apicontractsv1
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRANSPORT = 'payment_authorizenet.transport.PooledTransport'
+DEFAULT_POOL_SIZE = 10
+DEFAULT_POOL_IDLE_TIMEOUT = 60  # seconds
+DEFAULT_TIMEOUT = 60  # seconds
+DEFAULT_ASYNC_CONCURRENCY = 100
+CHUNK_SIZE = 64 * 1024  # bytes of a streamed response read at a time
+
+# lxml needs a few bytes to tell the encoding of a document
+HEAD_SIZE = len(codecs.BOM_UTF8) + 4
+
+
+def sdk_proxies():
+    """Return the proxies the SDK's own execute() would use, from its
+    property file or the environment, as {scheme: url}"""
+
+    proxies = {}
+
+    for scheme in ('http', 'https'):
+        url = utility.helper.getproperty(scheme + '_proxy')
+
+        if url:
+            proxies[scheme] = url
+
+    return proxies
+
+
+def decode_body(content):
+    """Strip the byte order mark the gateway sends and decode the body"""
+
+    if content.startswith(codecs.BOM_UTF8):
+        content = content[len(codecs.BOM_UTF8):]
+
+    return content.decode(constants.xml_encoding)
+
+
+class BodyFeed:
+    """Pass the chunks of a response body on to a stream parser's feed(),
+    without the byte order mark the gateway sends"""
+
+    def __init__(self, feed):
+        super().__init__()
+
+        self.feed = feed
+        self._head = b''
+
+    def __call__(self, chunk):
+        if self._head is not None:
+            self._head += chunk
+
+            if len(self._head) < HEAD_SIZE:
+                return
+
+            chunk = self._take_head()
+
+        if chunk:
+            self.feed(chunk)
+
+    def _take_head(self):
+        head, self._head = self._head, None
+
+        if head.startswith(codecs.BOM_UTF8):
+            head = head[len(codecs.BOM_UTF8):]
+
+        return head
+
+    def close(self):
+        """Pass on what is left of a body shorter than HEAD_SIZE"""
+
+        if self._head is not None:
+            head = self._take_head()
+
+            if head:
+                self.feed(head)
+
+
+def parse_stream(controller, parser):
+    """Load the result of a stream parser that has been fed a whole
+    response onto the controller"""
+
+    controller._httpResponse = None
+    controller.afterexecute()
+    controller._mainObject = parser.close()
+
+    return controller.getresponse()
+
+
+def parse_response(controller, text):
+    """Load the text of a gateway response onto the controller the same way
+    the SDK's execute() does, so controller.getresponse() keeps working.
+    A controller with a stream_parser, such as that of
+    profile_parser.py, is given that parser's result instead"""
+    from lxml import objectify
+
+    stream_parser = getattr(controller, 'stream_parser', None)
+
+    if stream_parser is not None:
+        parser = stream_parser()
+        parser.feed(text)
+        return parse_stream(controller, parser)
+
+    controller._httpResponse = text
+    controller.afterexecute()
+
+    try:
+        controller._response = apicontractsv1.CreateFromDocument(
+            controller._httpResponse)
+        xmlResponse = controller._response.toxml(
+            encoding=constants.xml_encoding,
+            element_name=controller.getrequesttype())
+        xmlResponse = xmlResponse.replace(constants.nsNamespace1, b'')
+        xmlResponse = xmlResponse.replace(constants.nsNamespace2, b'')
+        controller._mainObject = objectify.fromstring(xmlResponse)
+    except Exception as err:
+        logger.debug('Falling back to objectify for the response: %s', err)
+        # objectify fails if the encoding attribute is present
+        responseString = controller._httpResponse.replace(
+            'encoding="utf-8"', '')
+        controller._mainObject = objectify.fromstring(responseString)
+
+    return controller.getresponse()
+
+
+class Transport:
+    """Sends a controller's request to the gateway and loads the response
+    back onto the controller.
+
+    Subclasses implement post(), which receives the serialized XML request
+    and returns the response body as text, or None if the gateway could
+    not be reached. A controller with a stream_parser, a class with feed()
+    and close() such as profile_parser.CustomerProfileParser, is sent with
+    post_stream() instead, which subclasses can implement to feed the
+    parser the body as it arrives"""
+
+    def execute(self, controller, post_url):
+        """Execute a controller against post_url and return its response"""
+
+        controller.beforeexecute()
+        controller.setClientId()
+        xmlRequest = controller.buildrequest()
+
+        stream_parser = getattr(controller, 'stream_parser', None)
+
+        if stream_parser is not None:
+            parser = stream_parser()
+
+            if not self.post_stream(post_url, xmlRequest, parser.feed):
+                return None
+
+            return parse_stream(controller, parser)
+
+        text = self.post(post_url, xmlRequest)
+
+        if text is None:
+            return None
+
+        return parse_response(controller, text)
+
+    def post(self, post_url, data):
+        raise NotImplementedError
+
+    def post_stream(self, post_url, data, feed):
+        """Pass the response body to feed(), and return False if the
+        gateway could not be reached. This one buffers the whole body"""
+
+        text = self.post(post_url, data)
+
+        if text is None:
+            return False
+
+        feed(text)
+        return True
+
+    def close(self):
+        """Release any resources held by the transport"""
+        pass
+
+
+class SDKTransport(Transport):
+    """Use the SDK's own execute(), which opens a new connection for
+    every call. Kept for comparison and as a fallback"""
+
+    def execute(self, controller, post_url):
+        controller.setenvironment(post_url)
+        controller.execute()
+
+        return controller.getresponse()
+
+
+class PooledTransport(Transport):
+    """Keep-alive connections to the gateway, shared by every controller
+    in the process.
+
+    The pool is thread safe. Connections that sit unused for longer than
+    idle_timeout are dropped before the next request, because the gateway
+    closes idle connections on its side and a stale socket costs a failed
+    request. A session is never closed under a request still using it"""
+
+    def __init__(
+            self,
+            pool_size=DEFAULT_POOL_SIZE,
+            idle_timeout=DEFAULT_POOL_IDLE_TIMEOUT,
+            timeout=DEFAULT_TIMEOUT):
+        super().__init__()
+
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.proxies = sdk_proxies()
+
+        self._lock = threading.Lock()
+        self._session = None
+        self._last_used = 0
+        # session -> requests in flight on it
+        self._in_use = collections.Counter()
+
+    def _make_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.pool_size,
+            pool_block=True)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update(constants.headers)
+        session.proxies.update(self.proxies)
+
+        return session
+
+    def _retire(self, session):
+        """Close a session that is no longer shared, or leave it to the
+        last request in flight on it. Call with the lock held"""
+
+        if not self._in_use[session]:
+            del self._in_use[session]
+            session.close()
+
+    @contextlib.contextmanager
+    def checkout(self):
+        """Use the shared session for one request, replacing it first if
+        it has been idle"""
+
+        with self._lock:
+            now = time.monotonic()
+
+            if (self._session is not None and self.idle_timeout is not None
+                    and not self._in_use[self._session]
+                    and now - self._last_used > self.idle_timeout):
+                logger.debug('Evicting idle gateway connections')
+                self._retire(self._session)
+                self._session = None
+
+            if self._session is None:
+                self._session = self._make_session()
+
+            session = self._session
+            self._in_use[session] += 1
+            self._last_used = now
+
+        try:
+            yield session
+        finally:
+            with self._lock:
+                self._in_use[session] -= 1
+
+                if session is self._session:
+                    self._last_used = time.monotonic()
+                else:
+                    self._retire(session)
+
+    def post(self, post_url, data):
+        import requests
+
+        try:
+            with self.checkout() as session:
+                httpResponse = session.post(
+                    post_url, data=data,
+                    timeout=resilience.time_left(self.timeout))
+        except requests.RequestException as err:
+            logger.error('Error posting to %s: %s', post_url, err)
+            return None
+
+        if not httpResponse.ok:
+            logger.error(
+                'Gateway returned HTTP %s from %s',
+                httpResponse.status_code, post_url)
+            return None
+
+        return decode_body(httpResponse.content)
+
+    def post_stream(self, post_url, data, feed):
+        """Feed the response body to the parser CHUNK_SIZE bytes at a time
+        as it arrives"""
+        import requests
+
+        body = BodyFeed(feed)
+
+        try:
+            with self.checkout() as session, session.post(
+                    post_url, data=data, stream=True,
+                    timeout=resilience.time_left(self.timeout)) \
+                    as httpResponse:
+                if not httpResponse.ok:
+                    logger.error(
+                        'Gateway returned HTTP %s from %s',
+                        httpResponse.status_code, post_url)
+                    return False
+
+                for chunk in httpResponse.iter_content(CHUNK_SIZE):
+                    body(chunk)
+        except requests.RequestException as err:
+            logger.error('Error posting to %s: %s', post_url, err)
+            return False
+
+        body.close()
+        return True
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._retire(self._session)
+                self._session = None
+
+
+class AsyncTransport:
+    """The asyncio counterpart of PooledTransport, built on aiohttp.
+
+    Each event loop gets its own client session and a semaphore that caps
+    how many gateway calls the loop has in flight at once"""
+
+    def __init__(
+            self,
+            concurrency=DEFAULT_ASYNC_CONCURRENCY,
+            idle_timeout=DEFAULT_POOL_IDLE_TIMEOUT,
+            timeout=DEFAULT_TIMEOUT):
+        super().__init__()
+
+        try:
+            import aiohttp
+        except ImportError:
+            msg = 'aiohttp must be installed to use AsyncCustomerProfile'
+            raise ImportError(msg)
+
+        self.aiohttp = aiohttp
+        self.concurrency = concurrency
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.proxies = sdk_proxies()
+
+        # event loop -> (session, semaphore)
+        self._loops = weakref.WeakKeyDictionary()
+
+    def _get_loop_state(self):
+        loop = asyncio.get_event_loop()
+        state = self._loops.get(loop)
+
+        if state is None or state[0].closed:
+            connector = self.aiohttp.TCPConnector(
+                limit=self.concurrency,
+                keepalive_timeout=self.idle_timeout)
+            session = self.aiohttp.ClientSession(
+                connector=connector,
+                headers=constants.headers,
+                timeout=self.aiohttp.ClientTimeout(total=self.timeout))
+            state = (session, asyncio.Semaphore(self.concurrency))
+            self._loops[loop] = state
+
+        return state
+
+    def _request_options(self, post_url):
+        return {
+            'timeout': self.aiohttp.ClientTimeout(
+                total=resilience.time_left(self.timeout)),
+            'proxy': self.proxies.get(post_url.split(':', 1)[0]),
+        }
+
+    async def execute(self, controller, post_url):
+        """Execute a controller against post_url and return its response"""
+
+        controller.beforeexecute()
+        controller.setClientId()
+        xmlRequest = controller.buildrequest()
+
+        stream_parser = getattr(controller, 'stream_parser', None)
+
+        if stream_parser is not None:
+            parser = stream_parser()
+
+            if not await self.post_stream(post_url, xmlRequest, parser.feed):
+                return None
+
+            return parse_stream(controller, parser)
+
+        text = await self.post(post_url, xmlRequest)
+
+        if text is None:
+            return None
+
+        return parse_response(controller, text)
+
+    async def post(self, post_url, data):
+        session, semaphore = self._get_loop_state()
+
+        async with semaphore:
+            try:
+                async with session.post(
+                        post_url, data=data,
+                        **self._request_options(post_url)) as httpResponse:
+                    if httpResponse.status >= 400:
+                        logger.error(
+                            'Gateway returned HTTP %s from %s',
+                            httpResponse.status, post_url)
+                        return None
+
+                    content = await httpResponse.read()
+            except (self.aiohttp.ClientError, asyncio.TimeoutError) as err:
+                logger.error('Error posting to %s: %s', post_url, err)
+                return None
+
+        return decode_body(content)
+
+    async def post_stream(self, post_url, data, feed):
+        """See PooledTransport.post_stream"""
+
+        session, semaphore = self._get_loop_state()
+        body = BodyFeed(feed)
+
+        async with semaphore:
+            try:
+                async with session.post(
+                        post_url, data=data,
+                        **self._request_options(post_url)) as httpResponse:
+                    if httpResponse.status >= 400:
+                        logger.error(
+                            'Gateway returned HTTP %s from %s',
+                            httpResponse.status, post_url)
+                        return False
+
+                    async for chunk in httpResponse.content.iter_chunked(
+                            CHUNK_SIZE):
+                        body(chunk)
+            except (self.aiohttp.ClientError, asyncio.TimeoutError) as err:
+                logger.error('Error posting to %s: %s', post_url, err)
+                return False
+
+        body.close()
+        return True
+
+    async def close(self):
+        """Close the session of the running event loop"""
+
+        state = self._loops.pop(asyncio.get_event_loop(), None)
+
+        if state is not None:
+            await state[0].close()
+
+
+_transport = None
+_transport_pid = None
+_transport_lock = threading.Lock()
+
+
+def make_transport():
+    """Build the transport named by AUTHORIZE_NET_TRANSPORT"""
+
+    path = getattr(settings, 'AUTHORIZE_NET_TRANSPORT', DEFAULT_TRANSPORT)
+    transport_class = import_string(path)
+
+    if issubclass(transport_class, PooledTransport):
+        return transport_class(
+            pool_size=getattr(
+                settings, 'AUTHORIZE_NET_POOL_SIZE', DEFAULT_POOL_SIZE),
+            idle_timeout=getattr(
+                settings, 'AUTHORIZE_NET_POOL_IDLE_TIMEOUT',
+                DEFAULT_POOL_IDLE_TIMEOUT),
+            timeout=getattr(
+                settings, 'AUTHORIZE_NET_TIMEOUT', DEFAULT_TIMEOUT))
+
+    return transport_class()
+
+
+def get_transport():
+    """Return the transport shared by this process.
+    A forked worker builds its own instead of reusing its parent's sockets"""
+    global _transport, _transport_pid
+
+    pid = os.getpid()
+
+    if _transport is None or _transport_pid != pid:
+        with _transport_lock:
+            if _transport is None or _transport_pid != pid:
+                _transport = make_transport()
+                _transport_pid = pid
+
+    return _transport
+
+
+_async_transport = None
+_async_transport_pid = None
+
+
+def get_async_transport():
+    """Return the AsyncTransport shared by this process"""
+    global _async_transport, _async_transport_pid
+
+    pid = os.getpid()
+
+    if _async_transport is None or _async_transport_pid != pid:
+        with _transport_lock:
+            if _async_transport is None or _async_transport_pid != pid:
+                _async_transport = AsyncTransport(
+                    concurrency=getattr(
+                        settings, 'AUTHORIZE_NET_ASYNC_CONCURRENCY',
+                        DEFAULT_ASYNC_CONCURRENCY),
+                    idle_timeout=getattr(
+                        settings, 'AUTHORIZE_NET_POOL_IDLE_TIMEOUT',
+                        DEFAULT_POOL_IDLE_TIMEOUT),
+                    timeout=getattr(
+                        settings, 'AUTHORIZE_NET_TIMEOUT', DEFAULT_TIMEOUT))
+                _async_transport_pid = pid
+
+    return _async_transport
+
+
+def reset_transport():
+    """Close the shared transport. The next call builds a new one"""
+    global _transport, _transport_pid
+
+    with _transport_lock:
+        if _transport is not None and _transport_pid == os.getpid():
+            _transport.close()
+
+        _transport = None
+        _transport_pid = None
@@ -0,0 +1,8 @@
+from django.urls import path
+from payment_authorizenet import views
+
+app_name = 'payment_authorizenet'
+
+urlpatterns = [
+    path('webhook/', views.webhook, name='webhook'),
+]
@@ -1,2 +1,397 @@
-# Validate the input of forms
+"""Check card and routing numbers before they are sent to Authorize.net.
 
+A mistyped card or routing number otherwise costs a liveMode validation
+call just to be declined. The checks here are the ones the networks build
+into the numbers themselves:
+
+- card numbers end in a Luhn check digit
+- the first digits of a card number (its BIN) name its brand, and each
+  brand issues numbers of only some lengths
+- the digits of an ABA routing number, weighted 3, 7, 1, sum to a
+  multiple of 10, and its first two digits fall in assigned ranges. When
+  the Fed's routing directory has been loaded, it must be listed there
+  too. See routing_directory.py
+
+Brands not listed in AUTHORIZE_NET_CARD_BRANDS, a list of CardBrand names,
+are refused. By default every brand is accepted.
+
+validate_card_number() and validate_routing_number() are Django
+validators. For bulk imports, luhn_valid_many(), card_brands(),
+card_numbers_valid() and routing_numbers_valid() check whole arrays of
+numbers at once with numpy, which must be installed to use them."""
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils.translation import gettext_lazy as _
+from payment_authorizenet import constants
+from payment_authorizenet.enums import CardBrand
+from payment_authorizenet.routing_directory import (
+    CHANGED,
+    get_routing_directory)
+import re
+
+DIGITS = re.compile('[0-9]+')
+
+# the digit that replaces each digit doubled by the Luhn check
+LUHN_DOUBLED = (0, 2, 4, 6, 8, 1, 3, 5, 7, 9)
+
+# (brand, first BIN prefix, last BIN prefix). The prefixes of a range
+# have the same length
+BIN_RANGES = (
+    (CardBrand.Visa, '4', '4'),
+    (CardBrand.MasterCard, '51', '55'),
+    (CardBrand.MasterCard, '2221', '2720'),
+    (CardBrand.AmericanExpress, '34', '34'),
+    (CardBrand.AmericanExpress, '37', '37'),
+    (CardBrand.Discover, '6011', '6011'),
+    (CardBrand.Discover, '622126', '622925'),
+    (CardBrand.Discover, '644', '649'),
+    (CardBrand.Discover, '65', '65'),
+    (CardBrand.JCB, '3528', '3589'),
+    (CardBrand.DinersClub, '300', '305'),
+    (CardBrand.DinersClub, '3095', '3095'),
+    (CardBrand.DinersClub, '36', '36'),
+    (CardBrand.DinersClub, '38', '39'),
+)
+
+CARD_LENGTHS = {
+    CardBrand.Visa: (13, 16, 19),
+    CardBrand.MasterCard: (16,),
+    CardBrand.AmericanExpress: (15,),
+    CardBrand.Discover: (16, 19),
+    CardBrand.JCB: (16, 19),
+    CardBrand.DinersClub: (14, 16),
+}
+
+# the longest number of any brand, and the width of the batch checks
+MAX_CARD_DIGITS = max(max(lengths) for lengths in CARD_LENGTHS.values())
+
+BIN_DIGITS = 6
+
+# weights of the digits of a routing number in its checksum
+ABA_WEIGHTS = (3, 7, 1, 3, 7, 1, 3, 7, 1)
+
+# the first two digits of routing numbers: Federal Reserve districts,
+# thrift institutions, electronic transactions and traveler's checks
+ABA_PREFIXES = frozenset(
+    ['{:02}'.format(x) for x in range(0, 13)] +
+    [str(x) for x in range(21, 33)] +
+    [str(x) for x in range(61, 73)] +
+    ['80'])
+
+
+def allowed_card_brands():
+    """The CardBrands named by AUTHORIZE_NET_CARD_BRANDS, or every brand"""
+
+    names = getattr(settings, 'AUTHORIZE_NET_CARD_BRANDS', None)
+
+    if names is None:
+        return tuple(CardBrand)
+
+    return tuple(CardBrand[name] for name in names)
+
+
+# ****************** BIN trie
+
+def bin_prefixes(first, last):
+    """Return the fewest prefixes that together start exactly the numbers
+    from first to last, such as ['2221', ..., '23', ..., '2720'] for
+    '2221' to '2720'"""
+
+    width = len(first)
+    low = int(first)
+    high = int(last)
+    prefixes = []
+
+    while low <= high:
+        # the largest block of numbers aligned on low that fits
+        size = 1
+        while low % (size * 10) == 0 and low + size * 10 - 1 <= high:
+            size *= 10
+
+        digits = width - len(str(size)) + 1
+        prefixes.append('{:0{}}'.format(low, width)[:digits])
+        low += size
+
+    return prefixes
+
+
+def build_bin_trie(ranges=BIN_RANGES):
+    """Return a trie of nested dicts keyed by digit. The node that ends a
+    prefix holds its brand under None"""
+
+    trie = {}
+
+    for brand, first, last in ranges:
+        for prefix in bin_prefixes(first, last):
+            node = trie
+            for digit in prefix:
+                node = node.setdefault(digit, {})
+            node[None] = brand
+
+    return trie
+
+
+BIN_TRIE = build_bin_trie()
+
+
+# ****************** Checks
+
+def luhn_valid(number):
+    """True if a string of digits ends in a valid Luhn check digit"""
+
+    if not DIGITS.fullmatch(number):
+        return False
+
+    total = 0
+
+    # every second digit from the right is doubled
+    for position, digit in enumerate(reversed(number)):
+        digit = ord(digit) - 48
+        total += LUHN_DOUBLED[digit] if position % 2 else digit
+
+    return total % 10 == 0
+
+
+def card_brand(number):
+    """Return the CardBrand of a card number, or None"""
+
+    node = BIN_TRIE
+
+    for digit in number[:BIN_DIGITS]:
+        node = node.get(digit)
+
+        if node is None:
+            return None
+
+        if None in node:
+            return node[None]
+
+    return None
+
+
+def routing_number_valid(routing_number):
+    """True if a routing number passes the ABA checksum"""
+
+    if len(routing_number) != constants.ABA_DIGITS or \
+            not DIGITS.fullmatch(routing_number) or \
+            routing_number[:2] not in ABA_PREFIXES:
+        return False
+
+    total = sum(
+        weight * (ord(digit) - 48)
+        for weight, digit in zip(ABA_WEIGHTS, routing_number))
+
+    return total % 10 == 0
+
+
+# ****************** Validators
+
+def validate_card_number(value):
+    """Confirm that a card number could have been issued, and is of a
+    brand in AUTHORIZE_NET_CARD_BRANDS. The number is never repeated in
+    the error, so it can't end up in logs"""
+
+    if not luhn_valid(value):
+        raise ValidationError(
+            _('Enter a valid card number'), code='invalid_card_number')
+
+    brand = card_brand(value)
+
+    if brand is None or len(value) not in CARD_LENGTHS[brand]:
+        raise ValidationError(
+            _('Enter a valid card number'), code='invalid_card_number')
+
+    if brand not in allowed_card_brands():
+        raise ValidationError(
+            _('%(brand)s cards are not accepted'),
+            code='card_brand_not_accepted',
+            params={'brand': brand.value})
+
+
+def validate_routing_number(value):
+    """Confirm that a routing number passes the ABA checksum and, if a
+    routing directory has been loaded, that it is in use"""
+
+    if not routing_number_valid(value):
+        raise ValidationError(
+            _('%(value)s is not a valid routing number'),
+            code='invalid_routing_number',
+            params={'value': value})
+
+    directory = get_routing_directory()
+
+    if directory is None:
+        return
+
+    entry = directory.get(value)
+
+    if entry is None:
+        raise ValidationError(
+            _('%(value)s is not the routing number of a US bank'),
+            code='unknown_routing_number',
+            params={'value': value})
+
+    if entry.status == CHANGED:
+        raise ValidationError(
+            _('%(value)s has been replaced by %(new_routing_number)s'),
+            code='changed_routing_number',
+            params={
+                'value': value,
+                'new_routing_number': entry.new_routing_number})
+
+
+# ****************** Batches
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        msg = 'numpy must be installed to validate numbers in batches'
+        raise ImportError(msg)
+
+    return numpy
+
+
+def _digits(numbers, width, zero_pad=False):
+    """Return (digits, lengths, ok) for an array of numbers: the digits as
+    an int matrix of width columns, left aligned, the length of each
+    number, and whether it is made of at most width digits. Integers are
+    taken as their decimal digits, padded with zeros to width when
+    zero_pad is True"""
+
+    np = _numpy()
+    numbers = np.asarray(numbers)
+
+    if numbers.ndim != 1:
+        numbers = numbers.reshape(-1)
+
+    if numbers.dtype.kind in 'iu':
+        numbers = numbers.astype('U{}'.format(width + 1))
+
+        if zero_pad:
+            numbers = np.char.zfill(numbers, width)
+
+    # one column more than width, so longer numbers aren't cut to fit
+    codes = numbers.astype('U{}'.format(width + 1)).view(np.uint32)
+    codes = codes.reshape(len(numbers), width + 1).astype(np.int64)
+
+    lengths = np.count_nonzero(codes, axis=1)
+    present = np.arange(width + 1) < lengths[:, None]
+    is_digit = (codes >= 48) & (codes <= 57)
+
+    ok = (is_digit == present).all(axis=1) & (lengths > 0) & \
+        (lengths <= width)
+    digits = np.where(is_digit, codes - 48, 0)[:, :width]
+
+    return digits, lengths, ok
+
+
+def _luhn(np, digits, lengths):
+    from_right = lengths[:, None] - 1 - np.arange(digits.shape[1])
+    doubled = (from_right >= 0) & (from_right % 2 == 1)
+    values = np.where(
+        doubled, np.asarray(LUHN_DOUBLED)[digits], digits)
+
+    return values.sum(axis=1) % 10 == 0
+
+
+def _bin_table(np):
+    """The BIN ranges as sorted arrays of the first and last BIN, and the
+    index in CardBrand of the brand of each range"""
+
+    rows = sorted(
+        (int(prefix.ljust(BIN_DIGITS, '0')),
+         int(prefix.ljust(BIN_DIGITS, '9')),
+         list(CardBrand).index(brand))
+        for brand, first, last in BIN_RANGES
+        for prefix in bin_prefixes(first, last))
+
+    return tuple(np.array(column) for column in zip(*rows))
+
+
+def _brand_indexes(np, digits, lengths):
+    """The index in CardBrand of the brand of each number, or -1"""
+
+    firsts, lasts, brands = _bin_table(np)
+
+    bins = digits[:, :BIN_DIGITS] @ \
+        10 ** np.arange(BIN_DIGITS - 1, -1, -1)
+
+    found = np.searchsorted(firsts, bins, side='right') - 1
+    indexes = np.where(
+        (found >= 0) & (bins <= lasts[found]) & (lengths >= BIN_DIGITS),
+        brands[found], -1)
+
+    return indexes
+
+
+def luhn_valid_many(numbers):
+    """luhn_valid() of every number of an array, as a bool array.
+    Numbers longer than MAX_CARD_DIGITS are not valid"""
+
+    np = _numpy()
+    digits, lengths, ok = _digits(numbers, MAX_CARD_DIGITS)
+
+    return ok & _luhn(np, digits, lengths)
+
+
+def card_brands(numbers):
+    """The name of the CardBrand of every number of an array, or '' when
+    there is none, as a str array"""
+
+    np = _numpy()
+    digits, lengths, ok = _digits(numbers, MAX_CARD_DIGITS)
+
+    names = np.array([brand.name for brand in CardBrand] + [''])
+    indexes = np.where(ok, _brand_indexes(np, digits, lengths), -1)
+
+    return names[indexes]
+
+
+def card_numbers_valid(numbers):
+    """Whether validate_card_number() accepts every number of an array,
+    as a bool array"""
+
+    np = _numpy()
+    width = MAX_CARD_DIGITS
+    digits, lengths, ok = _digits(numbers, width)
+
+    # accepted[brand index, length]. The last row is for no brand
+    accepted = np.zeros((len(CardBrand) + 1, width + 2), dtype=bool)
+    allowed = allowed_card_brands()
+
+    for index, brand in enumerate(CardBrand):
+        if brand in allowed:
+            accepted[index, list(CARD_LENGTHS[brand])] = True
+
+    indexes = _brand_indexes(np, digits, lengths)
+
+    return ok & _luhn(np, digits, lengths) & \
+        accepted[indexes, np.minimum(lengths, width + 1)]
+
+
+def routing_numbers_valid(numbers):
+    """Whether validate_routing_number() accepts every number of an
+    array, as a bool array. Integers are taken to have lost their leading
+    zeros"""
+
+    np = _numpy()
+    width = constants.ABA_DIGITS
+    digits, lengths, ok = _digits(numbers, width, zero_pad=True)
+
+    prefixes = np.zeros(100, dtype=bool)
+    prefixes[[int(prefix) for prefix in ABA_PREFIXES]] = True
+
+    checksum = digits @ np.array(ABA_WEIGHTS) % 10 == 0
+
+    valid = ok & (lengths == width) & checksum & \
+        prefixes[digits[:, 0] * 10 + digits[:, 1]]
+
+    directory = get_routing_directory()
+
+    if directory is not None:
+        valid &= directory.usable_many(
+            digits @ 10 ** np.arange(width - 1, -1, -1))
+
+    return valid
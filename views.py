@@ -1,3 +1,74 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseForbidden)
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from payment_authorizenet import webhooks
+from payment_authorizenet.metrics import get_metrics_sink
+import hmac
+import json
+import logging
 
-# Create your views here.
\ No newline at end of file
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def may_read_metrics(request):
+    """Is the request from a staff user, or does it carry
+    AUTHORIZE_NET_METRICS_TOKEN as a bearer token?"""
+
+    token = getattr(settings, 'AUTHORIZE_NET_METRICS_TOKEN', None)
+    scheme, _, credentials = request.META.get(
+        'HTTP_AUTHORIZATION', '').partition(' ')
+
+    if token and scheme.lower() == 'bearer' and hmac.compare_digest(
+            credentials.strip().encode(), token.encode()):
+        return True
+
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_active and user.is_staff)
+
+
+def metrics(request):
+    """Gateway call metrics in the Prometheus text format, for staff users
+    and requests with the AUTHORIZE_NET_METRICS_TOKEN bearer token.
+    Only sinks with a render() method, such as InMemorySink, can be
+    exposed. Served by metrics_urls, not by the public urls"""
+
+    if not may_read_metrics(request):
+        return HttpResponseForbidden('Not allowed to read metrics')
+
+    sink = get_metrics_sink()
+
+    if not hasattr(sink, 'render'):
+        raise Http404('The metrics sink can not be rendered')
+
+    return HttpResponse(sink.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@csrf_exempt
+@require_POST
+def webhook(request):
+    """Receive a webhook notification from Authorize.net. Point a webhook
+    of the merchant interface at this URL. See webhooks.py"""
+
+    signature = request.META.get(webhooks.SIGNATURE_HEADER)
+
+    if not webhooks.verify_signature(request.body, signature):
+        logger.warning('Rejected a webhook with a bad signature',
+                       extra={'operation': 'webhook'})
+        return HttpResponseForbidden('Bad signature')
+
+    try:
+        event = webhooks.WebhookEvent(json.loads(request.body))
+    except (ValueError, KeyError, TypeError):
+        return HttpResponseBadRequest('Not a webhook notification')
+
+    if webhooks.record(event):
+        webhooks.submit(event)
+
+    return HttpResponse(status=200)
@@ -0,0 +1,327 @@
+"""Receive Authorize.net webhook notifications.
+
+views.webhook checks the X-ANET-Signature header of every notification, an
+HMAC-SHA512 of the body keyed with AUTHORIZE_NET_KEY (the Signature Key
+of the merchant interface), in constant time. Each notification is
+recorded in WebhookNotification, so the retries Authorize.net sends are
+acknowledged without being handled twice.
+
+The view answers 200 straight away and passes the WebhookEvent to the
+handlers on a background thread. A notification is only marked handled
+once they all return without raising. If one raises, or the process dies
+before that, the notification is still on record: a retry of it, or
+handle_pending() run by
+
+    python manage.py handle_webhooks
+
+passes it to the handlers again once AUTHORIZE_NET_WEBHOOK_RETRY_AFTER
+seconds (default 300) have gone by. Handlers may see a notification more
+than once, so they should be idempotent. Handlers are callables that take
+the event, listed by dotted path in AUTHORIZE_NET_WEBHOOK_HANDLERS:
+
+    AUTHORIZE_NET_WEBHOOK_HANDLERS = [
+        'payment_authorizenet.webhooks.invalidate_profile_cache',
+        'payment_authorizenet.webhooks.update_mirror',
+        'billing.webhooks.record_settlement',
+    ]
+
+Set AUTHORIZE_NET_WEBHOOK_WORKERS to 0 to run the handlers before the view
+answers instead."""
+
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import IntegrityError, connections, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from payment_authorizenet import mirror, profile_index
+from payment_authorizenet.customer_profile import fetch_customer_profile
+from payment_authorizenet.models import WebhookNotification
+from payment_authorizenet.profile_cache import invalidate_customer_profile
+import datetime
+import hashlib
+import hmac
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = 'HTTP_X_ANET_SIGNATURE'
+SIGNATURE_PREFIX = 'sha512='
+
+DEFAULT_HANDLERS = (
+    'payment_authorizenet.webhooks.invalidate_profile_cache',
+    'payment_authorizenet.webhooks.update_mirror',
+    'payment_authorizenet.webhooks.update_profile_index',
+)
+DEFAULT_WORKERS = 2
+DEFAULT_RETRY_AFTER = 300  # seconds
+
+WEBHOOK_SETTINGS = (
+    'AUTHORIZE_NET_WEBHOOK_HANDLERS',
+    'AUTHORIZE_NET_WEBHOOK_WORKERS',
+)
+
+# entityName of the payloads of customer profile events
+CUSTOMER_PROFILE = 'customerProfile'
+PAYMENT_PROFILE = 'customerPaymentProfile'
+
+
+def sign(body, key):
+    """Return the X-ANET-Signature value of a body"""
+
+    digest = hmac.new(key.encode(), body, hashlib.sha512).hexdigest()
+    return SIGNATURE_PREFIX + digest.upper()
+
+
+def verify_signature(body, signature, key=None):
+    """Is signature the X-ANET-Signature of body? Compared in constant time"""
+
+    key = key or getattr(settings, 'AUTHORIZE_NET_KEY', None)
+
+    if not key or not signature:
+        return False
+
+    # the header is sha512= and the digest in upper case hex
+    return hmac.compare_digest(
+        sign(body, key).upper().encode(), signature.strip().upper().encode())
+
+
+class WebhookEvent:
+    """One webhook notification"""
+
+    def __init__(self, data):
+        """Pass the decoded JSON body of the notification"""
+        super().__init__()
+
+        self.data = data
+        self.notification_id = data['notificationId']
+        self.event_type = data['eventType']
+        self.event_date = data.get('eventDate')
+        self.webhook_id = data.get('webhookId')
+        self.payload = data.get('payload') or {}
+
+    @property
+    def entity_name(self):
+        """Such as 'transaction' or 'customerProfile'"""
+        return self.payload.get('entityName')
+
+    @property
+    def entity_id(self):
+        return self.payload.get('id')
+
+    @property
+    def customer_profile_id(self):
+        """The customer profile a profile event is about, or None"""
+
+        if self.entity_name == CUSTOMER_PROFILE:
+            return int(self.entity_id)
+
+        if self.entity_name == PAYMENT_PROFILE and \
+                self.payload.get('customerProfileId'):
+            return int(self.payload['customerProfileId'])
+
+        return None
+
+    @property
+    def deleted(self):
+        return self.event_type.endswith('.deleted')
+
+    def __str__(self):
+        return '{} {}'.format(self.event_type, self.notification_id)
+
+
+def _retry_cutoff():
+    retry_after = getattr(
+        settings, 'AUTHORIZE_NET_WEBHOOK_RETRY_AFTER', DEFAULT_RETRY_AFTER)
+    return timezone.now() - datetime.timedelta(seconds=retry_after)
+
+
+def claim(notification_id):
+    """Take over a notification that was received but not handled within
+    AUTHORIZE_NET_WEBHOOK_RETRY_AFTER seconds. Return True if this caller
+    is to hand it to the handlers again"""
+
+    return WebhookNotification.objects.filter(
+        notification_id=notification_id,
+        handled__isnull=True,
+        claimed__lt=_retry_cutoff()).update(claimed=timezone.now()) == 1
+
+
+def record(event):
+    """Record a notification and return True if it is to be handled:
+    it is new, or it was received before but never handled. Return False
+    for a notification that was handled or is being handled"""
+
+    try:
+        with transaction.atomic():
+            WebhookNotification.objects.create(
+                notification_id=event.notification_id,
+                event_type=event.event_type,
+                body=json.dumps(event.data),
+                claimed=timezone.now())
+    except IntegrityError:
+        if claim(event.notification_id):
+            logger.info('Handling webhook %s again', event, extra={
+                'operation': 'webhook', 'event_type': event.event_type})
+            return True
+
+        logger.debug('Ignoring repeated webhook %s', event, extra={
+            'operation': 'webhook', 'event_type': event.event_type})
+        return False
+
+    return True
+
+
+def handle_pending():
+    """Pass the notifications that were received but not handled within
+    AUTHORIZE_NET_WEBHOOK_RETRY_AFTER seconds to the handlers again, and
+    return how many were"""
+
+    handled = 0
+
+    for notification_id, body in WebhookNotification.objects.filter(
+            handled__isnull=True, claimed__lt=_retry_cutoff()).order_by(
+            'received').values_list('notification_id', 'body').iterator():
+        if not body or not claim(notification_id):
+            continue
+
+        event = WebhookEvent(json.loads(body))
+        logger.info('Handling webhook %s again', event, extra={
+            'operation': 'webhook', 'event_type': event.event_type})
+
+        handle(event)
+        handled += 1
+
+    return handled
+
+
+_handlers = None
+_executor = None
+_lock = threading.Lock()
+
+
+def get_handlers():
+    """Return the handlers named by AUTHORIZE_NET_WEBHOOK_HANDLERS"""
+    global _handlers
+
+    if _handlers is None:
+        _handlers = [
+            import_string(path) for path in getattr(
+                settings, 'AUTHORIZE_NET_WEBHOOK_HANDLERS', DEFAULT_HANDLERS)]
+
+    return _handlers
+
+
+def handle(event):
+    """Pass an event to every handler. A handler that raises is logged and
+    does not stop the others, but leaves the notification unhandled, to be
+    passed to every handler again later"""
+
+    failed = False
+
+    for handler in get_handlers():
+        try:
+            handler(event)
+        except Exception:
+            failed = True
+            logger.exception('Webhook handler %r failed on %s', handler, event,
+                             extra={'operation': 'webhook',
+                                    'event_type': event.event_type})
+
+    if failed:
+        return
+
+    WebhookNotification.objects.filter(
+        notification_id=event.notification_id).update(handled=timezone.now())
+
+
+def _handle_in_background(event):
+    try:
+        handle(event)
+    finally:
+        # connections are per thread. Don't leave this one open
+        connections.close_all()
+
+
+def submit(event):
+    """Handle an event on the webhook worker threads"""
+    global _executor
+
+    workers = getattr(
+        settings, 'AUTHORIZE_NET_WEBHOOK_WORKERS', DEFAULT_WORKERS)
+
+    if not workers:
+        handle(event)
+        return
+
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix='authorizenet-webhook')
+
+    _executor.submit(_handle_in_background, event)
+
+
+@receiver(setting_changed)
+def webhook_setting_changed(setting, **kwargs):
+    global _handlers, _executor
+
+    if setting in WEBHOOK_SETTINGS:
+        with _lock:
+            _handlers = None
+
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+                _executor = None
+
+
+# ********** Handlers *********
+
+def invalidate_profile_cache(event):
+    """Drop the cached payment profiles of a changed customer profile"""
+
+    if event.customer_profile_id is not None:
+        invalidate_customer_profile(event.customer_profile_id)
+
+
+def update_mirror(event):
+    """Bring the mirror of a changed customer profile up to date, if
+    AUTHORIZE_NET_MIRROR_PROFILES is on"""
+
+    customer_profile_id = event.customer_profile_id
+
+    if not mirror.mirror_enabled() or customer_profile_id is None:
+        return
+
+    if event.deleted and event.entity_name == CUSTOMER_PROFILE:
+        mirror.forget_customer_profile(customer_profile_id)
+    elif event.deleted:
+        mirror.forget_payment_profile(event.entity_id)
+    else:
+        mirror.record_profile_response(
+            fetch_customer_profile(customer_profile_id))
+
+
+def update_profile_index(event):
+    """Index created customer profiles and forget deleted ones, if
+    AUTHORIZE_NET_PROFILE_INDEX is on"""
+
+    if not profile_index.index_enabled() or \
+            event.entity_name != CUSTOMER_PROFILE:
+        return
+
+    if event.deleted:
+        profile_index.forget(event.customer_profile_id)
+    elif event.payload.get('merchantCustomerId'):
+        # the payload has no email, which the index is keyed on too
+        profile = fetch_customer_profile(event.customer_profile_id)
+
+        profile_index.record(
+            profile_index.identity(
+                getattr(profile, 'merchantCustomerId', None),
+                getattr(profile, 'description', None),
+                getattr(profile, 'email', None)),
+            event.customer_profile_id)